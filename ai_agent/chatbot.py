@@ -22,6 +22,8 @@ from tooldescriptions import (
     TWITTER_ADD_REPOSTED_DESCRIPTION,
     TWITTER_KNOWLEDGE_BASE_DESCRIPTION,
     PODCAST_KNOWLEDGE_BASE_DESCRIPTION,
+    TWITTER_KNOWLEDGE_BASE_MANY_DESCRIPTION,
+    PODCAST_KNOWLEDGE_BASE_MANY_DESCRIPTION,
     WEB_SEARCH_DESCRIPTION
 )
 
@@ -89,6 +91,7 @@ from utils import (
     format_ai_message_content
 )
 from podcast_agent.podcast_knowledge_base import PodcastKnowledgeBase
+from knowledge_base_core import arun_query, arun_query_many, run_query_many
 
 async def generate_llm_podcast_query(llm: ChatAnthropic = None) -> str:
     """
@@ -290,7 +293,14 @@ def create_agent_tools(llm, knowledge_base, podcast_knowledge_base, agent_kit, c
         tools.append(Tool(
             name="query_twitter_knowledge_base",
             description=TWITTER_KNOWLEDGE_BASE_DESCRIPTION,
-            func=lambda query: knowledge_base.query_knowledge_base(query)
+            func=lambda query: knowledge_base.query_knowledge_base(query),
+            coroutine=lambda query: knowledge_base.aquery_knowledge_base(query)
+        ))
+        tools.append(Tool(
+            name="query_twitter_knowledge_base_many",
+            description=TWITTER_KNOWLEDGE_BASE_MANY_DESCRIPTION,
+            func=lambda queries: run_query_many(knowledge_base, queries),
+            coroutine=lambda queries: arun_query_many(knowledge_base, queries)
         ))
 
     # Add Twitter State Management Tools if enabled
@@ -351,8 +361,15 @@ def create_agent_tools(llm, knowledge_base, podcast_knowledge_base, agent_kit, c
             func=lambda query: podcast_knowledge_base.format_query_results(
                 podcast_knowledge_base.query_knowledge_base(query)
             ),
+            coroutine=lambda query: arun_query(podcast_knowledge_base, query),
             description=PODCAST_KNOWLEDGE_BASE_DESCRIPTION
         ))
+        tools.append(Tool(
+            name="query_podcast_knowledge_base_many",
+            description=PODCAST_KNOWLEDGE_BASE_MANY_DESCRIPTION,
+            func=lambda queries: run_query_many(podcast_knowledge_base, queries),
+            coroutine=lambda queries: arun_query_many(podcast_knowledge_base, queries)
+        ))
     
 
     # Add Coinbase AgentKit tools (blockchain/wallet/twitter operations)
@@ -0,0 +1,256 @@
+import heapq
+import json
+import math
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_CLINICS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "clinics", "clinics.json")
+EXAMPLE_CLINICS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "clinics", "clinics.example.json")
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+@dataclass
+class Clinic:
+    id: str
+    name: str
+    lat: float
+    lon: float
+    services: List[str] = field(default_factory=list)
+    # Weekday ("mon".."sun") -> list of ["HH:MM", "HH:MM"] ranges; empty means always open
+    hours: Dict[str, List[List[str]]] = field(default_factory=dict)
+    intake_url: str = ""
+    address: str = ""
+    city: str = ""
+    postcode: str = ""
+
+    def is_open(self, when: datetime) -> bool:
+        """Check whether the clinic is open at a given local time."""
+        if not self.hours:
+            return True
+        now = when.strftime("%H:%M")
+        for start, end in self.hours.get(WEEKDAYS[when.weekday()], []):
+            if start <= now < end or (end < start and (now >= start or now < end)):
+                return True
+        return False
+
+    def offers(self, services: List[str]) -> bool:
+        """Check whether the clinic offers every requested service."""
+        return set(services).issubset(self.services)
+
+
+def _to_unit_vector(lat: float, lon: float) -> Tuple[float, float, float]:
+    """Project lat/lon onto the unit sphere, where chord length orders like haversine."""
+    phi, lam = math.radians(lat), math.radians(lon)
+    return (math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi))
+
+
+def _normalize_place(value: Any) -> str:
+    """Compare place names and postcodes ignoring case and spacing."""
+    return "".join(str(value or "").split()).casefold()
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlam = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlam / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class ClinicDirectory:
+    """Clinic directory with a 3D KD-tree for k-nearest queries.
+
+    Clinics are placed on the unit sphere, so Euclidean (chord) distance in
+    the tree is monotonic with haversine distance and no longitude
+    wrap-around handling is needed. The tree is stored as a flat,
+    implicitly balanced array built once at load time.
+    """
+
+    def __init__(self, clinics: List[Clinic]):
+        self.clinics = clinics
+        points = [(_to_unit_vector(c.lat, c.lon), i) for i, c in enumerate(clinics)]
+        # Flat node list: (point, clinic index, split axis, left child, right child)
+        self._nodes: List[Tuple[Tuple[float, float, float], int, int, int, int]] = []
+        self._root = self._build(points, 0)
+        # Postcode / city -> clinic indexes, for patients who only gave a place name
+        self._places: Dict[str, Dict[str, List[int]]] = {"postcode": {}, "city": {}}
+        for i, clinic in enumerate(clinics):
+            for kind in self._places:
+                key = _normalize_place(getattr(clinic, kind))
+                if key:
+                    self._places[kind].setdefault(key, []).append(i)
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_CLINICS_FILE) -> "ClinicDirectory":
+        """Load a directory from a JSON list of clinic objects."""
+        with open(path, "r") as f:
+            return cls([Clinic(**entry) for entry in json.load(f)])
+
+    def _build(self, points, depth: int) -> int:
+        if not points:
+            return -1
+        axis = depth % 3
+        points.sort(key=lambda p: p[0][axis])
+        mid = len(points) // 2
+        node_id = len(self._nodes)
+        self._nodes.append(None)
+        left = self._build(points[:mid], depth + 1)
+        right = self._build(points[mid + 1:], depth + 1)
+        self._nodes[node_id] = (points[mid][0], points[mid][1], axis, left, right)
+        return node_id
+
+    def geocode(self, postcode: Optional[str] = None, city: Optional[str] = None) -> Optional[Tuple[float, float, str]]:
+        """Approximate a patient's position from a postcode or city name.
+
+        Uses the centroid of the directory's clinics in that postcode, else
+        in that city. Returns (lat, lon, matched field) or None if neither
+        is known to the directory.
+        """
+        for kind, value in (("postcode", postcode), ("city", city)):
+            indexes = self._places[kind].get(_normalize_place(value))
+            if indexes:
+                # Averaging unit vectors keeps the centroid right across the antimeridian
+                x, y, z = (sum(axis) / len(indexes) for axis in zip(
+                    *(_to_unit_vector(self.clinics[i].lat, self.clinics[i].lon) for i in indexes)
+                ))
+                return math.degrees(math.atan2(z, math.hypot(x, y))), math.degrees(math.atan2(y, x)), kind
+        return None
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        k: int = 3,
+        services: Optional[List[str]] = None,
+        open_at: Optional[datetime] = None,
+        max_distance_km: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """Return the k nearest clinics matching the filters, closest first."""
+        predicate: Callable[[Clinic], bool] = lambda c: (
+            (not services or c.offers(services)) and (open_at is None or c.is_open(open_at))
+        )
+        target = _to_unit_vector(lat, lon)
+        # Max-heap of (-squared chord distance, clinic index)
+        best: List[Tuple[float, int]] = []
+        stack = [self._root]
+        while stack:
+            node_id = stack.pop()
+            if node_id < 0:
+                continue
+            point, index, axis, left, right = self._nodes[node_id]
+            dist = sum((a - b) ** 2 for a, b in zip(point, target))
+            if predicate(self.clinics[index]):
+                if len(best) < k:
+                    heapq.heappush(best, (-dist, index))
+                elif dist < -best[0][0]:
+                    heapq.heapreplace(best, (-dist, index))
+
+            diff = target[axis] - point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            # Only descend the far side if the splitting plane is within reach
+            if len(best) < k or diff * diff < -best[0][0]:
+                stack.append(far)
+            stack.append(near)
+
+        results = []
+        for _, index in sorted(best, reverse=True):
+            clinic = self.clinics[index]
+            distance = haversine_km(lat, lon, clinic.lat, clinic.lon)
+            if max_distance_km is not None and distance > max_distance_km:
+                continue
+            results.append({"clinic": clinic, "distance_km": distance})
+        return results
+
+
+_default_directory: Optional[ClinicDirectory] = None
+
+
+def routing_enabled() -> bool:
+    """Clinic routing is opt-in: on only when CLINIC_ROUTING is set to true."""
+    return os.getenv("CLINIC_ROUTING", "false").lower() == "true"
+
+
+def check_routing_config() -> None:
+    """Fail at startup when routing was turned on but has no clinic dataset.
+
+    Without a dataset every consultation would silently go unrouted and no
+    forms would ever be delivered. With routing off (the default) forms are
+    generated as before and nothing is checked.
+    """
+    if not routing_enabled():
+        return
+    path = os.getenv("CLINICS_FILE", DEFAULT_CLINICS_FILE)
+    if not os.path.exists(path):
+        raise RuntimeError(
+            f"Clinic routing is enabled but the clinic dataset {path} does not exist. "
+            f"Create it (see {EXAMPLE_CLINICS_FILE} for the format), point CLINICS_FILE "
+            f"at one, or set CLINIC_ROUTING=false."
+        )
+
+
+def get_default_directory() -> Optional[ClinicDirectory]:
+    """Load the clinic directory named by CLINICS_FILE once per process.
+
+    Returns None when routing is disabled or no dataset is available so
+    callers can skip routing; entrypoints call check_routing_config first.
+    """
+    global _default_directory
+    if _default_directory is None:
+        path = os.getenv("CLINICS_FILE", DEFAULT_CLINICS_FILE)
+        if not routing_enabled() or not os.path.exists(path):
+            return None
+        _default_directory = ClinicDirectory.from_file(path)
+    return _default_directory
+
+
+def locate_patient(patient: Dict[str, Any], directory: ClinicDirectory) -> Optional[Tuple[float, float, str]]:
+    """Find a patient's (lat, lon, source) from coordinates, postcode or city."""
+    location = patient.get("location")
+    if isinstance(location, dict) and location.get("lat") is not None and location.get("lon") is not None:
+        return float(location["lat"]), float(location["lon"]), "coordinates"
+    return directory.geocode(patient.get("postcode"), patient.get("city"))
+
+
+def route_consultation(
+    consultation: Dict[str, Any],
+    directory: Optional[ClinicDirectory] = None,
+    k: int = 3,
+) -> Optional[Dict[str, Any]]:
+    """Pick a destination clinic for a finished consultation.
+
+    Uses ``patient.location`` ({"lat", "lon"}), falling back to
+    ``patient.postcode`` or ``patient.city`` matched against the clinic
+    dataset, and the optional ``required_services`` list. Clinics open right
+    now are preferred, then the nearest ones regardless of hours. Returns
+    None if the patient can't be located or no clinic dataset is loaded.
+    """
+    directory = directory or get_default_directory()
+    patient = consultation.get("patient") or {}
+    if directory is None or not isinstance(patient, dict):
+        return None
+    located = locate_patient(patient, directory)
+    if located is None:
+        return None
+
+    lat, lon, located_by = located
+    services = consultation.get("required_services") or []
+    candidates = directory.nearest(lat, lon, k=k, services=services, open_at=datetime.now())
+    if not candidates:
+        candidates = directory.nearest(lat, lon, k=k, services=services)
+    if not candidates:
+        return None
+
+    return {
+        "destination": candidates[0]["clinic"].__dict__,
+        "distance_km": round(candidates[0]["distance_km"], 2),
+        "located_by": located_by,
+        "alternatives": [
+            {"id": c["clinic"].id, "name": c["clinic"].name, "distance_km": round(c["distance_km"], 2)}
+            for c in candidates[1:]
+        ],
+        "routed_at": datetime.now().isoformat(),
+    }
@@ -0,0 +1,20 @@
+"""Storage, indexing and retrieval for saved consultations."""
+
+from .analytics import ConsultationAnalytics
+from .archive import ConsultationArchive, archive_old_consultations, iter_segment
+from .index import ConsultationIndex, is_consultation_file
+from .journal import ConsultationJournal, atomic_write_json, recover_orphaned_journals
+from .search import ConsultationSearchIndex
+
+__all__ = [
+    "ConsultationAnalytics",
+    "ConsultationArchive",
+    "archive_old_consultations",
+    "iter_segment",
+    "ConsultationIndex",
+    "is_consultation_file",
+    "ConsultationJournal",
+    "atomic_write_json",
+    "recover_orphaned_journals",
+    "ConsultationSearchIndex",
+]
@@ -0,0 +1,266 @@
+import json
+import os
+import re
+import sqlite3
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from .index import extract_metadata, is_consultation_file, record_diagnosis
+
+ANALYTICS_DB_NAME = "consultation_analytics.db"
+
+# Symptoms recognised in free-text phone transcripts, matched on word boundaries
+COMMON_SYMPTOMS = (
+    "abdominal pain", "back pain", "chest pain", "chills", "congestion", "cough",
+    "diarrhea", "dizziness", "fatigue", "fever", "headache", "nausea", "rash",
+    "runny nose", "shortness of breath", "sneezing", "sore throat", "vomiting",
+)
+_SYMPTOM_PATTERNS = [(s, re.compile(rf"\b{re.escape(s)}\b")) for s in COMMON_SYMPTOMS]
+
+# Upper bounds (seconds) of the call duration histogram buckets
+DURATION_BUCKETS = (60, 180, 300, 600, 1200)
+
+
+def _duration_bucket(seconds: float) -> str:
+    for bound in DURATION_BUCKETS:
+        if seconds < bound:
+            return f"<{bound}s"
+    return f">={DURATION_BUCKETS[-1]}s"
+
+
+def _date_filter(since: Optional[str], until: Optional[str], clauses: Optional[List[str]] = None, params: Optional[List[Any]] = None):
+    """Build an inclusive day-range WHERE clause from ISO dates or timestamps."""
+    clauses = list(clauses or [])
+    params = list(params or [])
+    if since:
+        clauses.append('day >= ?')
+        params.append(since[:10])
+    if until:
+        clauses.append('day <= ?')
+        params.append(until[:10])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+
+def consultation_facts(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Extract the countable facts a consultation contributes to the rollups."""
+    symptoms = Counter()
+    severities = Counter()
+    raw_symptoms = record.get("symptoms") or []
+    if isinstance(raw_symptoms, str):
+        text = raw_symptoms.lower()
+        for name, pattern in _SYMPTOM_PATTERNS:
+            if pattern.search(text):
+                symptoms[name] += 1
+    else:
+        for symptom in raw_symptoms:
+            if isinstance(symptom, dict) and symptom.get("name"):
+                symptoms[symptom["name"].strip().lower()] += 1
+                severities[(symptom.get("severity") or "unknown").strip().lower()] += 1
+
+    diagnosis = record_diagnosis(record).strip()
+    duration = record.get("call_duration")
+    return {
+        "symptoms": dict(symptoms),
+        "severities": dict(severities),
+        "diagnoses": {diagnosis: 1} if diagnosis else {},
+        "call_duration": float(duration) if duration is not None else None,
+    }
+
+
+class ConsultationAnalytics:
+    """Incrementally maintained daily rollups over saved consultations.
+
+    Each table is a narrow (day, key, value) aggregate kept in SQLite, so
+    dashboard queries read a handful of pre-aggregated rows per day instead
+    of scanning consultation files. Every consultation's contribution is
+    remembered, so re-recording an edited consultation replaces its old
+    counts rather than adding to them.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.path.join("consultations", ANALYTICS_DB_NAME)
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self):
+        """Create the rollup tables if they don't exist."""
+        with self._connect() as conn:
+            for table, key in (
+                ("daily_symptoms", "symptom"),
+                ("daily_severity", "severity"),
+                ("daily_diagnoses", "diagnosis"),
+                ("daily_call_durations", "bucket"),
+            ):
+                conn.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        day TEXT NOT NULL,
+                        {key} TEXT NOT NULL,
+                        count INTEGER NOT NULL,
+                        PRIMARY KEY (day, {key})
+                    ) WITHOUT ROWID
+                ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS daily_calls (
+                    day TEXT PRIMARY KEY,
+                    consultations INTEGER NOT NULL,
+                    calls INTEGER NOT NULL,
+                    total_duration REAL NOT NULL,
+                    max_duration REAL NOT NULL
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS rolled_up (
+                    consultation_id TEXT PRIMARY KEY,
+                    day TEXT NOT NULL,
+                    facts TEXT NOT NULL
+                )
+            ''')
+
+    def _apply(self, conn: sqlite3.Connection, consultation_id: str, day: str, facts: Dict[str, Any], sign: int):
+        """Add (sign=1) or retract (sign=-1) one consultation's facts.
+
+        Rows whose count drops to zero are deleted, and a retraction
+        recomputes the day's longest call from the remaining consultations.
+        """
+        for table, key, counts in (
+            ("daily_symptoms", "symptom", facts["symptoms"]),
+            ("daily_severity", "severity", facts["severities"]),
+            ("daily_diagnoses", "diagnosis", facts["diagnoses"]),
+        ):
+            conn.executemany(f'''
+                INSERT INTO {table} (day, {key}, count) VALUES (?, ?, ?)
+                ON CONFLICT(day, {key}) DO UPDATE SET count = count + excluded.count
+            ''', [(day, k, sign * v) for k, v in counts.items()])
+            conn.execute(f'DELETE FROM {table} WHERE day = ? AND count <= 0', (day,))
+
+        duration = facts["call_duration"]
+        conn.execute('''
+            INSERT INTO daily_calls (day, consultations, calls, total_duration, max_duration)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(day) DO UPDATE SET
+                consultations = consultations + excluded.consultations,
+                calls = calls + excluded.calls,
+                total_duration = total_duration + excluded.total_duration,
+                max_duration = MAX(max_duration, excluded.max_duration)
+        ''', (
+            day,
+            sign,
+            sign if duration is not None else 0,
+            sign * (duration or 0.0),
+            duration if duration is not None and sign > 0 else 0.0,
+        ))
+        if duration is not None:
+            conn.execute('''
+                INSERT INTO daily_call_durations (day, bucket, count) VALUES (?, ?, ?)
+                ON CONFLICT(day, bucket) DO UPDATE SET count = count + excluded.count
+            ''', (day, _duration_bucket(duration), sign))
+            conn.execute('DELETE FROM daily_call_durations WHERE day = ? AND count <= 0', (day,))
+
+        if sign < 0:
+            conn.execute('DELETE FROM daily_calls WHERE day = ? AND consultations <= 0', (day,))
+            if duration is not None:
+                longest = conn.execute('''
+                    SELECT COALESCE(MAX(json_extract(facts, '$.call_duration')), 0.0)
+                    FROM rolled_up WHERE day = ? AND consultation_id != ?
+                ''', (day, consultation_id)).fetchone()[0]
+                conn.execute('UPDATE daily_calls SET max_duration = ? WHERE day = ?', (longest, day))
+
+    def record(self, consultation_id: str, record: Dict[str, Any], consultation_date: str):
+        """Fold one consultation into the rollups, replacing any earlier version."""
+        day = consultation_date[:10]
+        facts = consultation_facts(record)
+        with self._connect() as conn:
+            previous = conn.execute(
+                'SELECT day, facts FROM rolled_up WHERE consultation_id = ?', (consultation_id,)
+            ).fetchone()
+            if previous:
+                self._apply(conn, consultation_id, previous[0], json.loads(previous[1]), -1)
+            self._apply(conn, consultation_id, day, facts, 1)
+            conn.execute(
+                'INSERT OR REPLACE INTO rolled_up (consultation_id, day, facts) VALUES (?, ?, ?)',
+                (consultation_id, day, json.dumps(facts))
+            )
+
+    def record_file(self, file_path: str):
+        """Fold a saved consultation file into the rollups."""
+        metadata = extract_metadata(file_path)
+        with open(file_path, "r") as f:
+            record = json.load(f)
+        self.record(metadata["id"], record, metadata["consultation_date"])
+
+    def rebuild(self, consultations_dir: str = "consultations") -> int:
+        """Roll up every consultation file in a directory. Returns the count."""
+        count = 0
+        for filename in os.listdir(consultations_dir):
+            if is_consultation_file(filename):
+                try:
+                    self.record_file(os.path.join(consultations_dir, filename))
+                    count += 1
+                except (OSError, ValueError) as e:
+                    print(f"Skipping unreadable consultation {filename}: {e}")
+        return count
+
+    def _counts(self, table: str, key: str, since: Optional[str], until: Optional[str], limit: Optional[int] = None) -> Dict[str, int]:
+        where, params = _date_filter(since, until)
+        query = f'SELECT {key}, SUM(count) AS total FROM {table} {where} GROUP BY {key} ORDER BY total DESC'
+        if limit:
+            query += f' LIMIT {int(limit)}'
+        with self._connect() as conn:
+            return dict(conn.execute(query, params).fetchall())
+
+    def symptom_counts(self, since: Optional[str] = None, until: Optional[str] = None, limit: Optional[int] = None) -> Dict[str, int]:
+        """Consultations mentioning each symptom between two dates (inclusive)."""
+        return self._counts("daily_symptoms", "symptom", since, until, limit)
+
+    def severity_distribution(self, since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, int]:
+        """Reported symptom severities between two dates."""
+        return self._counts("daily_severity", "severity", since, until)
+
+    def diagnosis_counts(self, since: Optional[str] = None, until: Optional[str] = None, limit: Optional[int] = None) -> Dict[str, int]:
+        """Diagnoses between two dates, most frequent first."""
+        return self._counts("daily_diagnoses", "diagnosis", since, until, limit)
+
+    def call_duration_stats(self, since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, Any]:
+        """Call counts, mean/max duration and the duration histogram."""
+        where, params = _date_filter(since, until)
+        with self._connect() as conn:
+            consultations, calls, total, longest = conn.execute(
+                f'SELECT COALESCE(SUM(consultations), 0), COALESCE(SUM(calls), 0), '
+                f'COALESCE(SUM(total_duration), 0), COALESCE(MAX(max_duration), 0) FROM daily_calls {where}',
+                params
+            ).fetchone()
+        return {
+            "consultations": consultations,
+            "calls": calls,
+            "mean_duration_seconds": total / calls if calls else 0.0,
+            "max_duration_seconds": longest,
+            "histogram": self._counts("daily_call_durations", "bucket", since, until),
+        }
+
+    def daily_series(self, symptom: str, since: Optional[str] = None, until: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Per-day counts for one symptom, for trend charts."""
+        where, params = _date_filter(since, until, ['symptom = ?'], [symptom.lower()])
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT day, count FROM daily_symptoms {where} ORDER BY day",
+                params
+            ).fetchall()
+        return [{"day": day, "count": count} for day, count in rows]
+
+    def summary(self, since: Optional[str] = None, until: Optional[str] = None, top: int = 10) -> Dict[str, Any]:
+        """Everything a dashboard needs for a date range, from the rollups alone."""
+        return {
+            "since": since,
+            "until": until,
+            "symptoms": self.symptom_counts(since, until, top),
+            "severity": self.severity_distribution(since, until),
+            "diagnoses": self.diagnosis_counts(since, until, top),
+            "calls": self.call_duration_stats(since, until),
+        }
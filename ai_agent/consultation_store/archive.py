@@ -0,0 +1,208 @@
+import argparse
+import json
+import mmap
+import os
+import uuid
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .index import extract_metadata, is_consultation_file
+from .journal import atomic_write_json
+
+DEFAULT_ARCHIVE_DIR = os.path.join("consultations", "archive")
+SEGMENT_SUFFIX = ".jsonl.z"
+INDEX_SUFFIX = ".idx.json"
+RECORDS_PER_BLOCK = 64
+
+
+def _segment_index_path(segment_path: str) -> str:
+    return segment_path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+
+
+def write_segment(records: List[Tuple[str, Dict[str, Any]]], segment_path: str, records_per_block: int = RECORDS_PER_BLOCK) -> Dict[str, Any]:
+    """Write (id, record) pairs as a segment of independently compressed blocks.
+
+    Each block holds up to ``records_per_block`` compact JSON lines. The
+    sidecar index maps every record id to its block and line so a single
+    record can be read by decompressing one block. Raises FileExistsError
+    rather than replace an existing segment.
+    """
+    blocks = []
+    offsets = {}
+    tmp_path = f"{segment_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        for start in range(0, len(records), records_per_block):
+            chunk = records[start:start + records_per_block]
+            payload = "\n".join(json.dumps(record, separators=(",", ":")) for _, record in chunk).encode()
+            compressed = zlib.compress(payload, 9)
+            block_no = len(blocks)
+            blocks.append([f.tell(), len(compressed)])
+            f.write(compressed)
+            for line_no, (record_id, _) in enumerate(chunk):
+                offsets[record_id] = [block_no, line_no]
+        f.flush()
+        os.fsync(f.fileno())
+    # Linking (unlike renaming) fails if the name is taken, so an earlier
+    # segment, whose source files are already gone, is never overwritten
+    try:
+        os.link(tmp_path, segment_path)
+    finally:
+        os.remove(tmp_path)
+
+    index = {
+        "segment": os.path.basename(segment_path),
+        "created_at": datetime.now().isoformat(),
+        "record_count": len(records),
+        "blocks": blocks,
+        "records": offsets,
+    }
+    atomic_write_json(index, _segment_index_path(segment_path))
+    return index
+
+
+class ConsultationArchive:
+    """Read access to archived consultation segments.
+
+    Segment indexes are loaded once when the archive is opened; each segment
+    file is memory-mapped on first use, so fetching a record costs one block
+    decompression.
+    """
+
+    def __init__(self, archive_dir: str = DEFAULT_ARCHIVE_DIR):
+        self.archive_dir = archive_dir
+        os.makedirs(archive_dir, exist_ok=True)
+        self._locations: Dict[str, Tuple[str, int, int]] = {}
+        self._blocks: Dict[str, List[List[int]]] = {}
+        self._maps: Dict[str, Tuple[Any, mmap.mmap]] = {}
+        self.reload()
+
+    def reload(self):
+        """Re-read the sidecar indexes, e.g. after an archival run."""
+        self._locations.clear()
+        self._blocks.clear()
+        for filename in sorted(os.listdir(self.archive_dir)):
+            if not filename.endswith(INDEX_SUFFIX):
+                continue
+            with open(os.path.join(self.archive_dir, filename), "r") as f:
+                index = json.load(f)
+            segment = index["segment"]
+            self._blocks[segment] = index["blocks"]
+            for record_id, (block_no, line_no) in index["records"].items():
+                self._locations[record_id] = (segment, block_no, line_no)
+
+    def __contains__(self, record_id: str) -> bool:
+        return record_id in self._locations
+
+    def __len__(self) -> int:
+        return len(self._locations)
+
+    def segments(self) -> List[str]:
+        """Paths of all segments in the archive."""
+        return [os.path.join(self.archive_dir, segment) for segment in sorted(self._blocks)]
+
+    def _mmap(self, segment: str) -> mmap.mmap:
+        if segment not in self._maps:
+            f = open(os.path.join(self.archive_dir, segment), "rb")
+            self._maps[segment] = (f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        return self._maps[segment][1]
+
+    def get(self, record_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch a single archived consultation by id, or None if unknown."""
+        location = self._locations.get(record_id)
+        if location is None:
+            return None
+        segment, block_no, line_no = location
+        offset, length = self._blocks[segment][block_no]
+        data = self._mmap(segment)[offset:offset + length]
+        lines = zlib.decompress(data).split(b"\n")
+        return json.loads(lines[line_no])
+
+    def close(self):
+        """Release memory maps and file handles."""
+        for f, mapped in self._maps.values():
+            mapped.close()
+            f.close()
+        self._maps.clear()
+
+
+def iter_segment(segment_path: str, with_ids: bool = False) -> Iterator[Any]:
+    """Stream every record in a segment, one block in memory at a time.
+
+    With ``with_ids`` each item is an (id, record) pair instead of a record.
+    """
+    with open(_segment_index_path(segment_path), "r") as f:
+        index = json.load(f)
+    ids = sorted(index["records"], key=lambda record_id: index["records"][record_id]) if with_ids else None
+    position = 0
+    with open(segment_path, "rb") as f:
+        for offset, length in index["blocks"]:
+            f.seek(offset)
+            for line in zlib.decompress(f.read(length)).split(b"\n"):
+                record = json.loads(line)
+                yield (ids[position], record) if with_ids else record
+                position += 1
+
+
+def archive_old_consultations(
+    consultations_dir: str = "consultations",
+    archive_dir: Optional[str] = None,
+    older_than_days: int = 30,
+    records_per_block: int = RECORDS_PER_BLOCK,
+) -> Optional[str]:
+    """Roll consultations older than ``older_than_days`` into a new segment.
+
+    The original JSON files are deleted only after the segment and its index
+    are durably written. Returns the segment path, or None if nothing was old
+    enough to archive.
+    """
+    archive_dir = archive_dir or os.path.join(consultations_dir, "archive")
+    os.makedirs(archive_dir, exist_ok=True)
+    cutoff = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+
+    candidates = []
+    for filename in sorted(os.listdir(consultations_dir)):
+        if not is_consultation_file(filename):
+            continue
+        path = os.path.join(consultations_dir, filename)
+        try:
+            metadata = extract_metadata(path)
+        except (OSError, ValueError) as e:
+            print(f"Skipping unreadable consultation {filename}: {e}")
+            continue
+        if metadata["consultation_date"] < cutoff:
+            candidates.append((metadata["consultation_date"], metadata["id"], path))
+
+    if not candidates:
+        return None
+
+    candidates.sort()
+    records = []
+    for _, record_id, path in candidates:
+        with open(path, "r") as f:
+            records.append((record_id, json.load(f)))
+
+    # The random suffix keeps runs started in the same second apart
+    segment_name = f"segment_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}{SEGMENT_SUFFIX}"
+    segment_path = os.path.join(archive_dir, segment_name)
+    write_segment(records, segment_path, records_per_block)
+
+    for _, _, path in candidates:
+        os.remove(path)
+
+    print(f"Archived {len(records)} consultations into {segment_name}")
+    return segment_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old consultations into compressed segments.")
+    parser.add_argument("--consultations-dir", default="consultations")
+    parser.add_argument("--archive-dir", default=None)
+    parser.add_argument("--older-than-days", type=int, default=30)
+    args = parser.parse_args()
+
+    archive_old_consultations(args.consultations_dir, args.archive_dir, args.older_than_days)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+import base64
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+INDEX_DB_NAME = "consultation_index.db"
+CONSULTATION_PREFIXES = ("consultation_", "phone_consultation_")
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Files edited in place don't change the directory mtime, so even an
+# unchanged directory gets its files re-statted this often
+RESCAN_INTERVAL_SECONDS = 5.0
+
+
+def is_consultation_file(filename: str) -> bool:
+    """Check whether a filename looks like a saved consultation record."""
+    return filename.startswith(CONSULTATION_PREFIXES) and filename.endswith(".json")
+
+
+def record_diagnosis(record: Dict[str, Any]) -> str:
+    """The consultation's diagnosis, falling back to one added by an offline LLM batch job."""
+    if record.get("diagnosis"):
+        return str(record["diagnosis"])
+    for key in ("llm_diagnosis", "llm_summary"):
+        result = record.get(key)
+        if isinstance(result, dict) and result.get("diagnosis"):
+            return str(result["diagnosis"])
+    return ""
+
+
+def encode_cursor(consultation_date: str, consultation_id: str) -> str:
+    """Encode the sort key of the last returned row as an opaque cursor."""
+    raw = f"{consultation_date}|{consultation_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Decode a cursor produced by encode_cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        consultation_date, consultation_id = raw.split("|", 1)
+        return consultation_date, consultation_id
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def _date_from_filename(filename: str) -> Optional[str]:
+    """Recover an ISO timestamp from names like consultation_20250313_233518.json."""
+    stem = filename[:-len(".json")]
+    parts = stem.split("_")
+    if len(parts) < 2:
+        return None
+    try:
+        return datetime.strptime(f"{parts[-2]}_{parts[-1]}", "%Y%m%d_%H%M%S").isoformat()
+    except ValueError:
+        return None
+
+
+def extract_metadata(file_path: str) -> Dict[str, Any]:
+    """Pull the listing fields out of a consultation file."""
+    filename = os.path.basename(file_path)
+    with open(file_path, "r") as f:
+        data = json.load(f)
+
+    patient = data.get("patient") or {}
+    consultation_date = (
+        data.get("consultation_date")
+        or data.get("timestamp")
+        or _date_from_filename(filename)
+        or datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat()
+    )
+    return {
+        "id": filename[:-len(".json")],
+        "filename": filename,
+        "consultation_date": consultation_date,
+        "patient_name": (patient.get("name") or "").lower() if isinstance(patient, dict) else "",
+        "diagnosis": record_diagnosis(data),
+    }
+
+
+class ConsultationIndex:
+    """SQLite index over a consultations directory.
+
+    Listing reads only the index, so its cost depends on the page size rather
+    than on how many consultation files exist. New files are picked up either
+    through ``add_file`` when a consultation is saved, or through ``sync``,
+    which re-reads files whose mtime or size changed. ``sync`` stats the
+    files when the directory mtime has changed, and otherwise at most every
+    ``RESCAN_INTERVAL_SECONDS`` so in-place edits are still caught.
+    """
+
+    def __init__(self, consultations_dir: str, db_path: Optional[str] = None):
+        self.consultations_dir = consultations_dir
+        os.makedirs(consultations_dir, exist_ok=True)
+        self.db_path = db_path or os.path.join(consultations_dir, INDEX_DB_NAME)
+        self._last_scan = float("-inf")
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self):
+        """Create the index tables if they don't exist."""
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS consultations (
+                    id TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    consultation_date TEXT NOT NULL,
+                    patient_name TEXT,
+                    diagnosis TEXT,
+                    mtime REAL NOT NULL,
+                    size INTEGER NOT NULL DEFAULT -1
+                )
+            ''')
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(consultations)')}
+            if "size" not in columns:
+                # Rows from before sizes were tracked (-1) are re-read on the next sync
+                conn.execute('ALTER TABLE consultations ADD COLUMN size INTEGER NOT NULL DEFAULT -1')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS index_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            ''')
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_consultation_date '
+                'ON consultations(consultation_date DESC, id DESC)'
+            )
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_patient_date '
+                'ON consultations(patient_name, consultation_date DESC, id DESC)'
+            )
+
+    def add_file(self, file_path: str) -> Dict[str, Any]:
+        """Index (or re-index) a single consultation file."""
+        metadata = extract_metadata(file_path)
+        stat = os.stat(file_path)
+        with self._connect() as conn:
+            self._upsert(conn, metadata, stat.st_mtime, stat.st_size)
+        return metadata
+
+    def remove(self, consultation_id: str):
+        """Drop a consultation from the index."""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM consultations WHERE id = ?', (consultation_id,))
+
+    def _upsert(self, conn: sqlite3.Connection, metadata: Dict[str, Any], mtime: float, size: int):
+        conn.execute('''
+            INSERT OR REPLACE INTO consultations
+                (id, filename, consultation_date, patient_name, diagnosis, mtime, size)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            metadata["id"],
+            metadata["filename"],
+            metadata["consultation_date"],
+            metadata["patient_name"],
+            metadata["diagnosis"],
+            mtime,
+            size,
+        ))
+
+    def sync(self, force: bool = False) -> int:
+        """Bring the index up to date with the directory.
+
+        Re-reads files whose mtime or size differ from the indexed ones. The
+        scan is skipped when the directory mtime is unchanged since the last
+        sync and this index scanned less than ``RESCAN_INTERVAL_SECONDS``
+        ago. Returns the number of files (re)indexed.
+        """
+        dir_mtime = os.stat(self.consultations_dir).st_mtime
+        now = time.monotonic()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value FROM index_state WHERE key = 'dir_mtime'"
+            ).fetchone()
+            unchanged_dir = row and float(row[0]) == dir_mtime
+            if not force and unchanged_dir and now - self._last_scan < RESCAN_INTERVAL_SECONDS:
+                return 0
+
+            known = {name: (mtime, size) for name, mtime, size in conn.execute(
+                'SELECT filename, mtime, size FROM consultations'
+            )}
+            seen = set()
+            updated = 0
+            with os.scandir(self.consultations_dir) as entries:
+                for entry in entries:
+                    if not is_consultation_file(entry.name):
+                        continue
+                    seen.add(entry.name)
+                    stat = entry.stat()
+                    if known.get(entry.name) == (stat.st_mtime, stat.st_size):
+                        continue
+                    try:
+                        self._upsert(conn, extract_metadata(entry.path), stat.st_mtime, stat.st_size)
+                        updated += 1
+                    except (OSError, ValueError) as e:
+                        print(f"Skipping unreadable consultation {entry.name}: {e}")
+
+            removed = [(name,) for name in known if name not in seen]
+            if removed:
+                conn.executemany('DELETE FROM consultations WHERE filename = ?', removed)
+
+            conn.execute(
+                "INSERT OR REPLACE INTO index_state (key, value) VALUES ('dir_mtime', ?)",
+                (str(dir_mtime),)
+            )
+        self._last_scan = now
+        return updated
+
+    def count(self) -> int:
+        """Number of indexed consultations."""
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM consultations').fetchone()[0]
+
+    def list_page(
+        self,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        patient: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Return one page of consultations, newest first.
+
+        Uses keyset pagination on (consultation_date, id), so deep pages cost
+        the same as the first one.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        clauses = []
+        params: List[Any] = []
+
+        if cursor:
+            cursor_date, cursor_id = decode_cursor(cursor)
+            clauses.append('(consultation_date < ? OR (consultation_date = ? AND id < ?))')
+            params.extend([cursor_date, cursor_date, cursor_id])
+        if since:
+            clauses.append('consultation_date >= ?')
+            params.append(since)
+        if until:
+            clauses.append('consultation_date <= ?')
+            params.append(until)
+        if patient:
+            clauses.append('patient_name = ?')
+            params.append(patient.lower())
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = f'''
+            SELECT id, filename, consultation_date, patient_name, diagnosis
+            FROM consultations {where}
+            ORDER BY consultation_date DESC, id DESC
+            LIMIT ?
+        '''
+        params.append(limit + 1)
+
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        items = [
+            {
+                "id": row[0],
+                "filename": row[1],
+                "consultation_date": row[2],
+                "patient_name": row[3],
+                "diagnosis": row[4],
+            }
+            for row in rows
+        ]
+        next_cursor = None
+        if has_more and items:
+            last = items[-1]
+            next_cursor = encode_cursor(last["consultation_date"], last["id"])
+
+        return {"consultations": items, "next_cursor": next_cursor}
+
+    def iter_page_json(self, **kwargs) -> Iterator[bytes]:
+        """Yield a page as JSON fragments so it can be streamed to the client."""
+        page = self.list_page(**kwargs)
+        yield b'{"consultations":['
+        for i, item in enumerate(page["consultations"]):
+            prefix = b"," if i else b""
+            yield prefix + json.dumps(item, separators=(",", ":")).encode()
+        yield b'],"next_cursor":' + json.dumps(page["next_cursor"]).encode() + b"}"
@@ -0,0 +1,190 @@
+import asyncio
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+DEFAULT_JOURNAL_DIR = os.path.join("consultations", "journal")
+JOURNAL_SUFFIX = ".jsonl"
+
+
+def _fsync_dir(directory: str):
+    """Persist a rename by syncing its parent directory (no-op where unsupported)."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_json(data: Dict[str, Any], final_path: str):
+    """Write JSON to a temp file, fsync it and rename it over ``final_path``."""
+    directory = os.path.dirname(final_path) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{final_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, final_path)
+    _fsync_dir(directory)
+
+
+class ConsultationJournal:
+    """Append-only, per-session journal of consultation turns.
+
+    ``append`` only enqueues the record; a background thread writes compact
+    JSON lines and fsyncs them in batches (every ``fsync_every`` records or
+    ``fsync_interval`` seconds, whichever comes first). At the end of the
+    session ``compact`` writes the final record with an atomic rename and
+    removes the journal. Journals left behind by a crash can be turned into
+    consultation records with ``recover_orphaned_journals``.
+    """
+
+    def __init__(
+        self,
+        session_id: Optional[str] = None,
+        journal_dir: str = DEFAULT_JOURNAL_DIR,
+        fsync_every: int = 16,
+        fsync_interval: float = 1.0,
+    ):
+        self.session_id = session_id or f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        self.journal_dir = journal_dir
+        os.makedirs(journal_dir, exist_ok=True)
+        self.path = os.path.join(journal_dir, f"{self.session_id}{JOURNAL_SUFFIX}")
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+        self._file = open(self.path, "ab")
+        self._thread = threading.Thread(target=self._writer, name=f"journal-{self.session_id}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _writer(self):
+        """Background loop that writes queued records and batches fsyncs."""
+        pending = 0
+        last_sync = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.fsync_interval)
+            except queue.Empty:
+                item = None
+
+            stop = False
+            if isinstance(item, bytes):
+                self._file.write(item)
+                pending += 1
+            elif isinstance(item, threading.Event):
+                # Flush request: sync now and wake the caller
+                self._sync()
+                pending = 0
+                last_sync = time.monotonic()
+                item.set()
+                continue
+            elif item is not None:
+                # Shutdown sentinel
+                stop = True
+
+            if pending and (stop or pending >= self.fsync_every or time.monotonic() - last_sync >= self.fsync_interval):
+                self._sync()
+                pending = 0
+                last_sync = time.monotonic()
+            if stop:
+                return
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def append(self, record: Dict[str, Any]):
+        """Queue a record for the journal. Never blocks on disk I/O."""
+        if self._closed:
+            raise RuntimeError(f"Journal {self.session_id} is closed")
+        line = json.dumps(record, separators=(",", ":"), default=str) + "\n"
+        self._queue.put(line.encode())
+
+    def flush(self, timeout: Optional[float] = None):
+        """Block until every queued record is written and fsynced."""
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        """Write out outstanding records and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(object())
+        self._thread.join()
+        self._file.close()
+        atexit.unregister(self.close)
+
+    def compact(self, final_record: Dict[str, Any], final_path: str) -> str:
+        """Write the final consultation record atomically and drop the journal."""
+        self.close()
+        atomic_write_json(final_record, final_path)
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        return final_path
+
+    async def acompact(self, final_record: Dict[str, Any], final_path: str) -> str:
+        """Run ``compact`` in a worker thread so the event loop keeps serving."""
+        return await asyncio.to_thread(self.compact, final_record, final_path)
+
+
+def replay_journal(path: str) -> List[Dict[str, Any]]:
+    """Read the records of a journal, ignoring a torn trailing line."""
+    records = []
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # Only the last line can be partially written
+                break
+    return records
+
+
+def recover_orphaned_journals(journal_dir: str = DEFAULT_JOURNAL_DIR, output_dir: str = "consultations") -> List[str]:
+    """Turn journals left behind by crashed sessions into consultation files.
+
+    Only call this when no session is running in this directory, otherwise a
+    live journal would be recovered from under its writer.
+    """
+    if not os.path.isdir(journal_dir):
+        return []
+
+    recovered = []
+    for filename in sorted(os.listdir(journal_dir)):
+        if not filename.endswith(JOURNAL_SUFFIX):
+            continue
+        path = os.path.join(journal_dir, filename)
+        session_id = filename[:-len(JOURNAL_SUFFIX)]
+        records = replay_journal(path)
+        if records:
+            final_path = os.path.join(output_dir, f"consultation_recovered_{session_id}.json")
+            atomic_write_json({
+                "session_id": session_id,
+                "status": "incomplete",
+                "consultation_date": records[0].get("timestamp"),
+                "conversation_history": records,
+            }, final_path)
+            recovered.append(final_path)
+        os.remove(path)
+    return recovered
@@ -0,0 +1,227 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+from typing import Any, Dict, List, Optional
+
+from .index import extract_metadata, is_consultation_file, record_diagnosis
+
+SEARCH_DB_NAME = "consultation_search.db"
+SEARCH_COLUMNS = ("patient", "symptoms", "diagnosis", "prescriptions", "transcript")
+# bm25 column weights, in SEARCH_COLUMNS order: clinical fields outrank the raw transcript
+COLUMN_WEIGHTS = (2.0, 4.0, 5.0, 3.0, 1.0)
+
+
+def _join(values) -> str:
+    return " ".join(str(v) for v in values if v)
+
+
+def flatten_consultation(record: Dict[str, Any]) -> Dict[str, str]:
+    """Map either consultation file layout onto the searchable text columns."""
+    patient = record.get("patient") or {}
+
+    symptoms = record.get("symptoms") or ""
+    if isinstance(symptoms, list):
+        symptoms = _join(
+            _join([s.get("name"), s.get("duration"), s.get("severity")]) if isinstance(s, dict) else s
+            for s in symptoms
+        )
+
+    prescription = record.get("prescription") or {}
+    prescriptions = []
+    if isinstance(prescription, dict):
+        for med in prescription.get("medications", []):
+            if isinstance(med, dict):
+                prescriptions.append(_join([med.get("name"), med.get("dosage"), med.get("purpose")]))
+            else:
+                prescriptions.append(str(med))
+        for key in ("tests", "follow_up", "advice"):
+            prescriptions.extend(str(item) for item in prescription.get(key, []))
+    if isinstance(record.get("medications"), str):
+        prescriptions.append(record["medications"])
+
+    transcript = []
+    for turn in record.get("conversation_history", []):
+        transcript.extend(
+            str(turn[key]) for key in ("question", "response", "user", "doctor") if turn.get(key)
+        )
+
+    return {
+        "patient": patient.get("name", "") if isinstance(patient, dict) else str(patient),
+        "symptoms": str(symptoms),
+        "diagnosis": record_diagnosis(record),
+        "prescriptions": _join(prescriptions),
+        "transcript": _join(transcript),
+    }
+
+
+def to_match_query(text: str) -> str:
+    """Turn free text into an FTS5 query that matches all terms, prefix-wise.
+
+    Quoting every token keeps user input from being parsed as FTS5 syntax.
+    """
+    tokens = re.findall(r"\w+", text.lower())
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+class ConsultationSearchIndex:
+    """SQLite FTS5 full-text index over consultation records."""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.path.join("consultations", SEARCH_DB_NAME)
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self):
+        """Create the FTS5 table and its id -> rowid map if they don't exist."""
+        with self._connect() as conn:
+            conn.execute(f'''
+                CREATE VIRTUAL TABLE IF NOT EXISTS consultation_fts USING fts5(
+                    id UNINDEXED,
+                    consultation_date UNINDEXED,
+                    {", ".join(SEARCH_COLUMNS)},
+                    tokenize = 'porter unicode61'
+                )
+            ''')
+            # FTS5 can't index the id column, so replacing a document by id would
+            # scan the whole table; this map lets writes delete by rowid instead.
+            # mtime_ns records which version of the file was indexed.
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS consultation_docs (
+                    id TEXT PRIMARY KEY,
+                    fts_rowid INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            mapped = conn.execute('SELECT COUNT(*) FROM consultation_docs').fetchone()[0]
+            if not mapped:
+                # One-off scan for an index built before the map existed; mtime 0
+                # marks the entries stale so the next sync re-reads their files
+                conn.execute('''
+                    INSERT OR REPLACE INTO consultation_docs (id, fts_rowid)
+                    SELECT id, rowid FROM consultation_fts
+                ''')
+
+    @staticmethod
+    def _delete(conn: sqlite3.Connection, consultation_id: str):
+        row = conn.execute('SELECT fts_rowid FROM consultation_docs WHERE id = ?', (consultation_id,)).fetchone()
+        if row:
+            conn.execute('DELETE FROM consultation_fts WHERE rowid = ?', (row[0],))
+            conn.execute('DELETE FROM consultation_docs WHERE id = ?', (consultation_id,))
+
+    def index_record(self, consultation_id: str, record: Dict[str, Any], consultation_date: str = "", mtime_ns: int = 0):
+        """Add or replace a single consultation in the index."""
+        fields = flatten_consultation(record)
+        consultation_date = consultation_date or record.get("consultation_date") or record.get("timestamp") or ""
+        with self._connect() as conn:
+            self._delete(conn, consultation_id)
+            cursor = conn.execute(
+                f'INSERT INTO consultation_fts (id, consultation_date, {", ".join(SEARCH_COLUMNS)}) '
+                f'VALUES (?, ?, {", ".join("?" for _ in SEARCH_COLUMNS)})',
+                (consultation_id, consultation_date, *(fields[c] for c in SEARCH_COLUMNS))
+            )
+            conn.execute(
+                'INSERT INTO consultation_docs (id, fts_rowid, mtime_ns) VALUES (?, ?, ?)',
+                (consultation_id, cursor.lastrowid, mtime_ns)
+            )
+
+    def index_file(self, file_path: str):
+        """Index a consultation file by path, as done after each save."""
+        metadata = extract_metadata(file_path)
+        mtime_ns = os.stat(file_path).st_mtime_ns
+        with open(file_path, "r") as f:
+            record = json.load(f)
+        self.index_record(metadata["id"], record, metadata["consultation_date"], mtime_ns)
+
+    def remove(self, consultation_id: str):
+        """Drop a consultation from the index."""
+        with self._connect() as conn:
+            self._delete(conn, consultation_id)
+
+    def sync(self, consultations_dir: str = "consultations", full: bool = False) -> Dict[str, int]:
+        """Index consultation files that are new or changed since they were indexed.
+
+        With ``full`` every file is re-read. Run at startup so consultations
+        saved before the index existed, recovered journals and records whose
+        indexing failed become searchable. Entries whose file is gone are
+        kept: archived consultations stay searchable.
+        """
+        if not os.path.isdir(consultations_dir):
+            return {"indexed": 0, "unchanged": 0}
+        with self._connect() as conn:
+            known = dict(conn.execute('SELECT id, mtime_ns FROM consultation_docs').fetchall())
+
+        indexed = unchanged = 0
+        for filename in os.listdir(consultations_dir):
+            if not is_consultation_file(filename):
+                continue
+            file_path = os.path.join(consultations_dir, filename)
+            try:
+                if not full and known.get(filename[:-len(".json")]) == os.stat(file_path).st_mtime_ns:
+                    unchanged += 1
+                    continue
+                self.index_file(file_path)
+                indexed += 1
+            except (OSError, ValueError) as e:
+                print(f"Skipping unreadable consultation {filename}: {e}")
+
+        if indexed:
+            with self._connect() as conn:
+                conn.execute("INSERT INTO consultation_fts(consultation_fts) VALUES ('optimize')")
+        return {"indexed": indexed, "unchanged": unchanged}
+
+    def rebuild(self, consultations_dir: str = "consultations") -> int:
+        """Re-index every consultation file in a directory. Returns the count."""
+        return self.sync(consultations_dir, full=True)["indexed"]
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """Return ranked matches with highlighted snippets, best first."""
+        match = to_match_query(query)
+        if not match:
+            return []
+
+        weights = ", ".join(str(w) for w in COLUMN_WEIGHTS)
+        with self._connect() as conn:
+            rows = conn.execute(f'''
+                SELECT id, consultation_date, diagnosis,
+                       bm25(consultation_fts, 0, 0, {weights}) AS rank,
+                       snippet(consultation_fts, -1, '[', ']', '...', 16)
+                FROM consultation_fts
+                WHERE consultation_fts MATCH ?
+                ORDER BY rank
+                LIMIT ? OFFSET ?
+            ''', (match, limit, offset)).fetchall()
+
+        return [
+            {
+                "id": row[0],
+                "consultation_date": row[1],
+                "diagnosis": row[2],
+                # bm25 is lower-is-better; flip the sign so higher means more relevant
+                "score": -row[3],
+                "snippet": row[4],
+            }
+            for row in rows
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync or rebuild the consultation full-text index.")
+    parser.add_argument("--dir", default="consultations", help="Consultations directory")
+    parser.add_argument("--db", default=None, help="Index database (default <dir>/consultation_search.db)")
+    parser.add_argument("--rebuild", action="store_true", help="Re-read every file instead of only new/changed ones")
+    args = parser.parse_args()
+
+    index = ConsultationSearchIndex(args.db or os.path.join(args.dir, SEARCH_DB_NAME))
+    print(index.sync(args.dir, full=args.rebuild))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+import argparse
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from consultation_store.archive import SEGMENT_SUFFIX, iter_segment
+from consultation_store.index import is_consultation_file, record_diagnosis
+
+# Namespace for deterministic resource ids, so re-exports produce stable references
+PULSE_NAMESPACE = uuid.UUID("6f1c3a52-5d0e-4f4a-9a0b-3b7d9f2c1e10")
+WRITE_BUFFER_BYTES = 1 << 20
+
+CONDITION_CATEGORY_SYSTEM = "http://terminology.hl7.org/CodeSystem/condition-category"
+CONSENT_SCOPE_SYSTEM = "http://terminology.hl7.org/CodeSystem/consentscope"
+LOINC_SYSTEM = "http://loinc.org"
+
+
+def _resource_id(*parts: str) -> str:
+    return str(uuid.uuid5(PULSE_NAMESPACE, "|".join(parts)))
+
+
+def _consultation_date(record: Dict[str, Any]) -> Optional[str]:
+    return record.get("consultation_date") or record.get("timestamp")
+
+
+def iter_consultations(consultations_dir: str, archive_dir: Optional[str] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield (id, record) for live and archived consultations, one at a time."""
+    with os.scandir(consultations_dir) as entries:
+        for entry in entries:
+            if not is_consultation_file(entry.name):
+                continue
+            with open(entry.path, "r") as f:
+                yield entry.name[:-len(".json")], json.load(f)
+
+    archive_dir = archive_dir or os.path.join(consultations_dir, "archive")
+    if os.path.isdir(archive_dir):
+        for filename in sorted(os.listdir(archive_dir)):
+            if filename.endswith(SEGMENT_SUFFIX):
+                yield from iter_segment(os.path.join(archive_dir, filename), with_ids=True)
+
+
+# Patient fields that identify a person across consultations, most specific first
+PATIENT_IDENTIFIER_FIELDS = ("mrn", "patient_id")
+
+
+def _patient_identifier(record: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    patient = record.get("patient")
+    if isinstance(patient, dict):
+        for field in PATIENT_IDENTIFIER_FIELDS:
+            if patient.get(field):
+                return field, str(patient[field]).strip()
+    return None
+
+
+def _patient_key(consultation_id: str, record: Dict[str, Any]) -> str:
+    # Names aren't identities: without a real identifier each consultation gets its own Patient
+    identifier = _patient_identifier(record)
+    if identifier:
+        return f"{identifier[0]}:{identifier[1]}"
+    return f"consultation:{consultation_id}"
+
+
+def patient_resources(consultation_id: str, record: Dict[str, Any], forms_dir: str) -> Iterator[Dict[str, Any]]:
+    """FHIR Patient for the consultation's patient."""
+    patient = record.get("patient") if isinstance(record.get("patient"), dict) else {}
+    resource = {
+        "resourceType": "Patient",
+        "id": _resource_id(_patient_key(consultation_id, record)),
+    }
+    identifier = _patient_identifier(record)
+    if identifier:
+        resource["identifier"] = [{"type": {"text": identifier[0]}, "value": identifier[1]}]
+    if patient.get("name"):
+        resource["name"] = [{"text": patient["name"]}]
+    sex = str(patient.get("sex", "")).lower()
+    if sex in ("male", "female", "other"):
+        resource["gender"] = sex
+    elif sex:
+        resource["gender"] = "unknown"
+    yield resource
+
+
+def condition_resources(consultation_id: str, record: Dict[str, Any], forms_dir: str) -> Iterator[Dict[str, Any]]:
+    """FHIR Conditions for the diagnosis and each reported symptom."""
+    subject = {"reference": f"Patient/{_resource_id(_patient_key(consultation_id, record))}"}
+    recorded = _consultation_date(record)
+
+    diagnosis = record_diagnosis(record)
+    if diagnosis:
+        yield {
+            "resourceType": "Condition",
+            "id": _resource_id(consultation_id, "diagnosis"),
+            "category": [{"coding": [{"system": CONDITION_CATEGORY_SYSTEM, "code": "encounter-diagnosis"}]}],
+            "code": {"text": diagnosis},
+            "subject": subject,
+            "recordedDate": recorded,
+        }
+
+    symptoms = record.get("symptoms") or []
+    if isinstance(symptoms, str):
+        symptoms = [{"name": symptoms}]
+    for idx, symptom in enumerate(symptoms):
+        if not isinstance(symptom, dict) or not symptom.get("name"):
+            continue
+        resource = {
+            "resourceType": "Condition",
+            "id": _resource_id(consultation_id, "symptom", str(idx)),
+            "category": [{"coding": [{"system": CONDITION_CATEGORY_SYSTEM, "code": "problem-list-item"}]}],
+            "code": {"text": symptom["name"]},
+            "subject": subject,
+            "recordedDate": recorded,
+        }
+        if symptom.get("severity"):
+            resource["severity"] = {"text": symptom["severity"]}
+        if symptom.get("duration"):
+            resource["note"] = [{"text": f"Duration: {symptom['duration']}"}]
+        yield resource
+
+
+def medication_request_resources(consultation_id: str, record: Dict[str, Any], forms_dir: str) -> Iterator[Dict[str, Any]]:
+    """FHIR MedicationRequests for each prescribed medication."""
+    subject = {"reference": f"Patient/{_resource_id(_patient_key(consultation_id, record))}"}
+    prescription = record.get("prescription") if isinstance(record.get("prescription"), dict) else {}
+    for idx, med in enumerate(prescription.get("medications", [])):
+        if not isinstance(med, dict) or not med.get("name"):
+            continue
+        resource = {
+            "resourceType": "MedicationRequest",
+            "id": _resource_id(consultation_id, "medication", str(idx)),
+            "status": "active",
+            "intent": "proposal",
+            "medicationCodeableConcept": {"text": med["name"]},
+            "subject": subject,
+            "authoredOn": _consultation_date(record),
+        }
+        dosage = " for ".join(v for v in (med.get("dosage"), med.get("duration")) if v)
+        if dosage:
+            resource["dosageInstruction"] = [{"text": dosage}]
+        if med.get("purpose"):
+            resource["reasonCode"] = [{"text": med["purpose"]}]
+        yield resource
+
+
+def consent_resources(consultation_id: str, record: Dict[str, Any], forms_dir: str) -> Iterator[Dict[str, Any]]:
+    """FHIR Consents from the consent and HIPAA forms generated for the consultation."""
+    timestamp = record.get("timestamp") or record.get("consultation_date")
+    if not timestamp:
+        return
+    patient = {"reference": f"Patient/{_resource_id(_patient_key(consultation_id, record))}"}
+    form_file_timestamp = timestamp.replace(":", "-")
+
+    for form_name, scope, loinc_code, ack_key in (
+        ("consent", "treatment", "59284-0", "verbal_consent"),
+        ("hipaa", "patient-privacy", "59284-0", "verbal_acknowledgment"),
+    ):
+        form_path = os.path.join(forms_dir, f"{form_name}_{form_file_timestamp}.json")
+        if not os.path.exists(form_path):
+            continue
+        with open(form_path, "r") as f:
+            form = json.load(f)
+        given = bool(form.get(ack_key, {}).get("given"))
+        resource = {
+            "resourceType": "Consent",
+            "id": _resource_id(consultation_id, form_name),
+            "status": "active" if given else "proposed",
+            "scope": {"coding": [{"system": CONSENT_SCOPE_SYSTEM, "code": scope}]},
+            "category": [{"coding": [{"system": LOINC_SYSTEM, "code": loinc_code}]}],
+            "patient": patient,
+            "dateTime": form.get(ack_key, {}).get("datetime") or timestamp,
+        }
+        if form.get("form_id"):
+            resource["identifier"] = [{"value": form["form_id"]}]
+        yield resource
+
+
+RESOURCE_BUILDERS: Dict[str, Callable[[str, Dict[str, Any], str], Iterator[Dict[str, Any]]]] = {
+    "Patient": patient_resources,
+    "Condition": condition_resources,
+    "MedicationRequest": medication_request_resources,
+    "Consent": consent_resources,
+}
+
+
+def export_resource_type(
+    resource_type: str,
+    consultations_dir: str,
+    forms_dir: str,
+    output_dir: str,
+    archive_dir: Optional[str] = None,
+) -> Tuple[str, int]:
+    """Stream one resource type to ``<output_dir>/<resource_type>.ndjson``.
+
+    Patients sharing an identifier are written once; every other resource
+    is written as it is produced, so memory stays flat regardless of export
+    size.
+    """
+    builder = RESOURCE_BUILDERS[resource_type]
+    path = os.path.join(output_dir, f"{resource_type}.ndjson")
+    tmp_path = f"{path}.tmp"
+    seen_patients = set()
+    count = 0
+    with open(tmp_path, "w", buffering=WRITE_BUFFER_BYTES) as out:
+        for consultation_id, record in iter_consultations(consultations_dir, archive_dir):
+            for resource in builder(consultation_id, record, forms_dir):
+                # Per-consultation Patients are unique by construction; only identified ones repeat
+                if resource_type == "Patient" and "identifier" in resource:
+                    if resource["id"] in seen_patients:
+                        continue
+                    seen_patients.add(resource["id"])
+                out.write(json.dumps(resource, separators=(",", ":")))
+                out.write("\n")
+                count += 1
+    os.replace(tmp_path, path)
+    return resource_type, count
+
+
+def export_bulk(
+    consultations_dir: str = "consultations",
+    forms_dir: str = "generated_forms",
+    output_dir: str = "fhir_export",
+    resource_types: Optional[List[str]] = None,
+    archive_dir: Optional[str] = None,
+    parallel: bool = True,
+) -> Dict[str, int]:
+    """Export consultations and forms as FHIR NDJSON, one process per resource type."""
+    os.makedirs(output_dir, exist_ok=True)
+    resource_types = resource_types or list(RESOURCE_BUILDERS)
+    args = [(rt, consultations_dir, forms_dir, output_dir, archive_dir) for rt in resource_types]
+
+    if parallel and len(resource_types) > 1:
+        with ProcessPoolExecutor(max_workers=len(resource_types)) as executor:
+            results = list(executor.map(export_resource_type, *zip(*args)))
+    else:
+        results = [export_resource_type(*a) for a in args]
+    return dict(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk export consultations as FHIR NDJSON.")
+    parser.add_argument("--consultations-dir", default="consultations")
+    parser.add_argument("--forms-dir", default="generated_forms")
+    parser.add_argument("--output-dir", default="fhir_export")
+    parser.add_argument("--types", nargs="*", choices=list(RESOURCE_BUILDERS), default=None)
+    parser.add_argument("--serial", action="store_true", help="Export resource types one after another")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = export_bulk(args.consultations_dir, args.forms_dir, args.output_dir, args.types, parallel=not args.serial)
+    for resource_type, count in counts.items():
+        print(f"Exported {count} {resource_type} resources")
+    print(f"Finished in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
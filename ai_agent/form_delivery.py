@@ -0,0 +1,379 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_QUEUE_DB = "outbound_queue.db"
+MAX_BATCH_SIZE = 50
+MAX_ATTEMPTS = 8
+BASE_BACKOFF_SECONDS = 2.0
+MAX_BACKOFF_SECONDS = 600.0
+
+
+def form_content_hash(form: Dict[str, Any]) -> str:
+    """Hash of a form's content, ignoring its form_id (regenerated with a timestamp on every run)."""
+    content = {key: value for key, value in form.items() if key != "form_id"}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def idempotency_key(consultation_id: str, clinic_id: str, form_type: str, content_hash: str, revision: int) -> str:
+    """Stable key per form version, so a redelivered form is recognised by the receiver but a revision is not."""
+    return hashlib.sha256(f"{consultation_id}|{clinic_id}|{form_type}|{content_hash}|{revision}".encode()).hexdigest()
+
+
+def create_session(pool_size: int = 16, retries: int = 3) -> requests.Session:
+    """HTTP session with pooled keep-alive connections and transport retries."""
+    session = requests.Session()
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["POST"]),
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class DeliveryQueue:
+    """Persistent SQLite outbox for generated forms.
+
+    Forms are enqueued with an idempotency key per (consultation, clinic,
+    form type, content), so enqueueing an unchanged consultation twice is a
+    no-op, while a regenerated form whose content changed is queued as a new
+    version and supersedes older versions that haven't been sent yet.
+    ``deliver_pending`` claims due items, groups them by destination and
+    sends each group as one batched POST over pooled connections. Failed
+    items are retried with exponential backoff until ``MAX_ATTEMPTS``.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_QUEUE_DB, session: Optional[requests.Session] = None, timeout: float = 10.0):
+        self.db_path = db_path
+        self.timeout = timeout
+        self._session = session
+        self._lock = threading.Lock()
+        self._init_db()
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            self._session = create_session()
+        return self._session
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self):
+        """Create the outbox table if it doesn't exist."""
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS outbound_forms (
+                    idempotency_key TEXT PRIMARY KEY,
+                    consultation_id TEXT NOT NULL,
+                    clinic_id TEXT NOT NULL,
+                    intake_url TEXT NOT NULL,
+                    form_type TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    delivered_at REAL,
+                    last_error TEXT
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_outbound_due ON outbound_forms(status, next_attempt_at)')
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_outbound_form ON outbound_forms(consultation_id, clinic_id, form_type)'
+            )
+
+    def enqueue_forms(self, consultation_id: str, routing: Dict[str, Any], forms: Dict[str, Dict[str, Any]]) -> int:
+        """Queue every form of a consultation for its routed clinic.
+
+        A form whose content matches the latest queued version for the same
+        clinic is skipped. Returns the number of newly queued forms.
+        """
+        destination = routing["destination"]
+        now = time.time()
+        queued = 0
+        with self._connect() as conn:
+            for form_type, form in forms.items():
+                content_hash = form_content_hash(form)
+                versions = conn.execute('''
+                    SELECT payload FROM outbound_forms
+                    WHERE consultation_id = ? AND clinic_id = ? AND form_type = ?
+                    ORDER BY created_at DESC, rowid DESC
+                ''', (consultation_id, destination["id"], form_type)).fetchall()
+                if versions and form_content_hash(json.loads(versions[0][0])) == content_hash:
+                    continue
+                # Only the newest version needs to reach the clinic; one already in flight is left alone
+                conn.execute('''
+                    UPDATE outbound_forms SET status = 'superseded'
+                    WHERE consultation_id = ? AND clinic_id = ? AND form_type = ? AND status IN ('pending', 'failed')
+                ''', (consultation_id, destination["id"], form_type))
+                conn.execute('''
+                    INSERT OR IGNORE INTO outbound_forms
+                        (idempotency_key, consultation_id, clinic_id, intake_url, form_type, payload, next_attempt_at, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    # The revision keeps a change that reverts to earlier content distinct from it
+                    idempotency_key(consultation_id, destination["id"], form_type, content_hash, len(versions)),
+                    consultation_id,
+                    destination["id"],
+                    destination["intake_url"],
+                    form_type,
+                    json.dumps(form, separators=(",", ":")),
+                    now,
+                    now,
+                ))
+                queued += 1
+        return queued
+
+    def _claim_due(self, limit: int) -> List[tuple]:
+        """Mark due items as in flight and return them."""
+        now = time.time()
+        with self._connect() as conn:
+            rows = conn.execute('''
+                SELECT idempotency_key, consultation_id, clinic_id, intake_url, form_type, payload, attempts
+                FROM outbound_forms
+                WHERE status = 'pending' AND next_attempt_at <= ?
+                ORDER BY next_attempt_at
+                LIMIT ?
+            ''', (now, limit)).fetchall()
+            conn.executemany(
+                "UPDATE outbound_forms SET status = 'sending' WHERE idempotency_key = ?",
+                [(row[0],) for row in rows]
+            )
+        return rows
+
+    def _send_batch(self, intake_url: str, batch: List[tuple]) -> Optional[str]:
+        """POST one batch to a clinic. Returns an error string on failure."""
+        body = {
+            "deliveries": [
+                {
+                    "idempotency_key": row[0],
+                    "consultation_id": row[1],
+                    "form_type": row[4],
+                    "form": json.loads(row[5]),
+                }
+                for row in batch
+            ]
+        }
+        batch_key = hashlib.sha256("".join(sorted(row[0] for row in batch)).encode()).hexdigest()
+        try:
+            response = self.session.post(
+                intake_url,
+                json=body,
+                headers={"Idempotency-Key": batch_key},
+                timeout=self.timeout,
+            )
+            if response.status_code >= 400:
+                return f"HTTP {response.status_code}: {response.text[:200]}"
+            return None
+        except requests.RequestException as e:
+            return str(e)
+
+    def _record_results(self, delivered: List[str], failed: List[tuple]):
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE outbound_forms SET status = 'delivered', delivered_at = ?, last_error = NULL "
+                "WHERE idempotency_key = ?",
+                [(now, key) for key in delivered]
+            )
+            updates = []
+            for key, attempts, error in failed:
+                attempts += 1
+                status = "failed" if attempts >= MAX_ATTEMPTS else "pending"
+                backoff = min(BASE_BACKOFF_SECONDS * (2 ** (attempts - 1)), MAX_BACKOFF_SECONDS)
+                updates.append((status, attempts, now + backoff, error, key))
+            conn.executemany(
+                "UPDATE outbound_forms SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? "
+                "WHERE idempotency_key = ?",
+                updates
+            )
+
+    def deliver_pending(self, limit: int = 1000, batch_size: int = MAX_BATCH_SIZE) -> Dict[str, int]:
+        """Deliver due forms, batched per destination clinic."""
+        with self._lock:
+            rows = self._claim_due(limit)
+            by_destination = defaultdict(list)
+            for row in rows:
+                by_destination[row[3]].append(row)
+
+            delivered, failed = [], []
+            for intake_url, items in by_destination.items():
+                for start in range(0, len(items), batch_size):
+                    batch = items[start:start + batch_size]
+                    error = self._send_batch(intake_url, batch)
+                    if error is None:
+                        delivered.extend(row[0] for row in batch)
+                    else:
+                        failed.extend((row[0], row[6], error) for row in batch)
+
+            self._record_results(delivered, failed)
+        return {"delivered": len(delivered), "failed": len(failed)}
+
+    def recover_in_flight(self) -> int:
+        """Return items left 'sending' by a crashed worker to the queue."""
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE outbound_forms SET status = 'pending' WHERE status = 'sending'"
+            ).rowcount
+
+    def run_forever(self, interval: float = 2.0):
+        """Deliver continuously, sleeping only when the queue is idle."""
+        self.recover_in_flight()
+        while True:
+            result = self.deliver_pending()
+            if not result["delivered"] and not result["failed"]:
+                time.sleep(interval)
+
+    def backlog_metrics(self) -> Dict[str, Any]:
+        """Queue depth, per-clinic backlog and age of the oldest pending item."""
+        now = time.time()
+        with self._connect() as conn:
+            counts = dict(conn.execute('SELECT status, COUNT(*) FROM outbound_forms GROUP BY status'))
+            oldest = conn.execute(
+                "SELECT MIN(created_at) FROM outbound_forms WHERE status IN ('pending', 'sending')"
+            ).fetchone()[0]
+            per_clinic = dict(conn.execute(
+                "SELECT clinic_id, COUNT(*) FROM outbound_forms WHERE status = 'pending' GROUP BY clinic_id"
+            ))
+            delivered_last_minute = conn.execute(
+                "SELECT COUNT(*) FROM outbound_forms WHERE status = 'delivered' AND delivered_at >= ?",
+                (now - 60,)
+            ).fetchone()[0]
+        return {
+            "pending": counts.get("pending", 0),
+            "sending": counts.get("sending", 0),
+            "delivered": counts.get("delivered", 0),
+            "failed": counts.get("failed", 0),
+            "superseded": counts.get("superseded", 0),
+            "oldest_pending_age_seconds": now - oldest if oldest else 0.0,
+            "pending_by_clinic": per_clinic,
+            "delivered_last_minute": delivered_last_minute,
+        }
+
+
+class StandInReceiver:
+    """Local clinic intake endpoint for tests and throughput benchmarks.
+
+    Accepts batched deliveries on any path, deduplicates by idempotency key
+    and can be told to fail a fraction of requests.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, failure_rate: float = 0.0):
+        receiver = self
+        self.received: Dict[str, Dict[str, Any]] = {}
+        self.requests = 0
+        self.failure_rate = failure_rate
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out as separate writes; avoid the delayed-ACK stall
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length))
+                with receiver._lock:
+                    receiver.requests += 1
+                    fail = random.random() < receiver.failure_rate
+                    if not fail:
+                        for delivery in body["deliveries"]:
+                            receiver.received.setdefault(delivery["idempotency_key"], delivery)
+                status = 503 if fail else 200
+                payload = b'{"ok":false}' if fail else b'{"ok":true}'
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self) -> "StandInReceiver":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def benchmark_delivery(consultations: int = 2000, clinics: int = 20, db_path: str = "outbound_benchmark.db") -> Dict[str, Any]:
+    """Measure end-to-end delivery throughput against a StandInReceiver."""
+    def remove_db():
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+    remove_db()
+    form_types = ["registration", "medical_history", "consent", "hipaa", "insurance"]
+
+    with StandInReceiver() as receiver:
+        queue = DeliveryQueue(db_path)
+        start = time.perf_counter()
+        for i in range(consultations):
+            clinic = f"clinic-{i % clinics}"
+            routing = {"destination": {"id": clinic, "intake_url": f"{receiver.url}/intake/{clinic}"}}
+            forms = {form_type: {"form_type": form_type, "timestamp": datetime.now().isoformat()} for form_type in form_types}
+            queue.enqueue_forms(f"consultation_{i}", routing, forms)
+        enqueued = time.perf_counter()
+
+        while queue.backlog_metrics()["pending"]:
+            queue.deliver_pending(limit=5000)
+        finished = time.perf_counter()
+
+        total_forms = consultations * len(form_types)
+        result = {
+            "forms": total_forms,
+            "received": len(receiver.received),
+            "http_requests": receiver.requests,
+            "enqueue_per_second": total_forms / (enqueued - start),
+            "deliver_per_second": total_forms / (finished - enqueued),
+        }
+    remove_db()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deliver queued forms to clinics.")
+    parser.add_argument("--db", default=DEFAULT_QUEUE_DB)
+    parser.add_argument("--benchmark", action="store_true", help="Benchmark against a local stand-in receiver")
+    parser.add_argument("--metrics", action="store_true", help="Print backlog metrics and exit")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print(json.dumps(benchmark_delivery(), indent=2))
+    elif args.metrics:
+        print(json.dumps(DeliveryQueue(args.db).backlog_metrics(), indent=2))
+    else:
+        DeliveryQueue(args.db).run_forever()
+
+
+if __name__ == "__main__":
+    main()
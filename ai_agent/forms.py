@@ -1,16 +1,90 @@
+import argparse
+import hashlib
 import json
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
+
+from clinic_directory import check_routing_config, route_consultation
+from form_delivery import DeliveryQueue
+
+MANIFEST_FILENAME = "forms_manifest.json"
+
+# Form type slug -> MedicalFormGenerator method that builds it
+FORM_GENERATORS = {
+    "registration": "generate_patient_registration_form",
+    "medical_history": "generate_medical_history_form",
+    "consent": "generate_consent_form",
+    "hipaa": "generate_hipaa_form",
+    "insurance": "generate_insurance_form",
+}
 
 class MedicalFormGenerator:
     def __init__(self, consultation_file_path: str):
+        self.consultation_id = os.path.splitext(os.path.basename(consultation_file_path))[0]
         self.consultation_data = self._load_consultation_data(consultation_file_path)
         
     def _load_consultation_data(self, file_path: str) -> Dict[str, Any]:
         """Load and parse the consultation JSON file."""
         with open(file_path, 'r') as f:
-            return json.load(f)
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError(f"Not a consultation record: {file_path}")
+        # Phone consultations record their time as consultation_date
+        if "timestamp" not in data and "consultation_date" in data:
+            data["timestamp"] = data["consultation_date"]
+        if "timestamp" not in data:
+            raise ValueError(f"Consultation has no timestamp: {file_path}")
+        return data
+
+    def _symptoms(self) -> List[Dict[str, str]]:
+        """Symptoms as name/duration/severity dicts.
+
+        The interview agent stores a list of dicts; phone consultations store
+        the caller's free-text answer.
+        """
+        symptoms = self.consultation_data.get("symptoms") or []
+        if isinstance(symptoms, str):
+            symptoms = [symptoms]
+        return [
+            {
+                "name": symptom.get("name", ""),
+                "duration": symptom.get("duration", ""),
+                "severity": symptom.get("severity", ""),
+            } if isinstance(symptom, dict) else {"name": str(symptom), "duration": "", "severity": ""}
+            for symptom in symptoms
+        ]
+
+    def _medical_history(self) -> Dict[str, Any]:
+        """Medical history as a dict, whether it was saved as a dict, a list or free text."""
+        history = self.consultation_data.get("medical_history") or {}
+        if isinstance(history, dict):
+            return history
+        if isinstance(history, str):
+            history = [history]
+        return {"medical_history": list(history)}
+
+    def _prescribed_medications(self) -> List[Dict[str, str]]:
+        """Prescribed medications with name, dosage and purpose always present."""
+        prescription = self.consultation_data.get("prescription") or {}
+        if not isinstance(prescription, dict):
+            return []
+        return [
+            {
+                "name": str(med.get("name") or ""),
+                "dosage": str(med.get("dosage") or ""),
+                "purpose": str(med.get("purpose") or ""),
+            } if isinstance(med, dict) else {"name": str(med), "dosage": "", "purpose": ""}
+            for med in prescription.get("medications", [])
+        ]
+
+    def _prescribed_tests(self) -> List[Any]:
+        prescription = self.consultation_data.get("prescription") or {}
+        return prescription.get("tests", []) if isinstance(prescription, dict) else []
     
     def generate_patient_registration_form(self) -> Dict[str, Any]:
         """Generate patient registration form data with specific required fields."""
@@ -52,8 +126,7 @@ class MedicalFormGenerator:
     
     def generate_medical_history_form(self) -> Dict[str, Any]:
         """Generate medical history form with specified fields."""
-        medical_history = self.consultation_data.get("medical_history", {})
-        symptoms = self.consultation_data.get("symptoms", [])
+        medical_history = self._medical_history()
         
         return {
             "form_type": "Medical History",
@@ -61,14 +134,7 @@ class MedicalFormGenerator:
             "current_conditions": {
                 "primary_diagnosis": self.consultation_data.get("diagnosis"),
                 "chronic_illnesses": [],
-                "ongoing_symptoms": [
-                    {
-                        "name": symptom["name"],
-                        "duration": symptom["duration"],
-                        "severity": symptom["severity"]
-                    }
-                    for symptom in symptoms
-                ]
+                "ongoing_symptoms": self._symptoms()
             },
             "past_medical_history": {
                 "illnesses": medical_history.get("medical_history", []),
@@ -81,10 +147,11 @@ class MedicalFormGenerator:
                     {
                         "name": med["name"],
                         "dosage": med["dosage"],
-                        "frequency": med["dosage"].split()[-2],
+                        # "500mg twice daily" -> "twice"; short dosages carry no frequency
+                        "frequency": med["dosage"].split()[-2] if len(med["dosage"].split()) > 1 else "",
                         "purpose": med["purpose"]
                     }
-                    for med in self.consultation_data.get("prescription", {}).get("medications", [])
+                    for med in self._prescribed_medications()
                 ],
                 "over_the_counter": [],
                 "supplements": []
@@ -126,9 +193,9 @@ class MedicalFormGenerator:
                         "potential_risks": "",
                         "benefits": ""
                     }
-                    for med in self.consultation_data.get("prescription", {}).get("medications", [])
+                    for med in self._prescribed_medications()
                 ],
-                "procedures": self.consultation_data.get("prescription", {}).get("tests", [])
+                "procedures": self._prescribed_tests()
             },
             "emergency_authorization": {
                 "authorized": False,
@@ -222,8 +289,14 @@ class MedicalFormGenerator:
             json.dump(form_data, f, indent=2)
         print(f"Generated {form_type} form: {filename}")
     
-    def generate_and_save_all_forms(self, output_path: str) -> None:
-        """Generate and save all forms as separate JSON files."""
+    def generate_and_save_all_forms(self, output_path: str, delivery_queue: Optional[DeliveryQueue] = None) -> Optional[Dict[str, Any]]:
+        """Generate and save all forms as separate JSON files.
+
+        If a clinic directory is available and the patient can be located
+        (coordinates, postcode or city), the consultation is also routed to the nearest suitable clinic, the
+        routing decision is saved alongside the forms and the forms are queued
+        for delivery to that clinic.
+        """
         # Create forms
         registration = self.generate_patient_registration_form()
         medical_history = self.generate_medical_history_form()
@@ -238,25 +311,226 @@ class MedicalFormGenerator:
         self.save_individual_form(hipaa, output_path, "HIPAA")
         self.save_individual_form(insurance, output_path, "Insurance")
 
+        # Route the paperwork to the nearest suitable clinic
+        routing = route_consultation(self.consultation_data)
+        if routing:
+            self.save_individual_form(routing, output_path, "Routing")
+            if routing["destination"].get("intake_url"):
+                queue = delivery_queue or DeliveryQueue()
+                queue.enqueue_forms(self.consultation_id, routing, {
+                    "registration": registration,
+                    "medical_history": medical_history,
+                    "consent": consent,
+                    "hipaa": hipaa,
+                    "insurance": insurance,
+                })
+        return routing
+
+class FormRenderCache:
+    """Bounded LRU + TTL cache of rendered forms.
+
+    Entries are keyed by (consultation path, form type) and remember the
+    consultation file's mtime and size, so a changed consultation is
+    re-rendered on the next request without explicit invalidation.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Tuple[int, int], float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, consultation_path: str, form_type: str) -> Dict[str, Any]:
+        """Return the requested form, rendering it only on a cache miss."""
+        if form_type not in FORM_GENERATORS:
+            raise ValueError(f"Unknown form type: {form_type}")
+
+        stat = os.stat(consultation_path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        key = (os.path.abspath(consultation_path), form_type)
+        now = time.monotonic()
+
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached and cached[0] == version and cached[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached[2]
+            self.misses += 1
+
+        generator = MedicalFormGenerator(consultation_path)
+        form = getattr(generator, FORM_GENERATORS[form_type])()
+
+        with self._lock:
+            self._entries[key] = (version, now + self.ttl_seconds, form)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return form
+
+    def invalidate(self, consultation_path: str) -> None:
+        """Drop every cached form for a consultation."""
+        path = os.path.abspath(consultation_path)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == path]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache size and hit rate."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_manifest(forms_output_dir: str) -> Dict[str, Dict[str, Any]]:
+    """Load the manifest of already processed consultations."""
+    manifest_path = os.path.join(forms_output_dir, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Ignoring unreadable manifest {manifest_path}: {str(e)}")
+        return {}
+
+def save_manifest(manifest: Dict[str, Dict[str, Any]], forms_output_dir: str) -> None:
+    """Write the manifest atomically so an interrupted run never corrupts it."""
+    manifest_path = os.path.join(forms_output_dir, MANIFEST_FILENAME)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def _process_consultation(consultation_path: str, forms_output_dir: str, digest: str) -> Tuple[str, Dict[str, Any]]:
+    """Generate all forms for one consultation. Runs inside a worker process."""
+    filename = os.path.basename(consultation_path)
+    stat = os.stat(consultation_path)
+    entry = {
+        "sha256": digest,
+        "mtime": stat.st_mtime,
+        "size": stat.st_size,
+        "processed_at": datetime.now().isoformat(),
+    }
+    try:
+        form_generator = MedicalFormGenerator(consultation_path)
+        form_generator.generate_and_save_all_forms(forms_output_dir)
+        entry["status"] = "ok"
+    except Exception as e:
+        entry["status"] = "error"
+        entry["error"] = str(e)
+    return filename, entry
+
+def find_pending_consultations(consultations_dir: str, manifest: Dict[str, Dict[str, Any]], force: bool = False) -> List[Tuple[str, str]]:
+    """Return (path, digest) for consultations that are new or have changed."""
+    pending = []
+    for filename in sorted(os.listdir(consultations_dir)):
+        if not filename.endswith(".json"):
+            continue
+        consultation_path = os.path.join(consultations_dir, filename)
+        stat = os.stat(consultation_path)
+        entry = manifest.get(filename, {})
+        # Unchanged size and mtime means unchanged content; skip the hash
+        if not force and entry.get("mtime") == stat.st_mtime and entry.get("size") == stat.st_size:
+            continue
+        digest = file_digest(consultation_path)
+        if not force and entry.get("sha256") == digest:
+            entry.update(mtime=stat.st_mtime, size=stat.st_size)
+            continue
+        pending.append((consultation_path, digest))
+    return pending
+
+def process_consultations(
+    consultations_dir: str = "consultations",
+    forms_output_dir: str = "generated_forms",
+    max_workers: Optional[int] = None,
+    force: bool = False,
+) -> int:
+    """Generate forms for new or changed consultations across a process pool.
+
+    Consultations whose content hash matches the manifest are skipped, so a
+    run over an unchanged directory only costs a hash per file. Returns the
+    number of consultations processed.
+    """
+    os.makedirs(forms_output_dir, exist_ok=True)
+    manifest = load_manifest(forms_output_dir)
+    pending = find_pending_consultations(consultations_dir, manifest, force)
+
+    if not pending:
+        # Still persist any refreshed mtimes from the fast path
+        save_manifest(manifest, forms_output_dir)
+        return 0
+
+    # Small batches aren't worth the process start-up cost
+    if len(pending) == 1 or max_workers == 1:
+        results = [_process_consultation(path, forms_output_dir, digest) for path, digest in pending]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(_process_consultation, path, forms_output_dir, digest)
+                for path, digest in pending
+            ]
+            results = [future.result() for future in as_completed(futures)]
+
+    for filename, entry in results:
+        manifest[filename] = entry
+        if entry["status"] == "ok":
+            print(f"Successfully processed: {filename}")
+        else:
+            print(f"Error processing {filename}: {entry['error']}")
+
+    save_manifest(manifest, forms_output_dir)
+    return len(results)
+
+def watch_consultations(
+    consultations_dir: str = "consultations",
+    forms_output_dir: str = "generated_forms",
+    interval: float = 5.0,
+    max_workers: Optional[int] = None,
+) -> None:
+    """Poll for new consultations and build forms only for those."""
+    print(f"Watching {consultations_dir} for new consultations (every {interval}s)...")
+    last_mtime = None
+    while True:
+        mtime = os.stat(consultations_dir).st_mtime
+        if mtime != last_mtime:
+            last_mtime = mtime
+            processed = process_consultations(consultations_dir, forms_output_dir, max_workers)
+            if processed:
+                print(f"Processed {processed} new or changed consultations")
+        time.sleep(interval)
+
 def main():
+    parser = argparse.ArgumentParser(description="Generate medical forms from saved consultations.")
     # Directory containing consultation files
-    consultations_dir = "consultations"
+    parser.add_argument("--consultations-dir", default="consultations")
     # Directory for output forms
-    forms_output_dir = "generated_forms"
-    
-    # Create output directory if it doesn't exist
-    os.makedirs(forms_output_dir, exist_ok=True)
-    
-    # Process all consultation files in the directory
-    for filename in os.listdir(consultations_dir):
-        if filename.endswith(".json"):
-            consultation_path = os.path.join(consultations_dir, filename)
-            try:
-                form_generator = MedicalFormGenerator(consultation_path)
-                form_generator.generate_and_save_all_forms(forms_output_dir)
-                print(f"Successfully processed: {filename}")
-            except Exception as e:
-                print(f"Error processing {filename}: {str(e)}")
+    parser.add_argument("--output-dir", default="generated_forms")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Regenerate forms even for unchanged consultations")
+    parser.add_argument("--watch", action="store_true", help="Keep running and process new consultations as they arrive")
+    parser.add_argument("--interval", type=float, default=5.0, help="Polling interval in seconds for --watch")
+    args = parser.parse_args()
+    check_routing_config()
+
+    if args.watch:
+        watch_consultations(args.consultations_dir, args.output_dir, args.interval, args.workers)
+    else:
+        process_consultations(args.consultations_dir, args.output_dir, args.workers, args.force)
 
 if __name__ == "__main__":
     main()
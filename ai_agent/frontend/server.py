@@ -1,39 +1,113 @@
-from http.server import HTTPServer, SimpleHTTPRequestHandler
-import json
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
 import os
+import re
+import sys
+import zlib
 from urllib.parse import parse_qs, urlparse
 
+# Add the parent directory to PYTHONPATH
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from consultation_store import ConsultationIndex
+
+CONSULTATIONS_DIR = os.path.join(current_dir, 'consultations')
+STATIC_CACHE_EXTENSIONS = ('.js', '.css', '.png', '.jpg', '.jpeg', '.svg', '.ico', '.woff', '.woff2')
+STATIC_MAX_AGE = 31536000  # One year
+# Only names carrying a content hash (app.3f9a1c2b.js, logo-9e107d9d.png) are
+# safe to cache forever; anything else must be revalidated or edits never reach browsers
+HASHED_ASSET = re.compile(r'[.-][0-9a-f]{8,}\.[a-z0-9]+$')
+STREAM_CHUNK_SIZE = 64 * 1024
+
+consultation_index = ConsultationIndex(CONSULTATIONS_DIR)
+
+
 class CORSRequestHandler(SimpleHTTPRequestHandler):
+    # HTTP/1.1 is required for chunked transfer encoding
+    protocol_version = 'HTTP/1.1'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=current_dir, **kwargs)
+
     def end_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET')
-        self.send_header('Cache-Control', 'no-store, no-cache, must-revalidate')
+        path = urlparse(self.path).path
+        if path.endswith(STATIC_CACHE_EXTENSIONS) and HASHED_ASSET.search(path):
+            self.send_header('Cache-Control', f'public, max-age={STATIC_MAX_AGE}, immutable')
+        elif path.endswith(STATIC_CACHE_EXTENSIONS):
+            # Revalidated with If-Modified-Since, so unchanged assets still cost only a 304
+            self.send_header('Cache-Control', 'public, no-cache')
+        else:
+            self.send_header('Cache-Control', 'no-store, no-cache, must-revalidate')
         return super().end_headers()
 
+    def _write_chunk(self, data: bytes):
+        if data:
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+
+    def _stream_json(self, fragments):
+        """Stream JSON fragments with chunked encoding, gzipped when accepted."""
+        use_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if use_gzip else None
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+
+        buffer = bytearray()
+        for fragment in fragments:
+            buffer += compressor.compress(fragment) if compressor else fragment
+            if len(buffer) >= STREAM_CHUNK_SIZE:
+                self._write_chunk(bytes(buffer))
+                buffer.clear()
+        if compressor:
+            buffer += compressor.flush()
+        self._write_chunk(bytes(buffer))
+        self.wfile.write(b"0\r\n\r\n")
+
     def do_GET(self):
+        parsed = urlparse(self.path)
+
         # Handle /list-consultations endpoint
-        if self.path == '/list-consultations':
+        if parsed.path == '/list-consultations':
+            params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
             try:
-                consultations_dir = os.path.join(os.path.dirname(__file__), 'consultations')
-                if not os.path.exists(consultations_dir):
-                    os.makedirs(consultations_dir)
-                
-                files = [f for f in os.listdir(consultations_dir) 
-                        if f.startswith('consultation_') and f.endswith('.json')]
-                
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps(files).encode())
+                consultation_index.sync()
+                fragments = consultation_index.iter_page_json(
+                    limit=int(params.get('limit', 50)),
+                    cursor=params.get('cursor'),
+                    since=params.get('since'),
+                    until=params.get('until'),
+                    patient=params.get('patient'),
+                )
+                # Materialize the first fragment so query errors surface as a 400
+                # before any headers are sent.
+                first = next(fragments)
+            except ValueError as e:
+                self.send_error(400, str(e))
                 return
             except Exception as e:
                 self.send_error(500, str(e))
                 return
 
+            def all_fragments():
+                yield first
+                yield from fragments
+
+            self._stream_json(all_fragments())
+            return
+
         return super().do_GET()
 
+
 if __name__ == '__main__':
     server_address = ('', 8000)
-    httpd = HTTPServer(server_address, CORSRequestHandler)
+    httpd = ThreadingHTTPServer(server_address, CORSRequestHandler)
     print('Server running on port 8000...')
-    httpd.serve_forever() 
\ No newline at end of file
+    httpd.serve_forever()
@@ -26,6 +26,10 @@ from coinbase_agentkit import (
     twitter_action_provider,
 )
 from browser_use import Browser, BrowserConfig
+from consultation_store.journal import ConsultationJournal, atomic_write_json, recover_orphaned_journals
+from consultation_store.search import ConsultationSearchIndex
+from consultation_store.analytics import ConsultationAnalytics
+from medical_agent.medical_knowledge_base import MedicalKnowledgeBase
 
 # Load environment variables
 load_dotenv(override=True)
@@ -88,6 +92,24 @@ class DoctorPatientAgent:
         self.current_symptoms = []
         self.medical_history = []
         self.prescription = []
+        # Per-session append-only journal, created on the first recorded turn
+        self.journal = None
+        # Phone consultation state; reset by start_session for every new call
+        self.session_id = None
+        self.caller_location = {}
+        self.call_state = 'greeting'
+        self.demographics = {}
+        self.call_history = []
+        # Full-text index and analytics rollups, updated as each consultation is saved
+        self.search_index = ConsultationSearchIndex()
+        self.analytics = ConsultationAnalytics()
+        # Literature retrieval for follow-ups and prescriptions; skipped while the collection is empty
+        self.medical_kb = None
+        if os.getenv("USE_MEDICAL_KNOWLEDGE_BASE", "true").lower() == "true":
+            try:
+                self.medical_kb = MedicalKnowledgeBase()
+            except Exception as e:
+                logger.error(f"Medical knowledge base unavailable: {e}")
         
     async def record_voice_input(self) -> str:
         """Record audio from the user and transcribe it to text."""
@@ -131,9 +153,37 @@ class DoctorPatientAgent:
         except Exception as e:
             logger.error(f"Error in text-to-speech: {e}")
 
+    def start_session(self, session_id: Optional[str] = None, caller_location: Optional[Dict[str, str]] = None) -> None:
+        """Begin a new consultation, discarding all state from the previous one.
+
+        The agent is shared across phone calls, so a call that dropped before
+        finalize_record would otherwise leak its turns and answers into the
+        next caller's record. Its journal is closed and left on disk, where
+        recover_orphaned_journals salvages it as an incomplete consultation.
+
+        caller_location ({"city", "postcode"}, e.g. from the phone network)
+        is used for clinic routing when the caller doesn't say where they are.
+        """
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        self.session_id = session_id
+        self.caller_location = {k: v for k, v in (caller_location or {}).items() if v}
+        self.call_state = 'greeting'
+        self.demographics = {}
+        self.call_history = []
+        self.chief_complaint = None
+        self.symptoms = None
+        self.medications = None
+        self.patient_data = {}
+        self.current_symptoms = []
+        self.medical_history = []
+        self.prescription = []
+
     async def conduct_consultation(self):
         """Conduct the medical consultation process."""
         logger.info("Starting medical consultation...")
+        self.start_session()
 
         # Greet user with a calm and welcoming demeanor
         greeting = "Hello, I'm Dr. Agent. I'm here to help you today. Can you please share your symptoms with me?"
@@ -241,13 +291,36 @@ class DoctorPatientAgent:
             logger.error(f"Error parsing symptoms: {e}. Response was: {result.text()}")
             return []  # Return empty list to continue consultation
 
+    async def retrieve_medical_context(self, n_results: int = 4) -> str:
+        """Retrieve literature passages relevant to the patient's symptoms and history."""
+        if self.medical_kb is None or not self.current_symptoms:
+            return ""
+        if self.medical_kb.manifest.stats()["count"] == 0:
+            return ""
+        symptoms = ", ".join(
+            f"{s.get('severity', '')} {s.get('name', '')} for {s.get('duration', '')}".strip()
+            if isinstance(s, dict) else str(s)
+            for s in self.current_symptoms
+        )
+        query = f"{symptoms}. History: {self.medical_history}" if self.medical_history else symptoms
+        try:
+            results = await self.medical_kb.aquery_knowledge_base(query, n_results)
+        except Exception as e:
+            logger.error(f"Error retrieving medical context: {e}")
+            return ""
+        return self.medical_kb.format_query_results(results) if results else ""
+
     async def generate_followup_question(self) -> str:
         """Generate context-aware medical follow-up question with diagnostic focus."""
+        literature = await self.retrieve_medical_context()
         prompt = f"""
         Based on the collected data:
         Symptoms: {self.current_symptoms}
         Medical History: {self.medical_history}
         
+        Relevant medical literature (may be empty):
+        {literature}
+        
         Identify any gaps in information required to hypothesize a differential diagnosis. Frame a follow-up question focusing on:
         - Precision in symptom description (onset, duration, triggers)
         - Elucidating possible differential diagnoses
@@ -278,11 +351,15 @@ class DoctorPatientAgent:
 
     async def generate_prescription(self):
         """Create medical prescription based on collected data."""
+        literature = await self.retrieve_medical_context()
         prompt = f"""
         Patient Presentation:
         Symptoms: {self.current_symptoms}
         Medical History: {self.medical_history}
         
+        Relevant medical literature (may be empty; prefer it over general knowledge where it applies):
+        {literature}
+        
         Create a structured prescription including:
         - Medications (name, dosage, duration)
         - Diagnostic tests
@@ -310,6 +387,36 @@ class DoctorPatientAgent:
         for med in self.prescription["prescription"]["medications"]:
             print(f"- {med['name']}: {med['dosage']} for {med['duration']}")
 
+    def record_turn(self, turn: Dict[str, Any]) -> None:
+        """Append a conversation turn to the session journal."""
+        if self.journal is None:
+            self.journal = ConsultationJournal()
+        self.journal.append(turn)
+
+    async def finalize_record(self, data: Dict[str, Any], filename: str) -> str:
+        """Compact the session journal into the final consultation file."""
+        journal, self.journal = self.journal, None
+        if journal is None:
+            # No turns were journaled, so there is nothing to compact
+            await asyncio.to_thread(atomic_write_json, data, filename)
+        else:
+            await journal.acompact(data, filename)
+        await asyncio.to_thread(self._index_saved_consultation, filename)
+        return filename
+
+    def _index_saved_consultation(self, filename: str) -> None:
+        """Update the search index and analytics rollups for a saved file.
+
+        Each update is attempted on its own so a failure in one doesn't
+        skip the other. The record is already durable either way; the
+        startup search sync re-indexes it.
+        """
+        for name, update in (("search index", self.search_index.index_file), ("analytics", self.analytics.record_file)):
+            try:
+                update(filename)
+            except Exception as e:
+                logger.error(f"Error updating {name} for consultation {filename}: {e}")
+
     async def save_consultation(self):
         """Save medical consultation data."""
         data = {
@@ -323,8 +430,7 @@ class DoctorPatientAgent:
         os.makedirs("consultations", exist_ok=True)
         filename = f"consultations/consultation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
         
-        with open(filename, 'w') as f:
-            json.dump(data, f, indent=2)
+        await self.finalize_record(data, filename)
             
         logger.info(f"Consultation saved to {filename}")
 
@@ -380,11 +486,13 @@ class DoctorPatientAgent:
                 raise MedicalConsultationException("User requested to exit consultation")
         
         # Record the conversation
-        self.conversation_history.append({
+        turn = {
             "question": question,
             "response": response,
             "timestamp": datetime.now().isoformat()
-        })
+        }
+        self.conversation_history.append(turn)
+        self.record_turn(turn)
         return response
 
     def is_exit_command(self, text: str) -> bool:
@@ -591,19 +699,19 @@ class DoctorPatientAgent:
 
     async def process_voice_input(self, text: str) -> str:
         """Process voice input from phone call and return spoken response"""
-        # Initialize conversation state if first call
-        if not hasattr(self, 'call_state'):
-            self.call_state = 'greeting'
-            self.demographics = {}
-            self.call_history = []
+        # A finished call leaves call_state at 'end'; the next input starts a new consultation
+        if self.call_state == 'end':
+            self.start_session()
 
         # Record input
-        self.call_history.append({"user": text, "timestamp": datetime.now().isoformat()})
+        user_turn = {"user": text, "timestamp": datetime.now().isoformat()}
+        self.call_history.append(user_turn)
+        self.record_turn(user_turn)
 
         # Process based on current state
         if self.call_state == 'greeting':
             # First, ask for demographics
-            response = "Hello, I'm your pulse healthcare assistant. Could you please tell me your name, age, and biological sex?"
+            response = "Hello, I'm your pulse healthcare assistant. Could you please tell me your name, age, biological sex, and the city or postcode you're calling from?"
             self.call_state = 'demographics'
 
         elif self.call_state == 'demographics':
@@ -618,7 +726,9 @@ class DoctorPatientAgent:
                 {{
                   "name": "patient name",
                   "age": "patient age as number",
-                  "sex": "biological sex (male/female)"
+                  "sex": "biological sex (male/female)",
+                  "city": "city the patient is in, or empty if not given",
+                  "postcode": "postcode or ZIP code, or empty if not given"
                 }}
                 """
                 result = await self.llm.ainvoke(prompt)
@@ -629,7 +739,7 @@ class DoctorPatientAgent:
                 self.call_state = 'chief_complaint'
             except:
                 # Retry demographics
-                response = "I didn't quite catch that. Could you please tell me your name, age, and biological sex?"
+                response = "I didn't quite catch that. Could you please tell me your name, age, biological sex, and the city or postcode you're calling from?"
 
         elif self.call_state == 'chief_complaint':
             # Process initial complaint
@@ -698,7 +808,9 @@ class DoctorPatientAgent:
             response = "Thank you for calling. Is there anything else I can help with?"
 
         # Record response
-        self.call_history.append({"doctor": response, "timestamp": datetime.now().isoformat()})
+        doctor_turn = {"doctor": response, "timestamp": datetime.now().isoformat()}
+        self.call_history.append(doctor_turn)
+        self.record_turn(doctor_turn)
         return response
 
     async def save_phone_consultation(self):
@@ -712,8 +824,14 @@ class DoctorPatientAgent:
         filename = f"consultations/phone_consultation_{patient_name}_{timestamp}.json"
         
         # Prepare consultation data
+        # Where the caller didn't say, fall back to the phone network's location for clinic routing
+        patient = dict(self.demographics)
+        for key, value in self.caller_location.items():
+            if not patient.get(key):
+                patient[key] = value
+
         consultation_data = {
-            "patient": self.demographics,
+            "patient": patient,
             "consultation_date": datetime.now().isoformat(),
             "symptoms": self.symptoms,
             "medical_history": self.medical_history,
@@ -722,13 +840,16 @@ class DoctorPatientAgent:
             "call_duration": (datetime.now() - datetime.fromisoformat(self.call_history[0]["timestamp"])).total_seconds()
         }
         
-        # Save to file
-        with open(filename, 'w') as f:
-            json.dump(consultation_data, f, indent=2)
-        
-        return filename
+        # Compact the journal into the final file off the event loop
+        return await self.finalize_record(consultation_data, filename)
 
 async def main():
+    # Salvage transcripts from sessions that were cut off by a crash
+    for path in recover_orphaned_journals():
+        logger.info(f"Recovered interrupted consultation: {path}")
+    # Index recovered records and anything saved while indexing was failing
+    logger.info(f"Search index sync: {ConsultationSearchIndex().sync()}")
+
     # Load character configuration
     with open("characters/interviewer.json", "r") as f:
         character_config = json.load(f)
@@ -0,0 +1,55 @@
+"""Shared building blocks for the Twitter and podcast knowledge bases."""
+
+from .async_retrieval import LoopStallMonitor, retrieval_stall_monitor, run_retrieval
+from .compact_index import CompactVectorIndex, build_from_collection, recall_at_k
+from .embedding_cache import EmbeddingCache, get_embedding_cache
+from .embeddings import (
+    DEFAULT_EMBEDDING_MODEL,
+    EMBEDDING_BACKENDS,
+    EmbeddingFunction,
+    get_embedding_model,
+    loaded_models,
+)
+from .manifest import CollectionManifest, file_fingerprint
+from .multi_query import arun_query, arun_query_many, parse_query_list, run_query_many
+from .query_cache import QueryCache, normalize_query
+from .state import connect_state_db
+from .vector_store import (
+    VECTOR_STORE_BACKENDS,
+    ChromaVectorStore,
+    CompactVectorStore,
+    NumpyVectorStore,
+    VectorStore,
+    open_vector_store,
+)
+
+__all__ = [
+    "LoopStallMonitor",
+    "retrieval_stall_monitor",
+    "run_retrieval",
+    "CompactVectorIndex",
+    "build_from_collection",
+    "recall_at_k",
+    "EmbeddingCache",
+    "get_embedding_cache",
+    "DEFAULT_EMBEDDING_MODEL",
+    "EMBEDDING_BACKENDS",
+    "EmbeddingFunction",
+    "get_embedding_model",
+    "loaded_models",
+    "CollectionManifest",
+    "file_fingerprint",
+    "arun_query",
+    "arun_query_many",
+    "parse_query_list",
+    "run_query_many",
+    "QueryCache",
+    "normalize_query",
+    "connect_state_db",
+    "VECTOR_STORE_BACKENDS",
+    "ChromaVectorStore",
+    "CompactVectorStore",
+    "NumpyVectorStore",
+    "VectorStore",
+    "open_vector_store",
+]
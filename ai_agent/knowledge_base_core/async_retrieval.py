@@ -0,0 +1,101 @@
+import asyncio
+import os
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, suppress
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+# Encoding and Chroma searches are CPU-heavy; a few workers keep concurrent
+# lookups moving without oversubscribing the cores the encoder already uses
+KB_QUERY_WORKERS = int(os.getenv("KB_QUERY_WORKERS", "4"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=KB_QUERY_WORKERS, thread_name_prefix="kb-query")
+    return _executor
+
+
+class LoopStallMonitor:
+    """Measures event-loop stalls while knowledge base retrievals are in flight.
+
+    A heartbeat task sleeps for ``interval`` seconds in a loop; any extra
+    time it takes to wake up is time the loop was blocked. Each event loop
+    gets its own heartbeat, started by the first ``track()`` block on that
+    loop and cancelled (and awaited) when its last one exits, so nothing
+    runs between retrievals and short-lived loops, such as one per web
+    request, close without pending tasks. Loops are held weakly.
+    """
+
+    def __init__(self, interval: float = 0.025, max_samples: int = 2048):
+        self.interval = interval
+        self._samples = deque(maxlen=max_samples)
+        self._retrievals = 0
+        self._total_stall = 0.0
+        # loop -> [retrievals in flight on it, heartbeat task, when its current sleep began]
+        self._loops: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, list]" = weakref.WeakKeyDictionary()
+
+    def _record(self, lag: float):
+        self._samples.append(lag)
+        self._total_stall += max(lag, 0.0)
+
+    async def _heartbeat(self, state: list):
+        loop = asyncio.get_running_loop()
+        while True:
+            state[2] = loop.time()
+            await asyncio.sleep(self.interval)
+            self._record(loop.time() - state[2] - self.interval)
+
+    @asynccontextmanager
+    async def track(self):
+        """Record loop stalls for the duration of one retrieval."""
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            state = self._loops[loop] = [0, None, loop.time()]
+        if state[0] == 0:
+            state[2] = loop.time()
+            state[1] = loop.create_task(self._heartbeat(state))
+        state[0] += 1
+        self._retrievals += 1
+        try:
+            yield
+        finally:
+            state[0] -= 1
+            if state[0] == 0:
+                # A stall that ends with the retrieval would otherwise be lost with the pending wake-up
+                overdue = loop.time() - state[2] - self.interval
+                if overdue > 0:
+                    self._record(overdue)
+                heartbeat, state[1] = state[1], None
+                heartbeat.cancel()
+                with suppress(asyncio.CancelledError):
+                    await heartbeat
+
+    def stats(self) -> Dict[str, float]:
+        """Stall figures in milliseconds over recent retrievals."""
+        samples = sorted(max(s, 0.0) for s in self._samples)
+        if not samples:
+            return {"retrievals": self._retrievals, "samples": 0, "max_stall_ms": 0.0, "p99_stall_ms": 0.0, "total_stall_ms": 0.0}
+        return {
+            "retrievals": self._retrievals,
+            "samples": len(samples),
+            "max_stall_ms": samples[-1] * 1000,
+            "p99_stall_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+            "total_stall_ms": self._total_stall * 1000,
+        }
+
+
+retrieval_stall_monitor = LoopStallMonitor()
+
+
+async def run_retrieval(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking knowledge base call in the bounded query pool, tracking loop stalls."""
+    loop = asyncio.get_running_loop()
+    async with retrieval_stall_monitor.track():
+        return await loop.run_in_executor(_get_executor(), partial(func, *args, **kwargs))
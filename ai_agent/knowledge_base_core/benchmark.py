@@ -0,0 +1,437 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+# "compact" is the CompactVectorStore the knowledge bases open; "compact-int8"
+# and "compact-pq" measure the bare index underneath it
+STORE_BACKENDS = ("numpy", "chroma", "compact", "compact-int8", "compact-pq")
+DEFAULT_WORK_DIR = os.path.join("models", "benchmark")
+DEFAULT_REPORT_DIR = "benchmark_reports"
+# Vectors generated, written and scored per step; bounds memory at any corpus size
+CHUNK = 10000
+N_CLUSTERS = 256
+# "clustered" vectors sit near one of N_CLUSTERS centres, so neighbours are well
+# separated; "uniform" vectors are spread over the whole sphere, where neighbours
+# are nearly equidistant and quantisation/ANN errors show up in recall
+CORPORA = ("clustered", "uniform")
+# Existing rows rewritten in the upsert pass
+UPSERT_ROWS = CHUNK
+
+_WORDS = (
+    "bitcoin ethereum solana layer2 rollup validator staking yield liquidity airdrop token wallet "
+    "onchain gaming agent model inference latency governance treasury protocol bridge oracle "
+    "patient symptom fever cough headache fatigue diagnosis treatment dosage trial cohort abstract "
+    "market volatility funding founder podcast episode interview thread launch roadmap community"
+).split()
+
+
+def synthetic_texts(count: int, seed: int = 0) -> List[str]:
+    """Tweet- to chunk-length texts over a mixed crypto/medical vocabulary."""
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(10, 120, count)
+    words = np.asarray(_WORDS)
+    return [" ".join(words[rng.integers(0, len(words), n)]) + "." for n in lengths]
+
+
+def _centers(dim: int, seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((N_CLUSTERS, dim)).astype(np.float32)
+
+
+def _sample(rng: np.random.Generator, n: int, dim: int, seed: int, corpus: str) -> np.ndarray:
+    """n unit-normalised vectors from the given corpus distribution."""
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    if corpus == "clustered":
+        vectors = _centers(dim, seed)[rng.integers(0, N_CLUSTERS, n)] + 0.5 * vectors
+    elif corpus != "uniform":
+        raise ValueError(f"Unknown corpus {corpus!r}; expected one of {CORPORA}")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def synthetic_vectors(count: int, dim: int, seed: int = 0, chunk: int = CHUNK, corpus: str = "clustered"):
+    """Yield (start, vectors) chunks of unit-normalised vectors.
+
+    Each chunk is generated from its own seed, so any process can replay
+    the same corpus without holding it in memory.
+    """
+    for start in range(0, count, chunk):
+        rng = np.random.default_rng([seed, start])
+        yield start, _sample(rng, min(chunk, count - start), dim, seed, corpus)
+
+
+def synthetic_queries(count: int, dim: int, seed: int = 0, corpus: str = "clustered") -> np.ndarray:
+    return _sample(np.random.default_rng(seed + 1), count, dim, seed, corpus)
+
+
+def brute_force_top_k(size: int, dim: int, queries: np.ndarray, k: int, seed: int = 0, corpus: str = "clustered") -> np.ndarray:
+    """Exact top-k row numbers for each query, scanning the corpus chunk by chunk."""
+    best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+    best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+    for start, vectors in synthetic_vectors(size, dim, seed, corpus=corpus):
+        rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, start + len(vectors)), (len(queries), len(vectors)))], axis=1)
+        scores = np.concatenate([best_scores, queries @ vectors.T], axis=1)
+        keep = np.argpartition(-scores, min(k, scores.shape[1]) - 1, axis=1)[:, :k]
+        best_rows = np.take_along_axis(rows, keep, axis=1)
+        best_scores = np.take_along_axis(scores, keep, axis=1)
+    return best_rows
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process in MB (includes mapped file pages)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def _dir_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total / 1e6
+
+
+def _percentile(samples: Sequence[float], q: float) -> float:
+    return float(np.percentile(np.asarray(samples), q)) if samples else 0.0
+
+
+def _truth_path(work_dir: str, corpus: str, size: int, dim: int, k: int, n_queries: int) -> str:
+    return os.path.join(work_dir, f"truth_{corpus}_{size}_{dim}_{k}_{n_queries}.npy")
+
+
+def _open_store(backend: str, path: str) -> Tuple[Callable, Callable, Callable, int, Callable]:
+    """(add(ids, vectors), upsert(ids, vectors), search(queries, k) -> id lists, max batch, save()) for a store backend."""
+    if backend == "numpy":
+        from .vector_store import NumpyVectorStore
+
+        store = NumpyVectorStore(path)
+        return (
+            lambda ids, vectors: store.add(ids=ids, embeddings=vectors),
+            lambda ids, vectors: store.upsert(ids=ids, embeddings=vectors),
+            lambda queries, k: store.query(query_embeddings=queries, n_results=k, include=[])["ids"],
+            store.max_batch_size,
+            lambda: None,
+        )
+    if backend == "compact":
+        from .vector_store import CompactVectorStore
+
+        store = CompactVectorStore(path)
+        return (
+            lambda ids, vectors: store.add(ids=ids, embeddings=vectors),
+            lambda ids, vectors: store.upsert(ids=ids, embeddings=vectors),
+            lambda queries, k: store.query(query_embeddings=queries, n_results=k, include=[])["ids"],
+            store.max_batch_size,
+            lambda: None,
+        )
+    if backend == "chroma":
+        from .vector_store import ChromaVectorStore
+
+        store = ChromaVectorStore("benchmark", path=path)
+        return (
+            lambda ids, vectors: store.add(ids=ids, embeddings=vectors.tolist()),
+            lambda ids, vectors: store.upsert(ids=ids, embeddings=vectors.tolist()),
+            lambda queries, k: store.query(query_embeddings=queries.tolist(), n_results=k, include=[])["ids"],
+            store.max_batch_size,
+            lambda: None,
+        )
+    if backend.startswith("compact-"):
+        from .compact_index import CompactVectorIndex
+
+        index = CompactVectorIndex(path, quantization=backend.split("-", 1)[1])
+        return (
+            lambda ids, vectors: index.add(ids, vectors),
+            # add replaces ids that are already indexed
+            lambda ids, vectors: index.add(ids, vectors),
+            lambda queries, k: [[record_id for record_id, _ in hits] for hits in index.search_many(queries, k)],
+            CHUNK,
+            index.save,
+        )
+    raise ValueError(f"Unknown store backend {backend!r}; expected one of {STORE_BACKENDS}")
+
+
+def _write_corpus(write: Callable, count: int, dim: int, seed: int, max_batch: int, corpus: str) -> float:
+    """Write the first ``count`` corpus rows (ids are row numbers) in max_batch batches; returns seconds spent writing."""
+    seconds = 0.0
+    for chunk_start, vectors in synthetic_vectors(count, dim, seed, corpus=corpus):
+        for offset in range(0, len(vectors), max_batch):
+            batch = vectors[offset:offset + max_batch]
+            ids = [str(chunk_start + offset + i) for i in range(len(batch))]
+            start = time.perf_counter()
+            write(ids, batch)
+            seconds += time.perf_counter() - start
+    return seconds
+
+
+def run_store_case(backend: str, size: int, dim: int, k: int, n_queries: int, work_dir: str, seed: int = 0,
+                   corpus: str = "clustered") -> Dict:
+    """Build one store from the synthetic corpus and measure it (runs in a fresh process)."""
+    baseline_rss = rss_mb()
+    path = os.path.join(work_dir, f"{backend}_{corpus}_{size}")
+    shutil.rmtree(path, ignore_errors=True)
+
+    start = time.perf_counter()
+    add, upsert, _, max_batch, save = _open_store(backend, path)
+    create_seconds = time.perf_counter() - start
+
+    add_seconds = _write_corpus(add, size, dim, seed, max_batch, corpus)
+    start = time.perf_counter()
+    save()
+    add_seconds += time.perf_counter() - start
+
+    # Re-ingest existing ids with the same vectors, as a re-sync does; the
+    # ground truth is unchanged, so recall also checks replaced rows
+    upsert_rows = min(size, UPSERT_ROWS)
+    upsert_seconds = _write_corpus(upsert, upsert_rows, dim, seed, max_batch, corpus)
+    start = time.perf_counter()
+    save()
+    upsert_seconds += time.perf_counter() - start
+
+    # Reopen from disk, as a freshly started agent would
+    start = time.perf_counter()
+    _, _, search, _, _ = _open_store(backend, path)
+    open_seconds = time.perf_counter() - start
+
+    queries = synthetic_queries(n_queries, dim, seed, corpus)
+    for query in queries[:5]:
+        search(query[None, :], k)
+    latencies = []
+    found = []
+    for query in queries:
+        start = time.perf_counter()
+        found.append(search(query[None, :], k)[0])
+        latencies.append((time.perf_counter() - start) * 1000)
+    start = time.perf_counter()
+    search(queries, k)
+    batch_ms = (time.perf_counter() - start) * 1000
+
+    truth = np.load(_truth_path(work_dir, corpus, size, dim, k, n_queries))
+    hits = sum(len(set(map(int, ids)) & set(row.tolist())) for ids, row in zip(found, truth))
+    return {
+        "kind": "store",
+        "backend": backend,
+        "corpus": corpus,
+        "size": size,
+        "dim": dim,
+        "k": k,
+        "queries": n_queries,
+        "create_seconds": create_seconds,
+        "add_per_sec": size / add_seconds if add_seconds else 0.0,
+        "upsert_per_sec": upsert_rows / upsert_seconds if upsert_seconds else 0.0,
+        "open_ms": open_seconds * 1000,
+        "query_p50_ms": _percentile(latencies, 50),
+        "query_p99_ms": _percentile(latencies, 99),
+        "batch_query_ms_per_query": batch_ms / n_queries,
+        "recall_at_k": hits / (n_queries * k),
+        "rss_mb": rss_mb() - baseline_rss,
+        "peak_rss_mb": peak_rss_mb(),
+        "disk_mb": _dir_mb(path),
+    }
+
+
+def run_encode_case(backend: str, model_name: str, n_texts: int, batch_size: int, work_dir: str) -> Dict:
+    """Load one embedding backend and measure encode throughput (runs in a fresh process)."""
+    from .embeddings import get_embedding_model
+
+    baseline_rss = rss_mb()
+    texts = synthetic_texts(n_texts)
+    start = time.perf_counter()
+    model = get_embedding_model(model_name, backend)
+    load_seconds = time.perf_counter() - start
+    model.encode(texts[:batch_size], batch_size=batch_size)  # warm up
+    start = time.perf_counter()
+    vectors = np.asarray(model.encode(texts, batch_size=batch_size), dtype=np.float32)
+    encode_seconds = time.perf_counter() - start
+    np.save(os.path.join(work_dir, f"encode_{backend}.npy"), vectors)
+    return {
+        "kind": "encode",
+        "backend": backend,
+        "model": model_name,
+        "texts": n_texts,
+        "batch_size": batch_size,
+        "load_seconds": load_seconds,
+        "texts_per_sec": n_texts / encode_seconds,
+        "rss_mb": rss_mb() - baseline_rss,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def embedding_recall(work_dir: str, reference: str, backend: str, k: int, n_queries: int = 100) -> float:
+    """recall@k of retrieval over the encode sample with ``backend`` vectors vs ``reference`` vectors."""
+    a = np.load(os.path.join(work_dir, f"encode_{reference}.npy"))
+    b = np.load(os.path.join(work_dir, f"encode_{backend}.npy"))
+    a /= np.linalg.norm(a, axis=1, keepdims=True)
+    b /= np.linalg.norm(b, axis=1, keepdims=True)
+    queries = np.arange(min(n_queries, len(a)))
+    k = min(k, len(a) - 1)
+    # Each sample text queries the rest of the sample
+    scores_a, scores_b = a[queries] @ a.T, b[queries] @ b.T
+    scores_a[queries, queries] = scores_b[queries, queries] = -np.inf
+    top_a = np.argpartition(-scores_a, k - 1, axis=1)[:, :k]
+    top_b = np.argpartition(-scores_b, k - 1, axis=1)[:, :k]
+    hits = sum(len(set(x) & set(y)) for x, y in zip(top_a.tolist(), top_b.tolist()))
+    return hits / (len(queries) * k)
+
+
+def _in_fresh_process(func: Callable, *args) -> Dict:
+    """Run one case in a new interpreter so its RSS figures are its own."""
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(func, args)
+
+
+# Metric -> (direction, whether the tolerance is relative); regressions are
+# moves in the bad direction beyond the tolerance
+_TRACKED = {
+    "texts_per_sec": ("higher", True),
+    "add_per_sec": ("higher", True),
+    "upsert_per_sec": ("higher", True),
+    "query_p50_ms": ("lower", True),
+    "query_p99_ms": ("lower", True),
+    "rss_mb": ("lower", True),
+    "recall_at_k": ("higher", False),
+}
+
+
+# Fields that must all match for two results to be compared; a store result
+# measured at another dim, k, query count or corpus is a different experiment
+_MATCH_FIELDS = ("kind", "backend", "corpus", "size", "dim", "k", "queries", "model", "texts", "batch_size")
+
+
+def find_regressions(report: Dict, baseline: Dict, tolerance: float = 0.2, recall_tolerance: float = 0.01) -> List[str]:
+    """Compare results against the baseline result of the same configuration."""
+    def key(result):
+        return tuple(result.get(field) for field in _MATCH_FIELDS)
+
+    def label(result):
+        return "/".join(str(result[field]) for field in _MATCH_FIELDS if result.get(field) is not None)
+
+    previous = {key(r): r for r in baseline.get("results", []) if "error" not in r}
+    regressions = []
+    for result in report["results"]:
+        before = previous.get(key(result))
+        if before is None or "error" in result:
+            continue
+        for metric, (direction, relative) in _TRACKED.items():
+            if metric not in result or metric not in before:
+                continue
+            old, new = before[metric], result[metric]
+            allowed = abs(old) * tolerance if relative else recall_tolerance
+            worse = old - new if direction == "higher" else new - old
+            if worse > allowed:
+                regressions.append(f"{label(result)} {metric}: {old:.4g} -> {new:.4g}")
+    return regressions
+
+
+def _environment() -> Dict:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count(),
+    }
+
+
+def main():
+    from .embeddings import DEFAULT_EMBEDDING_MODEL, DEFAULT_ENCODE_BATCH_SIZE, EMBEDDING_BACKENDS, TORCH_BACKEND
+
+    parser = argparse.ArgumentParser(description="Benchmark embedding and vector store backends on synthetic corpora.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Comma-separated corpus sizes")
+    parser.add_argument("--stores", default=",".join(STORE_BACKENDS), help="Comma-separated store backends")
+    parser.add_argument("--corpora", default=",".join(CORPORA), help="Comma-separated synthetic corpora")
+    parser.add_argument("--embedding-backends", default=",".join(EMBEDDING_BACKENDS), help="Comma-separated, or empty to skip")
+    parser.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL)
+    parser.add_argument("--encode-texts", type=int, default=1000, help="Synthetic texts encoded per embedding backend")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_ENCODE_BATCH_SIZE)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--work-dir", default=DEFAULT_WORK_DIR)
+    parser.add_argument("--output", default=None, help="Report path (default benchmark_reports/retrieval_<timestamp>.json)")
+    parser.add_argument("--baseline", default=None, help="Earlier report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown/growth vs the baseline")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    stores = [s for s in args.stores.split(",") if s]
+    corpora = [c for c in args.corpora.split(",") if c]
+    embedding_backends = [b for b in args.embedding_backends.split(",") if b]
+    os.makedirs(args.work_dir, exist_ok=True)
+    report = {
+        "benchmark": "retrieval",
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "environment": _environment(),
+        "config": vars(args),
+        "results": [],
+    }
+
+    for backend in embedding_backends:
+        print(f"encode {backend} ...", flush=True)
+        try:
+            result = _in_fresh_process(run_encode_case, backend, args.model, args.encode_texts, args.batch_size, args.work_dir)
+        except Exception as e:
+            result = {"kind": "encode", "backend": backend, "error": f"{type(e).__name__}: {e}"}
+        report["results"].append(result)
+        print(json.dumps(result), flush=True)
+    encoded = [r["backend"] for r in report["results"] if r["kind"] == "encode" and "error" not in r]
+    if TORCH_BACKEND in encoded:
+        for result in report["results"]:
+            if result["kind"] == "encode" and result["backend"] in encoded and result["backend"] != TORCH_BACKEND:
+                result["recall_at_k_vs_torch"] = embedding_recall(args.work_dir, TORCH_BACKEND, result["backend"], args.k)
+
+    for corpus in corpora:
+        for size in sizes:
+            truth_path = _truth_path(args.work_dir, corpus, size, args.dim, args.k, args.queries)
+            if not os.path.exists(truth_path):
+                print(f"brute force ground truth for {corpus} @ {size} ...", flush=True)
+                queries = synthetic_queries(args.queries, args.dim, corpus=corpus)
+                np.save(truth_path, brute_force_top_k(size, args.dim, queries, args.k, corpus=corpus))
+            for backend in stores:
+                print(f"store {backend} {corpus} @ {size} ...", flush=True)
+                try:
+                    result = _in_fresh_process(
+                        run_store_case, backend, size, args.dim, args.k, args.queries, args.work_dir, 0, corpus
+                    )
+                except Exception as e:
+                    result = {
+                        "kind": "store", "backend": backend, "corpus": corpus, "size": size,
+                        "error": f"{type(e).__name__}: {e}",
+                    }
+                report["results"].append(result)
+                print(json.dumps(result), flush=True)
+
+    output = args.output or os.path.join(
+        DEFAULT_REPORT_DIR, f"retrieval_{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = find_regressions(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        raise SystemExit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,535 @@
+import argparse
+import json
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+QUANTIZATIONS = ("int8", "pq")
+PQ_CENTROIDS = 256
+# Rows scored per step, bounding the float32 temporaries built from the codes
+SCORE_CHUNK = 65536
+TRAIN_SAMPLE = 65536
+# k-means converges on far fewer points than the int8 scale estimate needs
+PQ_TRAIN_SAMPLE = 64 * PQ_CENTROIDS
+# Margin added when a later batch forces the int8 scales wider, so slowly
+# drifting data doesn't trigger a re-encode on every add
+SCALE_HEADROOM = 1.25
+# File name prefixes owned by an index directory (besides meta.json)
+_FILE_KINDS = ("full", "codes", "ids", "deleted", "params")
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def _fsync_write(path: str, data: bytes, mode: str = "ab"):
+    with open(path, mode) as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def kmeans(x: np.ndarray, k: int, iterations: int = 20, seed: int = 0) -> np.ndarray:
+    """Plain Lloyd's k-means, enough for training PQ codebooks."""
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    x_sq = (x ** 2).sum(axis=1)[:, None]
+    for _ in range(iterations):
+        distances = x_sq - 2 * x @ centroids.T + (centroids ** 2).sum(axis=1)[None, :]
+        assign = distances.argmin(axis=1)
+        counts = np.bincount(assign, minlength=k)
+        sums = np.stack([np.bincount(assign, weights=x[:, j], minlength=k) for j in range(x.shape[1])], axis=1)
+        filled = counts > 0
+        centroids[filled] = (sums[filled] / counts[filled, None]).astype(centroids.dtype)
+    return centroids
+
+
+class CompactVectorIndex:
+    """Quantized in-memory vector index with exact re-ranking from disk.
+
+    Only compact codes stay resident: scalar int8 (one byte per dimension)
+    or product-quantized (one byte per subvector). Vectors can optionally be
+    truncated to their first ``truncate_dim`` dimensions before coding,
+    Matryoshka style. Search scores every code, keeps the best
+    ``k * rerank_factor`` candidates and re-ranks them by exact cosine
+    against the full-precision vectors, which live in a float32 file on
+    disk and are only read for those candidates.
+
+    Files in ``path``: full-precision vectors (appended as vectors are
+    added), codes, ids (JSON lines), a log of deleted rows and params
+    (scales or codebooks), each named by the generation that wrote it, plus
+    meta.json naming the current files and how much of each is saved.
+    ``save`` appends what changed since the last save and then replaces
+    meta.json, so it costs the size of the change; anything past the saved
+    lengths is dropped on load. Rewrites (widened scales, ``compact``) go
+    to a new generation's files, and meta.json switching over is the
+    commit point either way. Opening a directory that holds vectors but no
+    meta.json raises unless ``overwrite`` is set.
+
+    int8 scales are fitted to the first batch and widened (re-encoding the
+    stored codes from full.f32) when a later batch falls outside them. PQ
+    codebooks are fixed once trained.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        dim: Optional[int] = None,
+        quantization: str = "int8",
+        truncate_dim: Optional[int] = None,
+        pq_subvectors: int = 32,
+        rerank_factor: Optional[int] = None,
+        overwrite: bool = False,
+    ):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization {quantization!r}; expected one of {QUANTIZATIONS}")
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        # PQ codes are coarser, so they need a deeper candidate pool for the same recall
+        self.rerank_factor = rerank_factor or (8 if quantization == "int8" else 32)
+
+        self.dim = dim
+        self.quantization = quantization
+        self.truncate_dim = truncate_dim
+        self.pq_subvectors = pq_subvectors
+        self.scale: Optional[np.ndarray] = None
+        self.codebooks: Optional[np.ndarray] = None
+        self.ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._code_chunks: List[np.ndarray] = []
+        self._deleted = np.zeros(0, dtype=bool)
+        # Persistence state: current files, how much of each is saved, and
+        # rows deleted since the last save
+        self.generation = 0
+        self._files = {"full": "full.0.f32"}
+        self._saved = {"count": 0, "ids_bytes": 0, "deleted_count": 0}
+        self._pending_deletes: List[int] = []
+        self._rewrite = True
+
+        meta_path = os.path.join(path, "meta.json")
+        if overwrite:
+            for stale in self._owned_files():
+                os.remove(os.path.join(path, stale))
+        if os.path.exists(meta_path):
+            self._load()
+        elif any(name.startswith("full.") for name in self._owned_files()):
+            # Vectors from an index that was never saved can't be matched to ids
+            raise ValueError(
+                f"{path} holds vectors but no meta.json; the index was never saved. "
+                f"Pass overwrite=True to discard it"
+            )
+
+    @property
+    def full_path(self) -> str:
+        return os.path.join(self.path, self._files["full"])
+
+    def _file(self, kind: str) -> str:
+        return os.path.join(self.path, self._files[kind])
+
+    def _owned_files(self) -> List[str]:
+        return [
+            name for name in os.listdir(self.path)
+            if name == "meta.json" or name.split(".", 1)[0] in _FILE_KINDS
+        ]
+
+    @property
+    def code_dim(self) -> int:
+        return self.truncate_dim or self.dim
+
+    @property
+    def trained(self) -> bool:
+        return self.scale is not None or self.codebooks is not None
+
+    def __len__(self) -> int:
+        return len(self.ids) - int(self._deleted.sum())
+
+    def _reduce(self, vectors: np.ndarray) -> np.ndarray:
+        """Truncate (if configured) and re-normalize, giving the space the codes live in."""
+        if self.truncate_dim and self.truncate_dim < self.dim:
+            return _normalize(vectors[:, :self.truncate_dim])
+        return vectors
+
+    def train(self, vectors: np.ndarray):
+        """Fit int8 scales or PQ codebooks on a representative sample."""
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        self.dim = self.dim or vectors.shape[1]
+        sample = vectors
+        if len(sample) > TRAIN_SAMPLE:
+            sample = sample[np.random.default_rng(0).choice(len(sample), TRAIN_SAMPLE, replace=False)]
+        x = self._reduce(sample)
+        self._rewrite = True
+
+        if self.quantization == "int8":
+            self.scale = np.maximum(np.abs(x).max(axis=0), 1e-6).astype(np.float32)
+            return
+
+        if self.code_dim % self.pq_subvectors:
+            raise ValueError(f"{self.code_dim} dimensions don't split into {self.pq_subvectors} subvectors")
+        if len(x) < PQ_CENTROIDS:
+            raise ValueError(f"PQ training needs at least {PQ_CENTROIDS} vectors, got {len(x)}")
+        if len(x) > PQ_TRAIN_SAMPLE:
+            x = x[np.random.default_rng(1).choice(len(x), PQ_TRAIN_SAMPLE, replace=False)]
+        sub = self.code_dim // self.pq_subvectors
+        self.codebooks = np.stack([
+            kmeans(np.ascontiguousarray(x[:, m * sub:(m + 1) * sub]), PQ_CENTROIDS, seed=m)
+            for m in range(self.pq_subvectors)
+        ]).astype(np.float32)
+
+    def _encode(self, x: np.ndarray) -> np.ndarray:
+        if self.quantization == "int8":
+            return np.clip(np.round(x / self.scale * 127), -127, 127).astype(np.int8)
+        sub = self.code_dim // self.pq_subvectors
+        codes = np.empty((len(x), self.pq_subvectors), dtype=np.uint8)
+        for m in range(self.pq_subvectors):
+            part = x[:, m * sub:(m + 1) * sub]
+            book = self.codebooks[m]
+            distances = -2 * part @ book.T + (book ** 2).sum(axis=1)[None, :]
+            codes[:, m] = distances.argmin(axis=1)
+        return codes
+
+    def _widen_scale(self, x: np.ndarray):
+        """Grow int8 scales to cover a batch that exceeds them, re-encoding stored rows."""
+        peak = np.abs(x).max(axis=0)
+        over = peak > self.scale
+        if not over.any():
+            return
+        # Every dimension gets the headroom, not just the ones that overflowed:
+        # otherwise some other dimension overflows on the next batch and each
+        # add re-encodes (and the next save rewrites) the whole index. Reduced
+        # vectors are unit length, so no component needs a scale above 1
+        self.scale = np.minimum(np.maximum(peak, self.scale) * SCALE_HEADROOM, 1.0).astype(np.float32)
+        self._rewrite = True
+        if not self.ids:
+            return
+        full = self._full_vectors()
+        codes = np.empty((len(self.ids), self.code_dim), dtype=np.int8)
+        for start in range(0, len(codes), SCORE_CHUNK):
+            codes[start:start + SCORE_CHUNK] = self._encode(self._reduce(np.asarray(full[start:start + SCORE_CHUNK])))
+        self._code_chunks = [codes]
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray):
+        """Add vectors; re-adding an id replaces its previous vector. Trains on the first batch if needed."""
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        if not self.trained:
+            self.train(vectors)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dim vectors, got {vectors.shape[1]}")
+
+        reduced = self._reduce(vectors)
+        if self.quantization == "int8":
+            self._widen_scale(reduced)
+        with open(self.full_path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors).tobytes())
+        self._code_chunks.append(self._encode(reduced))
+
+        start = len(self.ids)
+        self._deleted = np.concatenate([self._deleted, np.zeros(len(ids), dtype=bool)])
+        for offset, record_id in enumerate(ids):
+            previous = self._rows.get(record_id)
+            if previous is not None:
+                self._deleted[previous] = True
+                self._pending_deletes.append(previous)
+            self._rows[record_id] = start + offset
+            self.ids.append(record_id)
+
+    def delete(self, ids: Sequence[str]) -> int:
+        """Tombstone ids; their rows are dropped by the next ``compact``."""
+        removed = 0
+        for record_id in ids:
+            row = self._rows.pop(record_id, None)
+            if row is not None:
+                self._deleted[row] = True
+                self._pending_deletes.append(row)
+                removed += 1
+        return removed
+
+    def _codes(self) -> np.ndarray:
+        if len(self._code_chunks) > 1:
+            self._code_chunks = [np.concatenate(self._code_chunks)]
+        if not self._code_chunks:
+            width = self.code_dim if self.quantization == "int8" else self.pq_subvectors
+            return np.zeros((0, width), dtype=np.int8 if self.quantization == "int8" else np.uint8)
+        return self._code_chunks[0]
+
+    def _codes_from(self, start: int) -> np.ndarray:
+        """Code rows from ``start`` on, without concatenating the rows before it."""
+        tail, offset = [], 0
+        for chunk in self._code_chunks:
+            if offset + len(chunk) > start:
+                tail.append(chunk[max(start - offset, 0):])
+            offset += len(chunk)
+        return np.concatenate(tail) if tail else self._codes()[:0]
+
+    def _approx_scores(self, query: np.ndarray) -> np.ndarray:
+        """Approximate cosine of one reduced query against every code."""
+        codes = self._codes()
+        scores = np.empty(len(codes), dtype=np.float32)
+        if self.quantization == "int8":
+            weights = (query * self.scale / 127).astype(np.float32)
+            for start in range(0, len(codes), SCORE_CHUNK):
+                scores[start:start + SCORE_CHUNK] = codes[start:start + SCORE_CHUNK].astype(np.float32) @ weights
+        else:
+            sub = self.code_dim // self.pq_subvectors
+            # Asymmetric distance: one lookup table per query, then table gathers
+            table = np.einsum("mcs,ms->mc", self.codebooks, query.reshape(self.pq_subvectors, sub))
+            columns = np.arange(self.pq_subvectors)
+            for start in range(0, len(codes), SCORE_CHUNK):
+                scores[start:start + SCORE_CHUNK] = table[columns, codes[start:start + SCORE_CHUNK]].sum(axis=1)
+        return scores
+
+    def _full_vectors(self) -> np.memmap:
+        return np.memmap(self.full_path, dtype=np.float32, mode="r", shape=(len(self.ids), self.dim))
+
+    def rows_for(self, ids: Sequence[str]) -> np.ndarray:
+        """Rows of the live ids among ``ids``; unknown ids are skipped."""
+        return np.fromiter((self._rows[i] for i in ids if i in self._rows), dtype=np.int64)
+
+    def vectors(self, ids: Sequence[str]) -> np.ndarray:
+        """Full-precision vectors for live ids, in the given order."""
+        if not ids:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.asarray(self._full_vectors()[[self._rows[i] for i in ids]])
+
+    def search(self, query: np.ndarray, k: int = 10) -> List[Tuple[str, float]]:
+        """Top-k (id, cosine similarity) for one query, best first."""
+        return self.search_many(np.asarray(query, dtype=np.float32)[None, :], k)[0]
+
+    def search_many(self, queries: np.ndarray, k: int = 10, rows: Optional[np.ndarray] = None) -> List[List[Tuple[str, float]]]:
+        """Top-k (id, cosine similarity) for each query, optionally only among ``rows``."""
+        excluded = self._deleted
+        if rows is not None:
+            excluded = np.ones(len(self.ids), dtype=bool)
+            excluded[rows] = False
+            excluded |= self._deleted
+        live = len(self.ids) - int(excluded.sum())
+        if not live:
+            return [[] for _ in queries]
+        queries = _normalize(np.asarray(queries, dtype=np.float32))
+        reduced = self._reduce(queries)
+        full = self._full_vectors()
+        n_candidates = min(live, k * self.rerank_factor)
+        k = min(k, live)
+
+        results = []
+        for query, query_reduced in zip(queries, reduced):
+            scores = self._approx_scores(query_reduced)
+            scores[excluded] = -np.inf
+            candidates = np.sort(np.argpartition(-scores, n_candidates - 1)[:n_candidates])
+            # Sorted row order keeps the reads from the full-precision file sequential
+            exact = full[candidates] @ query
+            best = np.argsort(-exact)[:k]
+            results.append([(self.ids[candidates[i]], float(exact[i])) for i in best])
+        return results
+
+    def resident_bytes(self) -> int:
+        """Approximate memory held for search (codes, quantizer params and the delete mask)."""
+        params = self.scale.nbytes if self.scale is not None else 0
+        params += self.codebooks.nbytes if self.codebooks is not None else 0
+        return sum(c.nbytes for c in self._code_chunks) + params + self._deleted.nbytes
+
+    def compact(self):
+        """Rewrite the index without deleted rows."""
+        keep = np.flatnonzero(~self._deleted)
+        if len(keep) == len(self.ids):
+            return
+        full = self._full_vectors()
+        codes = self._codes()[keep]
+        # The old vectors stay in place until meta.json points at the new file
+        self.generation += 1
+        full_name = f"full.{self.generation}.f32"
+        with open(os.path.join(self.path, full_name), "wb") as f:
+            for start in range(0, len(keep), SCORE_CHUNK):
+                f.write(np.ascontiguousarray(full[keep[start:start + SCORE_CHUNK]]).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        del full
+        self._files["full"] = full_name
+        self.ids = [self.ids[i] for i in keep]
+        self._rows = {record_id: row for row, record_id in enumerate(self.ids)}
+        self._code_chunks = [codes]
+        self._deleted = np.zeros(len(self.ids), dtype=bool)
+        self._rewrite = True
+        self.save()
+
+    def save(self):
+        """Persist codes, ids, deletes and quantizer parameters next to the full-precision file.
+
+        Only rows added and deleted since the last save are written, unless
+        the codes or parameters changed wholesale; meta.json is replaced last.
+        """
+        if self._rewrite:
+            self._write_generation()
+        else:
+            self._append_changes()
+        _fsync_write(self.full_path, b"")
+
+        meta = {
+            "dim": self.dim,
+            "quantization": self.quantization,
+            "truncate_dim": self.truncate_dim,
+            "pq_subvectors": self.pq_subvectors,
+            "count": len(self.ids),
+            "ids_bytes": self._saved["ids_bytes"],
+            "deleted_count": self._saved["deleted_count"],
+            "generation": self.generation,
+            "files": self._files,
+        }
+        tmp_path = os.path.join(self.path, "meta.json.tmp")
+        _fsync_write(tmp_path, json.dumps(meta).encode(), "wb")
+        os.replace(tmp_path, os.path.join(self.path, "meta.json"))
+        self._saved["count"] = len(self.ids)
+        self._pending_deletes = []
+        if self._rewrite:
+            self._rewrite = False
+            self._remove_unreferenced()
+
+    def _write_generation(self):
+        """Write codes, ids, deletes and params to fresh files of a new generation."""
+        self.generation += 1
+        for kind, suffix in (("codes", "bin"), ("ids", "jsonl"), ("deleted", "i64"), ("params", "npz")):
+            self._files[kind] = f"{kind}.{self.generation}.{suffix}"
+        params = {"scale": self.scale} if self.quantization == "int8" else {"codebooks": self.codebooks}
+        np.savez(self._file("params"), **{k: v for k, v in params.items() if v is not None})
+        _fsync_write(self._file("codes"), self._codes().tobytes(), "wb")
+        ids_data = "".join(json.dumps(record_id) + "\n" for record_id in self.ids).encode()
+        _fsync_write(self._file("ids"), ids_data, "wb")
+        deleted = np.flatnonzero(self._deleted).astype(np.int64)
+        _fsync_write(self._file("deleted"), deleted.tobytes(), "wb")
+        self._saved["ids_bytes"] = len(ids_data)
+        self._saved["deleted_count"] = len(deleted)
+
+    def _append_changes(self):
+        """Append rows and deletes made since the last save to the current generation's files."""
+        start = self._saved["count"]
+        _fsync_write(self._file("codes"), self._codes_from(start).tobytes())
+        ids_data = "".join(json.dumps(record_id) + "\n" for record_id in self.ids[start:]).encode()
+        _fsync_write(self._file("ids"), ids_data)
+        deleted = np.asarray(self._pending_deletes, dtype=np.int64)
+        _fsync_write(self._file("deleted"), deleted.tobytes())
+        self._saved["ids_bytes"] += len(ids_data)
+        self._saved["deleted_count"] += len(deleted)
+
+    def _remove_unreferenced(self):
+        """Delete files of earlier generations (or a rewrite that never committed)."""
+        referenced = set(self._files.values()) | {"meta.json"}
+        for name in self._owned_files():
+            if name not in referenced:
+                os.remove(os.path.join(self.path, name))
+
+    def _load(self):
+        with open(os.path.join(self.path, "meta.json"), "r") as f:
+            meta = json.load(f)
+        self.dim = meta["dim"]
+        self.quantization = meta["quantization"]
+        self.truncate_dim = meta["truncate_dim"]
+        self.pq_subvectors = meta["pq_subvectors"]
+        count = meta["count"]
+        if "files" not in meta:
+            self._load_single_file_layout(count)
+            return
+
+        self.generation = meta["generation"]
+        self._files = meta["files"]
+        self._saved = {"count": count, "ids_bytes": meta["ids_bytes"], "deleted_count": meta["deleted_count"]}
+        self._rewrite = False
+        width = self.code_dim if self.quantization == "int8" else self.pq_subvectors
+        code_dtype = np.int8 if self.quantization == "int8" else np.uint8
+        # Drop anything written after the last save; meta.json never counted it
+        for kind, size in (
+            ("full", count * self.dim * 4),
+            ("codes", count * width),
+            ("ids", meta["ids_bytes"]),
+            ("deleted", meta["deleted_count"] * 8),
+        ):
+            with open(self._file(kind), "r+b") as f:
+                f.truncate(size)
+        self._remove_unreferenced()
+
+        with np.load(self._file("params")) as params:
+            self.scale = params["scale"] if "scale" in params else None
+            self.codebooks = params["codebooks"] if "codebooks" in params else None
+        self._code_chunks = [np.fromfile(self._file("codes"), dtype=code_dtype).reshape(count, width)]
+        with open(self._file("ids"), "rb") as f:
+            self.ids = [json.loads(line) for line in f.read().splitlines()]
+        self._deleted = np.zeros(count, dtype=bool)
+        self._deleted[np.fromfile(self._file("deleted"), dtype=np.int64)] = True
+        self._rows = {record_id: row for row, record_id in enumerate(self.ids) if not self._deleted[row]}
+
+    def _load_single_file_layout(self, count: int):
+        """Read an index saved before generations; the next save rewrites it in the current layout."""
+        self._files = {"full": "full.f32"}
+        with np.load(os.path.join(self.path, "params.npz")) as params:
+            self.scale = params["scale"] if "scale" in params else None
+            self.codebooks = params["codebooks"] if "codebooks" in params else None
+        self._code_chunks = [np.load(os.path.join(self.path, "codes.npy"))]
+        self._deleted = np.load(os.path.join(self.path, "deleted.npy"))
+        with open(os.path.join(self.path, "ids.json"), "r") as f:
+            self.ids = json.load(f)
+        with open(self.full_path, "r+b") as f:
+            f.truncate(count * self.dim * 4)
+        self._rows = {record_id: row for row, record_id in enumerate(self.ids) if not self._deleted[row]}
+        self._rewrite = True
+
+
+def build_from_collection(collection, path: str, page_size: int = 5000, **index_kwargs) -> CompactVectorIndex:
+    """Build a compact index from the embeddings already stored in a Chroma collection."""
+    index = CompactVectorIndex(path, **index_kwargs)
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        index.add(page["ids"], np.asarray(page["embeddings"], dtype=np.float32))
+        offset += len(page["ids"])
+    index.save()
+    return index
+
+
+def recall_at_k(index: CompactVectorIndex, vectors: np.ndarray, ids: Sequence[str], queries: np.ndarray, k: int = 10) -> float:
+    """Fraction of the exact top-k (by brute-force cosine) that the index returns."""
+    vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+    queries = _normalize(np.asarray(queries, dtype=np.float32))
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :k]
+    found = index.search_many(queries, k)
+    hits = sum(len({ids[i] for i in truth} & {record_id for record_id, _ in got}) for truth, got in zip(exact, found))
+    return hits / (len(queries) * k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure compact index memory and recall on synthetic vectors.")
+    parser.add_argument("--path", default=os.path.join("models", "compact_index_demo"))
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, default="int8")
+    parser.add_argument("--truncate-dim", type=int, default=None)
+    parser.add_argument("--pq-subvectors", type=int, default=32)
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Clustered data is closer to real embeddings than isotropic noise
+    centers = rng.standard_normal((256, args.dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, 256, args.count)] + 0.5 * rng.standard_normal((args.count, args.dim)).astype(np.float32)
+    ids = [str(i) for i in range(args.count)]
+    queries = vectors[rng.choice(args.count, args.queries, replace=False)] + 0.1 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+    index = CompactVectorIndex(
+        args.path, quantization=args.quantization, truncate_dim=args.truncate_dim,
+        pq_subvectors=args.pq_subvectors, overwrite=True
+    )
+    start = time.perf_counter()
+    index.add(ids, vectors)
+    print(f"Indexed {args.count} vectors in {time.perf_counter() - start:.1f}s")
+    print(f"Resident: {index.resident_bytes() / 1e6:.1f} MB (float32 would be {vectors.nbytes / 1e6:.1f} MB)")
+
+    start = time.perf_counter()
+    recall = recall_at_k(index, vectors, ids, queries)
+    print(f"recall@10: {recall:.3f} ({(time.perf_counter() - start) / args.queries * 1000:.1f} ms/query incl. brute force)")
+    index.save()
+
+
+if __name__ == "__main__":
+    main()
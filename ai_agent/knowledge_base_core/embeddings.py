@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils import print_system
+from .embedding_cache import EmbeddingCache, get_embedding_cache
+from .onnx_backend import ONNX_INT8_BACKEND, load_onnx_int8_model
+
+DEFAULT_EMBEDDING_MODEL = "all-mpnet-base-v2"
+# Larger than SentenceTransformer's default of 32; amortises per-batch
+# overhead on CPU without padding short podcast turns excessively
+DEFAULT_ENCODE_BATCH_SIZE = 64
+
+TORCH_BACKEND = "torch"
+EMBEDDING_BACKENDS = (TORCH_BACKEND, ONNX_INT8_BACKEND)
+
+_models: Dict[Tuple[str, str], object] = {}
+_load_seconds: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def default_backend() -> str:
+    """Backend from EMBEDDING_BACKEND (``torch`` or ``onnx-int8``), defaulting to torch."""
+    backend = os.getenv("EMBEDDING_BACKEND", TORCH_BACKEND).lower()
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {backend!r}; expected one of {EMBEDDING_BACKENDS}")
+    return backend
+
+
+def get_embedding_model(model_name: str = DEFAULT_EMBEDDING_MODEL, backend: Optional[str] = None):
+    """Return the process-wide instance of an embedding model, loading it on first use."""
+    key = (model_name, backend or default_backend())
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        # Another thread may have finished loading while we waited
+        if key not in _models:
+            start = time.perf_counter()
+            if key[1] == ONNX_INT8_BACKEND:
+                _models[key] = load_onnx_int8_model(model_name)
+            else:
+                from sentence_transformers import SentenceTransformer
+
+                _models[key] = SentenceTransformer(model_name)
+            label = model_name if key[1] == TORCH_BACKEND else f"{model_name} ({key[1]})"
+            _load_seconds[label] = time.perf_counter() - start
+            print_system(f"Loaded embedding model {label} in {_load_seconds[label]:.2f}s")
+        return _models[key]
+
+
+def loaded_models() -> Dict[str, float]:
+    """Models loaded in this process and how long each took to load, in seconds."""
+    return dict(_load_seconds)
+
+
+class EmbeddingFunction:
+    """ChromaDB embedding function backed by the shared model registry.
+
+    The model is resolved on the first call, so constructing a knowledge
+    base (e.g. at import time) doesn't pay the model load. Texts already in
+    the embedding cache are not re-encoded.
+    """
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_EMBEDDING_MODEL,
+        cache: Optional[EmbeddingCache] = None,
+        batch_size: int = DEFAULT_ENCODE_BATCH_SIZE,
+        backend: Optional[str] = None,
+    ):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.backend = backend or default_backend()
+        self.cache = cache if cache is not None else get_embedding_cache()
+        # Quantized vectors are close to, not identical to, the torch ones,
+        # so each backend gets its own cache entries
+        self.cache_key = model_name if self.backend == TORCH_BACKEND else f"{model_name}:{self.backend}"
+
+    @property
+    def model(self):
+        return get_embedding_model(self.model_name, self.backend)
+
+    def encode(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """Embed texts, consulting the cache first."""
+        batch_size = batch_size or self.batch_size
+        if self.cache is None:
+            return np.asarray(self.model.encode(texts, batch_size=batch_size), dtype=np.float32)
+
+        cached = self.cache.get_many(self.cache_key, texts)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        if missing:
+            # Encode each unseen text once, even if it repeats within the batch
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            encoded = np.asarray(self.model.encode(unique_texts, batch_size=batch_size), dtype=np.float16)
+            self.cache.put_many(self.cache_key, unique_texts, encoded)
+            by_text = dict(zip(unique_texts, encoded))
+            for i in missing:
+                cached[i] = by_text[texts[i]]
+        # Cached and fresh vectors both go through float16, so a text always
+        # maps to the same vector
+        return np.stack(cached).astype(np.float32)
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        return self.encode(input).tolist()
@@ -0,0 +1,147 @@
+import hashlib
+import os
+import sqlite3
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from .state import connect_state_db
+
+
+def file_fingerprint(path: str) -> Dict:
+    """Content hash, mtime and size of a source file."""
+    st = os.stat(path)
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return {"content_hash": digest.hexdigest(), "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+
+class CollectionManifest:
+    """Bookkeeping kept beside a Chroma collection in the knowledge base state DB.
+
+    Holds the document count, latest document timestamp, a version bumped
+    on every write, and a fingerprint per ingested source file. Each write
+    to the collection is mirrored here in a single SQLite transaction, so
+    stats and "already ingested?" checks never scan the collection.
+    """
+
+    def __init__(self, collection_name: str, db_path: Optional[str] = None):
+        self.collection_name = collection_name
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS collection_manifest (
+                    collection TEXT PRIMARY KEY,
+                    doc_count INTEGER NOT NULL,
+                    latest_timestamp TEXT,
+                    version INTEGER NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS manifest_files (
+                    collection TEXT NOT NULL,
+                    source_file TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    segment_count INTEGER NOT NULL,
+                    ingested_at TEXT NOT NULL,
+                    PRIMARY KEY (collection, source_file)
+                )
+            ''')
+
+    def _connect(self) -> sqlite3.Connection:
+        return connect_state_db(self.db_path)
+
+    def exists(self) -> bool:
+        """Whether this collection has been recorded at all (False for pre-manifest collections)."""
+        with self._connect() as conn:
+            return conn.execute(
+                'SELECT 1 FROM collection_manifest WHERE collection = ?', (self.collection_name,)
+            ).fetchone() is not None
+
+    def record_write(
+        self,
+        doc_count: int,
+        latest_timestamp: Optional[str] = None,
+        files: Iterable[Dict] = (),
+        removed_files: Iterable[str] = (),
+    ):
+        """Mirror one collection write: new count, newest timestamp, and touched files."""
+        now = datetime.now().isoformat()
+        with self._connect() as conn:
+            conn.execute('''
+                INSERT INTO collection_manifest (collection, doc_count, latest_timestamp, version, updated_at)
+                VALUES (?, ?, ?, 1, ?)
+                ON CONFLICT(collection) DO UPDATE SET
+                    doc_count = excluded.doc_count,
+                    latest_timestamp = MAX(COALESCE(latest_timestamp, ''), COALESCE(excluded.latest_timestamp, '')),
+                    version = version + 1,
+                    updated_at = excluded.updated_at
+            ''', (self.collection_name, doc_count, latest_timestamp, now))
+            conn.executemany(
+                'DELETE FROM manifest_files WHERE collection = ? AND source_file = ?',
+                [(self.collection_name, path) for path in removed_files]
+            )
+            conn.executemany('''
+                INSERT OR REPLACE INTO manifest_files
+                    (collection, source_file, content_hash, mtime_ns, size, segment_count, ingested_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [
+                (self.collection_name, f["source_file"], f["content_hash"], f["mtime_ns"], f["size"], f["segment_count"], now)
+                for f in files
+            ])
+
+    def reset(self):
+        """Forget everything about the collection, e.g. after it is cleared."""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM manifest_files WHERE collection = ?', (self.collection_name,))
+            conn.execute('''
+                UPDATE collection_manifest SET doc_count = 0, latest_timestamp = NULL,
+                    version = version + 1, updated_at = ?
+                WHERE collection = ?
+            ''', (datetime.now().isoformat(), self.collection_name))
+
+    def stats(self) -> Dict:
+        """Count, latest timestamp and version without touching the collection."""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT doc_count, latest_timestamp, version FROM collection_manifest WHERE collection = ?',
+                (self.collection_name,)
+            ).fetchone()
+        if not row:
+            return {"count": 0, "latest_timestamp": None, "version": 0}
+        return {"count": row[0], "latest_timestamp": row[1] or None, "version": row[2]}
+
+    def version(self) -> int:
+        """Monotonic write counter, for invalidating anything derived from the collection."""
+        return self.stats()["version"]
+
+    def files(self) -> Dict[str, Dict]:
+        """Fingerprints of every ingested source file, keyed by path."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT source_file, content_hash, mtime_ns, size, segment_count FROM manifest_files WHERE collection = ?',
+                (self.collection_name,)
+            ).fetchall()
+        return {
+            path: {"content_hash": h, "mtime_ns": m, "size": s, "segment_count": n}
+            for path, h, m, s, n in rows
+        }
+
+    def file_status(self, path: str, known: Optional[Dict[str, Dict]] = None) -> str:
+        """'new', 'modified' or 'unchanged' for a source file.
+
+        mtime and size are checked first; the file is only hashed when they
+        differ, so touching a file without editing it isn't a re-ingest.
+        """
+        known = self.files() if known is None else known
+        entry = known.get(path)
+        if entry is None:
+            return "new"
+        st = os.stat(path)
+        if st.st_mtime_ns == entry["mtime_ns"] and st.st_size == entry["size"]:
+            return "unchanged"
+        return "unchanged" if file_fingerprint(path)["content_hash"] == entry["content_hash"] else "modified"
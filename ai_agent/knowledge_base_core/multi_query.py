@@ -0,0 +1,40 @@
+import json
+from typing import List, Union
+
+from .async_retrieval import run_retrieval
+
+MAX_QUERIES = 16
+
+
+def parse_query_list(raw: Union[str, List[str]]) -> List[str]:
+    """Accept a list, a JSON array string, or one query per line from an agent tool call."""
+    if isinstance(raw, str):
+        text = raw.strip()
+        try:
+            parsed = json.loads(text)
+        except json.JSONDecodeError:
+            parsed = text.splitlines()
+        raw = parsed if isinstance(parsed, list) else [text]
+    queries = [str(q).strip() for q in raw if str(q).strip()]
+    return list(dict.fromkeys(queries))[:MAX_QUERIES]
+
+
+def run_query_many(knowledge_base, raw_queries: Union[str, List[str]]) -> str:
+    """Tool entry point: run a list of lookups in one batch and format each result set."""
+    queries = parse_query_list(raw_queries)
+    if not queries:
+        return "No queries provided."
+    sections = []
+    for query, results in zip(queries, knowledge_base.query_many(queries)):
+        sections.append(f"### Query: {query}\n{knowledge_base.format_query_results(results)}")
+    return "\n\n".join(sections)
+
+
+async def arun_query_many(knowledge_base, raw_queries: Union[str, List[str]]) -> str:
+    """Async run_query_many for agent tools running inside an event loop."""
+    return await run_retrieval(run_query_many, knowledge_base, raw_queries)
+
+
+async def arun_query(knowledge_base, query: str) -> str:
+    """Async single lookup, formatted for an agent tool."""
+    return await run_retrieval(lambda: knowledge_base.format_query_results(knowledge_base.query_knowledge_base(query)))
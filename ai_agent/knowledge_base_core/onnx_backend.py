@@ -0,0 +1,125 @@
+import argparse
+import os
+import platform
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+ONNX_INT8_BACKEND = "onnx-int8"
+DEFAULT_ONNX_MODEL_DIR = os.path.join("models", "onnx")
+
+
+def _quantization_config() -> str:
+    """Pick the dynamic int8 quantization preset matching this CPU."""
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "arm64"
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            flags = f.read()
+    except OSError:
+        flags = ""
+    return "avx512_vnni" if "avx512_vnni" in flags else "avx2"
+
+
+def default_intra_op_threads() -> int:
+    """EMBEDDING_ONNX_THREADS, else the CPUs this process may run on.
+
+    One inter-op thread plus all cores intra-op is the fastest layout for
+    a single transformer graph; oversubscribing past the affinity mask
+    only adds contention.
+    """
+    if os.getenv("EMBEDDING_ONNX_THREADS"):
+        return int(os.getenv("EMBEDDING_ONNX_THREADS"))
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def load_onnx_int8_model(model_name: str, model_dir: Optional[str] = None, intra_op_threads: Optional[int] = None):
+    """Load ``model_name`` as a dynamically int8-quantized ONNX SentenceTransformer.
+
+    The first call exports and quantizes the model into ``model_dir`` (a
+    one-off cost of a minute or so); later loads read the quantized graph
+    directly. Requires ``optimum[onnxruntime]``.
+    """
+    import onnxruntime
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    model_dir = model_dir or os.path.join(os.getenv("EMBEDDING_ONNX_DIR", DEFAULT_ONNX_MODEL_DIR), model_name.replace("/", "__"))
+    config = _quantization_config()
+    file_name = f"onnx/model_qint8_{config}.onnx"
+
+    if not os.path.exists(os.path.join(model_dir, file_name)):
+        exported = SentenceTransformer(model_name, backend="onnx", device="cpu")
+        exported.save(model_dir)
+        export_dynamic_quantized_onnx_model(exported, config, model_dir)
+
+    session_options = onnxruntime.SessionOptions()
+    session_options.intra_op_num_threads = intra_op_threads or default_intra_op_threads()
+    session_options.inter_op_num_threads = 1
+    session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return SentenceTransformer(
+        model_dir,
+        backend="onnx",
+        device="cpu",
+        model_kwargs={
+            "file_name": file_name,
+            "provider": "CPUExecutionProvider",
+            "session_options": session_options,
+        },
+    )
+
+
+def compare_backends(texts: List[str], model_name: str, backend: str = ONNX_INT8_BACKEND, batch_size: int = 64) -> Dict[str, float]:
+    """Encode ``texts`` with the default and an alternative backend and compare.
+
+    Reports throughput of each and the cosine similarity between the two
+    embeddings of every text; vectors from ``backend`` can share a
+    collection with existing ones when the minimum cosine stays within
+    tolerance (about 0.99 for int8 mpnet).
+    """
+    from .embeddings import TORCH_BACKEND, get_embedding_model
+
+    results = {}
+    vectors = {}
+    for name in (TORCH_BACKEND, backend):
+        model = get_embedding_model(model_name, name)
+        model.encode(texts[:batch_size], batch_size=batch_size)  # warm up
+        start = time.perf_counter()
+        vectors[name] = np.asarray(model.encode(texts, batch_size=batch_size), dtype=np.float32)
+        results[f"{name}_texts_per_sec"] = len(texts) / (time.perf_counter() - start)
+
+    a, b = vectors[TORCH_BACKEND], vectors[backend]
+    cosine = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    results["speedup"] = results[f"{backend}_texts_per_sec"] / results[f"{TORCH_BACKEND}_texts_per_sec"]
+    results["min_cosine"] = float(cosine.min())
+    results["mean_cosine"] = float(cosine.mean())
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the int8 ONNX embedding model and compare it with PyTorch.")
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--texts", default=None, help="File with one sample text per line")
+    parser.add_argument("--tolerance", type=float, default=0.01, help="Maximum allowed 1 - cosine")
+    args = parser.parse_args()
+
+    from .embeddings import DEFAULT_EMBEDDING_MODEL
+
+    if args.texts:
+        with open(args.texts, "r", encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        texts = [f"Sample sentence {i} about onchain gaming, AI agents and crypto markets." for i in range(512)]
+
+    results = compare_backends(texts, args.model or DEFAULT_EMBEDDING_MODEL)
+    for key, value in results.items():
+        print(f"{key}: {value:.4f}")
+    compatible = 1 - results["min_cosine"] <= args.tolerance
+    print("Compatible with existing collections" if compatible else "NOT compatible: re-embed collections before switching")
+    raise SystemExit(0 if compatible else 1)
+
+
+if __name__ == "__main__":
+    main()
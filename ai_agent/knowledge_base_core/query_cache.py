@@ -0,0 +1,135 @@
+import copy
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from .manifest import CollectionManifest
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a query, with trailing punctuation dropped."""
+    return _WHITESPACE.sub(" ", query).strip().lower().rstrip("?.!")
+
+
+class QueryCache:
+    """Two-level cache in front of a knowledge base's vector search.
+
+    Level one is an LRU of query string -> query embedding, so a repeated
+    query skips the encoder. Level two is a TTL cache of (normalized query,
+    n_results, filters) -> formatted results, tagged with the collection
+    version from the manifest; any add or delete bumps the version and
+    makes older results misses. Embeddings depend only on the query text
+    and model, so they survive collection writes.
+    """
+
+    def __init__(
+        self,
+        manifest: CollectionManifest,
+        encode: Callable[[List[str]], Any],
+        max_embeddings: int = 1024,
+        max_results: int = 256,
+        ttl_seconds: float = 300.0,
+    ):
+        self.manifest = manifest
+        self.encode = encode
+        self.max_embeddings = max_embeddings
+        self.max_results = max_results
+        self.ttl_seconds = ttl_seconds
+        self._embeddings: "OrderedDict[str, Any]" = OrderedDict()
+        self._results: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "embedding_hits": 0, "embedding_misses": 0, "embedding_seconds_saved": 0.0,
+            "result_hits": 0, "result_misses": 0, "result_seconds_saved": 0.0,
+        }
+        self._encode_seconds = 0.0
+
+    def embed_many(self, queries: List[str]) -> List[Any]:
+        """Embeddings for queries, encoding only the ones not in the LRU (in one batch)."""
+        with self._lock:
+            found = {q: self._embeddings[q] for q in queries if q in self._embeddings}
+            for q in found:
+                self._embeddings.move_to_end(q)
+            hits = sum(1 for q in queries if q in found)
+            self._stats["embedding_hits"] += hits
+            self._stats["embedding_misses"] += len(queries) - hits
+            # Estimate saved time from the running per-query encode cost
+            self._stats["embedding_seconds_saved"] += hits * self._encode_seconds
+
+        missing = list(dict.fromkeys(q for q in queries if q not in found))
+        if missing:
+            start = time.perf_counter()
+            vectors = self.encode(missing)
+            per_query = (time.perf_counter() - start) / len(missing)
+            with self._lock:
+                self._encode_seconds = 0.9 * self._encode_seconds + 0.1 * per_query if self._encode_seconds else per_query
+                for q, vector in zip(missing, vectors):
+                    found[q] = vector
+                    self._embeddings[q] = vector
+                while len(self._embeddings) > self.max_embeddings:
+                    self._embeddings.popitem(last=False)
+        return [found[q] for q in queries]
+
+    def embed(self, query: str) -> Any:
+        return self.embed_many([query])[0]
+
+    def _key(self, query: str, n_results: int, where: Optional[Dict]) -> tuple:
+        return (normalize_query(query), n_results, json.dumps(where, sort_keys=True) if where else None)
+
+    def get_results(self, query: str, n_results: int, where: Optional[Dict] = None) -> Optional[Any]:
+        """Cached results for a lookup, or None if absent, expired or from an older collection version."""
+        key = self._key(query, n_results, where)
+        version = self.manifest.version()
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is None or entry[0] != version or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._results[key]
+                self._stats["result_misses"] += 1
+                return None
+            self._results.move_to_end(key)
+            self._stats["result_hits"] += 1
+            self._stats["result_seconds_saved"] += entry[3]
+            return copy.deepcopy(entry[2])
+
+    def put_results(self, query: str, n_results: int, where: Optional[Dict], results: Any, compute_seconds: float, version: int):
+        """Store results computed against collection ``version``."""
+        key = self._key(query, n_results, where)
+        with self._lock:
+            self._results[key] = (version, time.monotonic() + self.ttl_seconds, copy.deepcopy(results), compute_seconds)
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+
+    def cached_query(self, query: str, n_results: int, where: Optional[Dict], search: Callable[[], Any]) -> Any:
+        """Return cached results or run ``search`` and cache what it returns."""
+        cached = self.get_results(query, n_results, where)
+        if cached is not None:
+            return cached
+        # Read the version before searching so a concurrent write can't be masked
+        version = self.manifest.version()
+        start = time.perf_counter()
+        results = search()
+        self.put_results(query, n_results, where, results, time.perf_counter() - start, version)
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._embeddings.clear()
+            self._results.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Hit rates per level and estimated latency saved, in seconds."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["embedding_entries"] = len(self._embeddings)
+            stats["result_entries"] = len(self._results)
+        for level in ("embedding", "result"):
+            total = stats[f"{level}_hits"] + stats[f"{level}_misses"]
+            stats[f"{level}_hit_rate"] = stats[f"{level}_hits"] / total if total else 0.0
+        return stats
@@ -0,0 +1,17 @@
+import os
+import sqlite3
+
+DEFAULT_STATE_DB = "./kb_state.db"
+
+
+def connect_state_db(path: str = None) -> sqlite3.Connection:
+    """Open the SQLite file holding knowledge base bookkeeping (sync watermarks etc.).
+
+    It lives next to ``./chroma_db`` rather than inside it, so Chroma resets
+    never touch it.
+    """
+    path = path or os.getenv("KB_STATE_DB", DEFAULT_STATE_DB)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
@@ -0,0 +1,703 @@
+import abc
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .compact_index import QUANTIZATIONS, CompactVectorIndex
+
+CHROMA_STORE = "chroma"
+NUMPY_STORE = "numpy"
+COMPACT_STORE = "compact"
+VECTOR_STORE_BACKENDS = (CHROMA_STORE, NUMPY_STORE, COMPACT_STORE)
+
+CHROMA_PATH = "./chroma_db"
+DEFAULT_STORE_PATH = "./vector_store"
+# SQLite's default limit on bound parameters is 999
+LOOKUP_CHUNK = 900
+MIN_CAPACITY = 1024
+# Deleted rows are reclaimed once they outnumber live ones (and there are enough to matter)
+COMPACT_MIN_DEAD = 4096
+
+_DEFAULT_INCLUDE = ("metadatas", "documents")
+_DEFAULT_QUERY_INCLUDE = ("metadatas", "documents", "distances")
+_COMPARISONS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def default_vector_store() -> str:
+    """Backend from VECTOR_STORE_BACKEND (``chroma``, ``numpy`` or ``compact``), defaulting to chroma."""
+    backend = os.getenv("VECTOR_STORE_BACKEND", CHROMA_STORE).lower()
+    if backend not in VECTOR_STORE_BACKENDS:
+        raise ValueError(f"Unknown VECTOR_STORE_BACKEND {backend!r}; expected one of {VECTOR_STORE_BACKENDS}")
+    return backend
+
+
+class VectorStore(abc.ABC):
+    """The subset of the Chroma collection API the knowledge bases use.
+
+    ``add``/``upsert``/``get``/``query``/``delete``/``count`` take and
+    return the same shapes as a Chroma collection, so a knowledge base can
+    hold any backend as ``self.collection``. Every backend reports query
+    distances as cosine distance (``1 - similarity``), which the knowledge
+    bases turn back into relevance scores. ``max_batch_size`` bounds a
+    single write.
+    """
+
+    max_batch_size: int = 5000
+
+    @abc.abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abc.abstractmethod
+    def add(self, ids: List[str], embeddings=None, documents: Optional[List[str]] = None, metadatas: Optional[List[Dict]] = None):
+        ...
+
+    @abc.abstractmethod
+    def upsert(self, ids: List[str], embeddings=None, documents: Optional[List[str]] = None, metadatas: Optional[List[Dict]] = None):
+        ...
+
+    @abc.abstractmethod
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None, limit: Optional[int] = None,
+            offset: Optional[int] = None, include: Sequence[str] = _DEFAULT_INCLUDE) -> Dict[str, Any]:
+        ...
+
+    @abc.abstractmethod
+    def query(self, query_embeddings=None, query_texts: Optional[List[str]] = None, n_results: int = 10,
+              where: Optional[Dict] = None, include: Sequence[str] = _DEFAULT_QUERY_INCLUDE) -> Dict[str, Any]:
+        ...
+
+    @abc.abstractmethod
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None):
+        ...
+
+
+class ChromaVectorStore(VectorStore):
+    """A Chroma collection in a PersistentClient, behind the VectorStore interface.
+
+    New collections use Chroma's cosine space. Collections created earlier
+    with the default l2 space report squared L2 distance, which for the
+    unit-length sentence embeddings is twice the cosine distance, so it is
+    halved on the way out.
+    """
+
+    def __init__(self, collection_name: str, embedding_function=None, path: str = CHROMA_PATH):
+        import chromadb
+
+        self.client = chromadb.PersistentClient(path=path)
+        try:
+            # Look up first: some Chroma versions overwrite an existing collection's
+            # metadata from get_or_create_collection, relabelling its space
+            self.collection = self.client.get_collection(name=collection_name, embedding_function=embedding_function)
+        except Exception:
+            self.collection = self.client.get_or_create_collection(
+                name=collection_name,
+                embedding_function=embedding_function,
+                metadata={"hnsw:space": "cosine"}
+            )
+        # The space is fixed when a collection is created; "ip" is already 1 - dot
+        space = (getattr(self.collection, "metadata", None) or {}).get("hnsw:space", "l2")
+        self._distance_scale = 0.5 if space == "l2" else 1.0
+        if hasattr(self.client, "get_max_batch_size"):
+            self.max_batch_size = self.client.get_max_batch_size()
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def add(self, ids, embeddings=None, documents=None, metadatas=None):
+        self.collection.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def upsert(self, ids, embeddings=None, documents=None, metadatas=None):
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=_DEFAULT_INCLUDE):
+        return self.collection.get(ids=ids, where=where, limit=limit, offset=offset, include=list(include))
+
+    def query(self, query_embeddings=None, query_texts=None, n_results=10, where=None, include=_DEFAULT_QUERY_INCLUDE):
+        results = self.collection.query(
+            query_embeddings=query_embeddings,
+            query_texts=query_texts,
+            n_results=n_results,
+            where=where,
+            include=list(include)
+        )
+        if self._distance_scale != 1.0 and results.get("distances"):
+            results["distances"] = [[d * self._distance_scale for d in row] for row in results["distances"]]
+        return results
+
+    def delete(self, ids=None, where=None):
+        self.collection.delete(ids=ids, where=where)
+
+
+def _where_sql(where: Dict, params: List) -> str:
+    """Translate a Chroma ``where`` filter into SQL over the JSON metadata column."""
+    clauses = []
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            joined = f" {key[1:].upper()} ".join(_where_sql(sub, params) for sub in condition)
+            clauses.append(f"({joined})")
+            continue
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, value in condition.items():
+            if op in ("$in", "$nin") and not value:
+                # "IN ()" is a syntax error in SQLite; nothing is in an empty list
+                clauses.append("0" if op == "$in" else "1")
+                continue
+            field = "json_extract(metadata, ?)"
+            params.append(f'$."{key}"')
+            if op in ("$in", "$nin"):
+                params.extend(value)
+                negate = "NOT " if op == "$nin" else ""
+                clauses.append(f"{field} {negate}IN ({','.join('?' * len(value))})")
+            elif op in _COMPARISONS:
+                params.append(value)
+                clauses.append(f"{field} {_COMPARISONS[op]} ?")
+            else:
+                raise ValueError(f"Unsupported where operator {op!r}")
+    return "(" + " AND ".join(clauses) + ")" if clauses else "1"
+
+
+def _empty_result(n_queries: int, include: Sequence[str]) -> Dict[str, Any]:
+    result: Dict[str, Any] = {"ids": [[] for _ in range(n_queries)]}
+    for key in include:
+        result[key] = [[] for _ in range(n_queries)]
+    return result
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _embed(embedding_function, embeddings, documents) -> np.ndarray:
+    if embeddings is None:
+        if embedding_function is None or documents is None:
+            raise ValueError("embeddings are required when the store has no embedding function")
+        embeddings = embedding_function(documents)
+    return _normalize(np.asarray(embeddings, dtype=np.float32))
+
+
+def _embed_queries(embedding_function, query_embeddings, query_texts) -> np.ndarray:
+    if query_embeddings is None:
+        if embedding_function is None or query_texts is None:
+            raise ValueError("query_embeddings are required when the store has no embedding function")
+        query_embeddings = embedding_function(query_texts)
+    queries = np.asarray(query_embeddings, dtype=np.float32)
+    return _normalize(queries.reshape(-1, queries.shape[-1]))
+
+
+class NumpyVectorStore(VectorStore):
+    """Exact in-process vector store on a memory-mapped ``.npy`` file.
+
+    Unit-normalised float32 vectors live in ``vectors.npy`` with a parallel
+    ``live.npy`` mask; ids, documents and JSON metadata live in a small
+    SQLite side table keyed by row number. Opening maps the files without
+    reading them, and a query is one matrix-vector product over the live
+    rows plus ``argpartition`` for the top k. Distances are cosine
+    distances (``1 - similarity``).
+
+    Rows are appended; a delete clears the row's live flag and its side
+    table entry, and the files are compacted once dead rows outnumber
+    live ones. Vectors are flushed before the side table commits, so a
+    crash never exposes a row without its vector.
+    """
+
+    def __init__(self, path: str, embedding_function=None):
+        self.path = path
+        self.embedding_function = embedding_function
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, "vectors.npy")
+        self._live_path = os.path.join(path, "live.npy")
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+        # Odd while a compaction renumbers rows; queries that overlap one are retried
+        self._generation = 0
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS rows (
+                    row INTEGER PRIMARY KEY,
+                    id TEXT NOT NULL UNIQUE,
+                    document TEXT,
+                    metadata TEXT
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS store_info (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            ''')
+        info = dict(self._connect().execute('SELECT key, value FROM store_info').fetchall())
+        self.dim: Optional[int] = info.get("dim")
+        # Readers take one consistent (vectors, live, size) snapshot; writers swap it
+        self._state: Tuple[Optional[np.memmap], Optional[np.memmap], int] = (None, None, info.get("size", 0))
+        if self.dim is not None and os.path.exists(self._vectors_path):
+            self._state = (
+                np.load(self._vectors_path, mmap_mode="r+"),
+                np.load(self._live_path, mmap_mode="r+"),
+                info.get("size", 0),
+            )
+        # Rows to mask out of unfiltered scans; kept alongside the live flags so queries skip the scan
+        self._dead_rows = self._find_dead_rows()
+
+    def _find_dead_rows(self) -> np.ndarray:
+        _, live, size = self._state
+        return np.flatnonzero(~live[:size]) if live is not None else np.empty(0, dtype=np.int64)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; queries run in the knowledge base query pool
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.path, "meta.db"), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def count(self) -> int:
+        return self._connect().execute('SELECT COUNT(*) FROM rows').fetchone()[0]
+
+    def _reserve(self, rows_needed: int):
+        """Grow the mapped files so ``rows_needed`` rows fit (caller holds the write lock)."""
+        vectors, live, size = self._state
+        capacity = 0 if vectors is None else vectors.shape[0]
+        if rows_needed <= capacity:
+            return
+        new_capacity = max(MIN_CAPACITY, capacity * 2, rows_needed)
+        new_vectors = self._new_array(self._vectors_path, (new_capacity, self.dim), np.float32)
+        new_live = self._new_array(self._live_path, (new_capacity,), np.bool_)
+        if size:
+            new_vectors[:size] = vectors[:size]
+            new_live[:size] = live[:size]
+        self._swap(new_vectors, new_live, size)
+
+    @staticmethod
+    def _new_array(path: str, shape, dtype) -> np.memmap:
+        return np.lib.format.open_memmap(path + ".tmp", mode="w+", dtype=dtype, shape=shape)
+
+    def _swap(self, new_vectors: np.memmap, new_live: np.memmap, size: int):
+        new_vectors.flush()
+        new_live.flush()
+        os.replace(self._vectors_path + ".tmp", self._vectors_path)
+        os.replace(self._live_path + ".tmp", self._live_path)
+        # Readers holding the old maps keep a valid (unlinked) mapping until they finish
+        self._state = (new_vectors, new_live, size)
+
+    def _write(self, ids: List[str], embeddings, documents, metadatas, replace: bool):
+        if not ids:
+            return
+        vectors_in = _embed(self.embedding_function, embeddings, documents)
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+        with self._write_lock:
+            conn = self._connect()
+            if self.dim is None:
+                self.dim = vectors_in.shape[1]
+                with conn:
+                    conn.execute('INSERT OR REPLACE INTO store_info VALUES (?, ?)', ("dim", self.dim))
+            elif vectors_in.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional embeddings, got {vectors_in.shape[1]}")
+
+            existing = self._rows_for_ids(ids)
+            if existing and not replace:
+                raise ValueError(f"IDs already exist: {sorted(existing)[:5]}")
+            # Repeated ids within one call: the last occurrence wins, as in Chroma's upsert
+            latest = {id_: i for i, id_ in enumerate(ids)}
+            _, _, size = self._state
+            assignments, next_row = [], size
+            for id_, i in latest.items():
+                if id_ in existing:
+                    assignments.append((existing[id_], i))
+                else:
+                    assignments.append((next_row, i))
+                    next_row += 1
+            self._reserve(next_row)
+            vectors, live, _ = self._state
+            rows = np.fromiter((row for row, _ in assignments), dtype=np.int64, count=len(assignments))
+            sources = np.fromiter((i for _, i in assignments), dtype=np.int64, count=len(assignments))
+            vectors[rows] = vectors_in[sources]
+            live[rows] = True
+            vectors.flush()
+            live.flush()
+            with conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO rows (row, id, document, metadata) VALUES (?, ?, ?, ?)',
+                    [
+                        (row, ids[i], documents[i], json.dumps(metadatas[i]) if metadatas[i] is not None else None)
+                        for row, i in assignments
+                    ]
+                )
+                conn.execute('INSERT OR REPLACE INTO store_info VALUES (?, ?)', ("size", next_row))
+            self._state = (vectors, live, next_row)
+
+    def add(self, ids, embeddings=None, documents=None, metadatas=None):
+        self._write(ids, embeddings, documents, metadatas, replace=False)
+
+    def upsert(self, ids, embeddings=None, documents=None, metadatas=None):
+        self._write(ids, embeddings, documents, metadatas, replace=True)
+
+    def _rows_for_ids(self, ids: Sequence[str]) -> Dict[str, int]:
+        conn = self._connect()
+        found: Dict[str, int] = {}
+        unique = list(set(ids))
+        for start in range(0, len(unique), LOOKUP_CHUNK):
+            chunk = unique[start:start + LOOKUP_CHUNK]
+            found.update(conn.execute(
+                f"SELECT id, row FROM rows WHERE id IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall())
+        return found
+
+    def _select(self, ids: Optional[Sequence[str]], where: Optional[Dict], limit: Optional[int] = None,
+                offset: Optional[int] = None, columns: str = "row, id, document, metadata") -> List[tuple]:
+        """Side table entries matching ids and/or where, in row order."""
+        params: List = []
+        clauses = [_where_sql(where, params)] if where else []
+        if ids is not None:
+            rows = sorted(self._rows_for_ids(ids).values())
+            if not rows:
+                return []
+            clauses.append(f"row IN ({','.join(str(r) for r in rows)})")
+        sql = f'SELECT {columns} FROM rows'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY row'
+        if limit is not None or offset:
+            sql += ' LIMIT ? OFFSET ?'
+            params.extend([limit if limit is not None else -1, offset or 0])
+        return self._connect().execute(sql, params).fetchall()
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=_DEFAULT_INCLUDE):
+        entries = self._select(ids, where, limit, offset)
+        result: Dict[str, Any] = {"ids": [e[1] for e in entries]}
+        if "documents" in include:
+            result["documents"] = [e[2] for e in entries]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(e[3]) if e[3] is not None else None for e in entries]
+        if "embeddings" in include:
+            vectors, _, _ = self._state
+            rows = [e[0] for e in entries]
+            result["embeddings"] = vectors[rows].tolist() if rows else []
+        return result
+
+    def query(self, query_embeddings=None, query_texts=None, n_results=10, where=None, include=_DEFAULT_QUERY_INCLUDE):
+        queries = _embed_queries(self.embedding_function, query_embeddings, query_texts)
+        while True:
+            generation = self._generation
+            if generation % 2 == 0:
+                result = self._query(queries, n_results, where, include)
+                if self._generation == generation:
+                    return result
+            time.sleep(0.001)
+
+    def _query(self, queries: np.ndarray, n_results: int, where: Optional[Dict], include: Sequence[str]) -> Dict[str, Any]:
+        vectors, live, size = self._state
+        if vectors is None or size == 0:
+            return _empty_result(len(queries), include)
+
+        if where:
+            candidates = np.fromiter((e[0] for e in self._select(None, where, columns="row")), dtype=np.int64)
+            candidates = candidates[candidates < size]
+            if not len(candidates):
+                return _empty_result(len(queries), include)
+            scores = queries @ vectors[candidates].T
+        else:
+            candidates = None
+            scores = queries @ vectors[:size].T
+            dead = self._dead_rows
+            if len(dead):
+                scores[:, dead[dead < size]] = -np.inf
+
+        k = min(n_results, scores.shape[1])
+        if k <= 0:
+            return _empty_result(len(queries), include)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        hits = [
+            [(int(candidates[c] if candidates is not None else c), float(s)) for c, s in zip(cols, row_scores) if s > -np.inf]
+            for cols, row_scores in zip(top, top_scores)
+        ]
+        wanted = sorted({row for query_hits in hits for row, _ in query_hits})
+        entries = {}
+        conn = self._connect()
+        for start in range(0, len(wanted), LOOKUP_CHUNK):
+            chunk = wanted[start:start + LOOKUP_CHUNK]
+            for row, id_, document, metadata in conn.execute(
+                f"SELECT row, id, document, metadata FROM rows WHERE row IN ({','.join('?' * len(chunk))})", chunk
+            ):
+                entries[row] = (id_, document, json.loads(metadata) if metadata is not None else None)
+
+        result: Dict[str, Any] = {"ids": []}
+        for key in include:
+            result[key] = []
+        for query_hits in hits:
+            # A row deleted since the snapshot was taken has no side table entry
+            query_hits = [(row, score) for row, score in query_hits if row in entries]
+            result["ids"].append([entries[row][0] for row, _ in query_hits])
+            if "documents" in include:
+                result["documents"].append([entries[row][1] for row, _ in query_hits])
+            if "metadatas" in include:
+                result["metadatas"].append([entries[row][2] for row, _ in query_hits])
+            if "distances" in include:
+                result["distances"].append([1.0 - score for _, score in query_hits])
+            if "embeddings" in include:
+                result["embeddings"].append([vectors[row].tolist() for row, _ in query_hits])
+        return result
+
+    def delete(self, ids=None, where=None):
+        if ids is None and where is None:
+            raise ValueError("delete needs ids or where")
+        with self._write_lock:
+            rows = [e[0] for e in self._select(ids, where, columns="row")]
+            if not rows:
+                return
+            vectors, live, size = self._state
+            live[rows] = False
+            live.flush()
+            self._dead_rows = self._find_dead_rows()
+            conn = self._connect()
+            with conn:
+                for start in range(0, len(rows), LOOKUP_CHUNK):
+                    chunk = rows[start:start + LOOKUP_CHUNK]
+                    conn.execute(f"DELETE FROM rows WHERE row IN ({','.join('?' * len(chunk))})", chunk)
+            dead = size - self.count()
+            if dead >= COMPACT_MIN_DEAD and dead > size - dead:
+                self.compact()
+
+    def compact(self):
+        """Rewrite the files without deleted rows and renumber the side table."""
+        with self._write_lock:
+            vectors, live, size = self._state
+            if vectors is None:
+                return
+            keep = np.flatnonzero(live[:size])
+            new_vectors = self._new_array(self._vectors_path, (max(MIN_CAPACITY, len(keep)), self.dim), np.float32)
+            new_live = self._new_array(self._live_path, (new_vectors.shape[0],), np.bool_)
+            new_vectors[:len(keep)] = vectors[keep]
+            new_live[:len(keep)] = True
+            conn = self._connect()
+            self._generation += 1
+            try:
+                with conn:
+                    # Rows move to their rank among live rows; ascending order never collides
+                    conn.executemany(
+                        'UPDATE rows SET row = ? WHERE row = ?',
+                        [(new_row, int(old_row)) for new_row, old_row in enumerate(keep) if new_row != old_row]
+                    )
+                    conn.execute('INSERT OR REPLACE INTO store_info VALUES (?, ?)', ("size", len(keep)))
+                    self._swap(new_vectors, new_live, len(keep))
+                self._dead_rows = self._find_dead_rows()
+            finally:
+                self._generation += 1
+
+    def resident_bytes(self) -> int:
+        """Bytes of vector data a full scan touches."""
+        _, _, size = self._state
+        return size * (self.dim or 0) * 4 + size
+
+
+class CompactVectorStore(VectorStore):
+    """Quantized vector store: a CompactVectorIndex plus a SQLite side table.
+
+    Only the index's int8 or PQ codes stay in memory; full-precision vectors
+    are re-read from disk to re-rank each query's candidates, so memory per
+    vector is a fraction of the numpy store's at a small recall cost.
+    Documents and JSON metadata live in ``meta.db`` keyed by id. The index
+    is saved (appending only the batch's rows) before the side table
+    commits, so every id in the side table has a vector. Distances are
+    cosine distances (``1 - similarity``).
+    """
+
+    def __init__(self, path: str, embedding_function=None, quantization: str = "int8"):
+        self.path = path
+        self.embedding_function = embedding_function
+        os.makedirs(path, exist_ok=True)
+        self.index = CompactVectorIndex(os.path.join(path, "index"), quantization=quantization)
+        self._local = threading.local()
+        # The index is not safe for concurrent use, so reads and writes both hold this
+        self._lock = threading.RLock()
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    id TEXT PRIMARY KEY,
+                    document TEXT,
+                    metadata TEXT
+                )
+            ''')
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.path, "meta.db"), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def count(self) -> int:
+        return self._connect().execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def _existing(self, ids: Sequence[str]) -> List[str]:
+        conn = self._connect()
+        unique = list(set(ids))
+        found: List[str] = []
+        for start in range(0, len(unique), LOOKUP_CHUNK):
+            chunk = unique[start:start + LOOKUP_CHUNK]
+            found.extend(row[0] for row in conn.execute(
+                f"SELECT id FROM entries WHERE id IN ({','.join('?' * len(chunk))})", chunk
+            ))
+        return found
+
+    def _write(self, ids: List[str], embeddings, documents, metadatas, replace: bool):
+        if not ids:
+            return
+        vectors = _embed(self.embedding_function, embeddings, documents)
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+        with self._lock:
+            if not replace:
+                existing = self._existing(ids)
+                if existing:
+                    raise ValueError(f"IDs already exist: {sorted(existing)[:5]}")
+            # Repeated ids within one call: the last occurrence wins, as in Chroma's upsert
+            order = list({id_: i for i, id_ in enumerate(ids)}.values())
+            self.index.add([ids[i] for i in order], vectors[order])
+            self.index.save()
+            with self._connect() as conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO entries (id, document, metadata) VALUES (?, ?, ?)',
+                    [
+                        (ids[i], documents[i], json.dumps(metadatas[i]) if metadatas[i] is not None else None)
+                        for i in order
+                    ]
+                )
+
+    def add(self, ids, embeddings=None, documents=None, metadatas=None):
+        self._write(ids, embeddings, documents, metadatas, replace=False)
+
+    def upsert(self, ids, embeddings=None, documents=None, metadatas=None):
+        self._write(ids, embeddings, documents, metadatas, replace=True)
+
+    def _select(self, ids: Optional[Sequence[str]], where: Optional[Dict], limit: Optional[int] = None,
+                offset: Optional[int] = None) -> List[tuple]:
+        """Side table (id, document, metadata) entries matching ids and/or where, in insertion order."""
+        conn = self._connect()
+        params: List = []
+        where_clause = _where_sql(where, params) if where else "1"
+        if ids is None:
+            sql = f'SELECT id, document, metadata FROM entries WHERE {where_clause} ORDER BY rowid'
+            if limit is not None or offset:
+                sql += ' LIMIT ? OFFSET ?'
+                params.extend([limit if limit is not None else -1, offset or 0])
+            return conn.execute(sql, params).fetchall()
+
+        found = []
+        unique = list(set(ids))
+        for start in range(0, len(unique), LOOKUP_CHUNK):
+            chunk = unique[start:start + LOOKUP_CHUNK]
+            found.extend(conn.execute(
+                f"SELECT rowid, id, document, metadata FROM entries "
+                f"WHERE {where_clause} AND id IN ({','.join('?' * len(chunk))})",
+                params + chunk
+            ).fetchall())
+        found.sort()
+        end = None if limit is None else (offset or 0) + limit
+        return [entry[1:] for entry in found[offset or 0:end]]
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=_DEFAULT_INCLUDE):
+        entries = self._select(ids, where, limit, offset)
+        result: Dict[str, Any] = {"ids": [e[0] for e in entries]}
+        if "documents" in include:
+            result["documents"] = [e[1] for e in entries]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(e[2]) if e[2] is not None else None for e in entries]
+        if "embeddings" in include:
+            with self._lock:
+                result["embeddings"] = self.index.vectors(result["ids"]).tolist()
+        return result
+
+    def query(self, query_embeddings=None, query_texts=None, n_results=10, where=None, include=_DEFAULT_QUERY_INCLUDE):
+        queries = _embed_queries(self.embedding_function, query_embeddings, query_texts)
+        with self._lock:
+            rows = None
+            if where:
+                rows = self.index.rows_for([e[0] for e in self._select(None, where)])
+                if not len(rows):
+                    return _empty_result(len(queries), include)
+            hits = self.index.search_many(queries, n_results, rows)
+
+            wanted = sorted({id_ for query_hits in hits for id_, _ in query_hits})
+            entries = {e[0]: e for e in self._select(wanted, None)} if wanted else {}
+            result: Dict[str, Any] = {"ids": []}
+            for key in include:
+                result[key] = []
+            for query_hits in hits:
+                # An index row whose side table write never committed has no entry
+                query_hits = [(id_, score) for id_, score in query_hits if id_ in entries]
+                result["ids"].append([id_ for id_, _ in query_hits])
+                if "documents" in include:
+                    result["documents"].append([entries[id_][1] for id_, _ in query_hits])
+                if "metadatas" in include:
+                    result["metadatas"].append([
+                        json.loads(entries[id_][2]) if entries[id_][2] is not None else None for id_, _ in query_hits
+                    ])
+                if "distances" in include:
+                    result["distances"].append([1.0 - score for _, score in query_hits])
+                if "embeddings" in include:
+                    result["embeddings"].append(self.index.vectors([id_ for id_, _ in query_hits]).tolist())
+            return result
+
+    def delete(self, ids=None, where=None):
+        if ids is None and where is None:
+            raise ValueError("delete needs ids or where")
+        with self._lock:
+            doomed = [e[0] for e in self._select(ids, where)]
+            if not doomed:
+                return
+            with self._connect() as conn:
+                for start in range(0, len(doomed), LOOKUP_CHUNK):
+                    chunk = doomed[start:start + LOOKUP_CHUNK]
+                    conn.execute(f"DELETE FROM entries WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+            self.index.delete(doomed)
+            dead = len(self.index.ids) - len(self.index)
+            if dead >= COMPACT_MIN_DEAD and dead > len(self.index):
+                self.index.compact()
+            else:
+                self.index.save()
+
+    def compact(self):
+        """Rewrite the index without deleted rows."""
+        with self._lock:
+            self.index.compact()
+
+    def resident_bytes(self) -> int:
+        """Bytes held in memory for search."""
+        return self.index.resident_bytes()
+
+
+def open_vector_store(collection_name: str, embedding_function=None, backend: Optional[str] = None) -> VectorStore:
+    """Open a knowledge base collection in the configured backend.
+
+    NumPy and compact stores live under VECTOR_STORE_PATH (default
+    ``./vector_store``), one directory per collection. The compact store
+    quantizes with VECTOR_STORE_QUANTIZATION (``int8`` or ``pq``; PQ needs
+    at least 256 vectors in the first write to train its codebooks).
+    """
+    backend = backend or default_vector_store()
+    root = os.getenv("VECTOR_STORE_PATH", DEFAULT_STORE_PATH)
+    if backend == NUMPY_STORE:
+        return NumpyVectorStore(os.path.join(root, collection_name), embedding_function)
+    if backend == COMPACT_STORE:
+        quantization = os.getenv("VECTOR_STORE_QUANTIZATION", "int8").lower()
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown VECTOR_STORE_QUANTIZATION {quantization!r}; expected one of {QUANTIZATIONS}")
+        return CompactVectorStore(os.path.join(root, collection_name), embedding_function, quantization)
+    return ChromaVectorStore(collection_name, embedding_function)
@@ -0,0 +1,443 @@
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from consultation_store.analytics import ANALYTICS_DB_NAME, ConsultationAnalytics
+from consultation_store.journal import atomic_write_json
+from consultation_store.index import is_consultation_file
+from consultation_store.search import SEARCH_DB_NAME, ConsultationSearchIndex
+
+load_dotenv(override=True)
+
+DEFAULT_JOBS_DB = "llm_batch_jobs.db"
+DEFAULT_MODEL = "claude-3-5-sonnet-20241022"
+MAX_TOKENS = 1024
+# Provider limit on requests per message batch
+MAX_BATCH_REQUESTS = 10000
+
+SUMMARY_PROMPT = """
+Below is a medical consultation conversation. The collected data includes:
+1. Symptoms and their duration
+2. Medical history
+3. Current medications
+4. Diagnosis
+5. Treatment plan
+
+Conversation:
+{conversation}
+
+Please generate a concise summary of the collected data from this conversation.
+Format your response as JSON with the following structure:
+{{
+    "diagnosis": "primary diagnosis",
+    "prescription": {{
+        "medications": [],
+        "tests": [],
+        "follow_up": [],
+        "advice": []
+    }},
+    "symptoms": [
+        {{
+            "name": "symptom name",
+            "duration": "duration description",
+            "severity": "mild/moderate/severe"
+        }}
+    ],
+    "medical_history": "medical history description"
+}}
+Respond with the JSON only.
+"""
+
+DIAGNOSIS_PROMPT = """
+Below is a medical consultation conversation.
+
+Conversation:
+{conversation}
+
+Extract the most likely diagnosis and the reported symptoms as JSON:
+{{
+    "diagnosis": "primary diagnosis",
+    "differential": ["other possible diagnoses"],
+    "symptoms": [
+        {{
+            "name": "symptom name",
+            "duration": "duration description",
+            "severity": "mild/moderate/severe"
+        }}
+    ]
+}}
+Respond with the JSON only.
+"""
+
+# Task name -> (prompt template, key the parsed result is written back under)
+TASKS = {
+    "summary": (SUMMARY_PROMPT, "llm_summary"),
+    "diagnosis": (DIAGNOSIS_PROMPT, "llm_diagnosis"),
+}
+
+
+def format_conversation(record: Dict[str, Any]) -> str:
+    """Render either consultation layout's history as Question/Response text."""
+    lines = []
+    for turn in record.get("conversation_history", []):
+        if "question" in turn:
+            lines.append(f"Question: {turn['question']}\nResponse: {turn.get('response', '')}")
+        elif "doctor" in turn:
+            lines.append(f"Doctor: {turn['doctor']}")
+        elif turn.get("user"):
+            lines.append(f"Patient: {turn['user']}")
+    if not lines:
+        # Text-mode consultations only keep the structured outcome
+        lines.append(json.dumps({k: record.get(k) for k in ("symptoms", "medical_history", "diagnosis")}))
+    return "\n\n".join(lines)
+
+
+def _parse_json(text: str) -> Any:
+    """Parse a JSON reply, tolerating prose or code fences around it."""
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end == -1:
+        raise ValueError("No JSON object in response")
+    return json.loads(text[start:end + 1])
+
+
+class AnthropicBatchBackend:
+    """Submits work through the Anthropic Message Batches API."""
+
+    name = "anthropic"
+
+    def __init__(self, model: str = DEFAULT_MODEL):
+        import anthropic
+
+        self.client = anthropic.Anthropic()
+        self.model = model
+
+    def submit(self, requests: List[Tuple[str, str]]) -> str:
+        batch = self.client.messages.batches.create(requests=[
+            {
+                "custom_id": custom_id,
+                "params": {
+                    "model": self.model,
+                    "max_tokens": MAX_TOKENS,
+                    "messages": [{"role": "user", "content": prompt}],
+                },
+            }
+            for custom_id, prompt in requests
+        ])
+        return batch.id
+
+    def is_done(self, batch_id: str) -> bool:
+        return self.client.messages.batches.retrieve(batch_id).processing_status == "ended"
+
+    def results(self, batch_id: str) -> Iterable[Tuple[str, Optional[str], Optional[str]]]:
+        """Yield (custom_id, text, error) for every request in the batch."""
+        for entry in self.client.messages.batches.results(batch_id):
+            if entry.result.type == "succeeded":
+                text = "".join(block.text for block in entry.result.message.content if block.type == "text")
+                yield entry.custom_id, text, None
+            else:
+                yield entry.custom_id, None, entry.result.type
+
+
+class LocalBatchBackend:
+    """Stand-in backend that runs a batch through any LangChain chat model.
+
+    Requests run concurrently (bounded by ``concurrency``) when the batch is
+    submitted; results are held until collected, which mirrors the provider
+    flow closely enough to exercise job tracking and resume locally.
+    """
+
+    name = "local"
+
+    def __init__(self, llm=None, concurrency: int = 8):
+        if llm is None:
+            from langchain_anthropic import ChatAnthropic
+
+            llm = ChatAnthropic(model=DEFAULT_MODEL)
+        self.llm = llm
+        self.concurrency = concurrency
+        self._results: Dict[str, List[Tuple[str, Optional[str], Optional[str]]]] = {}
+
+    async def _run(self, requests: List[Tuple[str, str]]):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_one(custom_id: str, prompt: str):
+            async with semaphore:
+                try:
+                    response = await self.llm.ainvoke(prompt)
+                    return custom_id, response.text(), None
+                except Exception as e:
+                    return custom_id, None, str(e)
+
+        return await asyncio.gather(*(run_one(cid, prompt) for cid, prompt in requests))
+
+    def submit(self, requests: List[Tuple[str, str]]) -> str:
+        batch_id = f"local_{uuid.uuid4().hex}"
+        self._results[batch_id] = asyncio.run(self._run(requests))
+        return batch_id
+
+    def is_done(self, batch_id: str) -> bool:
+        # Local batches that were lost with a previous process are treated as done
+        # and empty, so their items fall back to pending and are resubmitted.
+        return True
+
+    def results(self, batch_id: str) -> Iterable[Tuple[str, Optional[str], Optional[str]]]:
+        return self._results.pop(batch_id, [])
+
+
+class BatchJobRunner:
+    """Tracks offline LLM jobs on disk so they survive crashes.
+
+    A job is a set of (consultation, task) items. Items move from
+    ``pending`` to ``submitted`` (with the provider batch id) to ``done`` or
+    ``error``. ``run`` can be called again after a crash: submitted batches
+    are polled and collected, and anything still pending is resubmitted.
+    Successful results are written back into the consultation files, and
+    the search index and analytics rollups are refreshed for each of them.
+    A job can only be resumed through the backend it was submitted to.
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        db_path: str = DEFAULT_JOBS_DB,
+        poll_interval: float = 30.0,
+        search_index: Optional[ConsultationSearchIndex] = None,
+        analytics: Optional[ConsultationAnalytics] = None,
+    ):
+        self.backend = backend or AnthropicBatchBackend()
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self.search_index = search_index or ConsultationSearchIndex()
+        self.analytics = analytics or ConsultationAnalytics()
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self):
+        """Create the job tables if they don't exist."""
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS batch_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    task TEXT NOT NULL,
+                    backend TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'running',
+                    created_at TEXT NOT NULL,
+                    finished_at TEXT
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS batch_items (
+                    job_id TEXT NOT NULL,
+                    custom_id TEXT NOT NULL,
+                    consultation_path TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    batch_id TEXT,
+                    error TEXT,
+                    PRIMARY KEY (job_id, custom_id)
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_batch_items_status ON batch_items(job_id, status)')
+
+    def create_job(self, task: str, consultation_paths: List[str]) -> str:
+        """Register a job over the given consultation files."""
+        if task not in TASKS:
+            raise ValueError(f"Unknown task: {task}")
+        job_id = f"{task}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO batch_jobs (job_id, task, backend, created_at) VALUES (?, ?, ?, ?)',
+                (job_id, task, self.backend.name, datetime.now().isoformat())
+            )
+            conn.executemany(
+                'INSERT INTO batch_items (job_id, custom_id, consultation_path) VALUES (?, ?, ?)',
+                [(job_id, f"item-{i}", os.path.abspath(path)) for i, path in enumerate(consultation_paths)]
+            )
+        print(f"Created job {job_id} with {len(consultation_paths)} consultations")
+        return job_id
+
+    def _submit_pending(self, job_id: str, task: str):
+        with self._connect() as conn:
+            items = conn.execute(
+                "SELECT custom_id, consultation_path FROM batch_items WHERE job_id = ? AND status = 'pending'",
+                (job_id,)
+            ).fetchall()
+        template = TASKS[task][0]
+
+        for start in range(0, len(items), MAX_BATCH_REQUESTS):
+            chunk = items[start:start + MAX_BATCH_REQUESTS]
+            requests, missing = [], []
+            for custom_id, path in chunk:
+                try:
+                    with open(path, "r") as f:
+                        requests.append((custom_id, template.format(conversation=format_conversation(json.load(f)))))
+                except (OSError, ValueError) as e:
+                    missing.append(("error", str(e), job_id, custom_id))
+            batch_id = self.backend.submit(requests) if requests else None
+            with self._connect() as conn:
+                conn.executemany(
+                    "UPDATE batch_items SET status = 'submitted', batch_id = ? WHERE job_id = ? AND custom_id = ?",
+                    [(batch_id, job_id, custom_id) for custom_id, _ in requests]
+                )
+                conn.executemany(
+                    "UPDATE batch_items SET status = ?, error = ? WHERE job_id = ? AND custom_id = ?",
+                    missing
+                )
+            if batch_id:
+                print(f"Submitted batch {batch_id} with {len(requests)} requests")
+
+    def _collect(self, job_id: str, task: str) -> bool:
+        """Collect finished batches. Returns True when none are outstanding."""
+        with self._connect() as conn:
+            batch_ids = [row[0] for row in conn.execute(
+                "SELECT DISTINCT batch_id FROM batch_items WHERE job_id = ? AND status = 'submitted'",
+                (job_id,)
+            )]
+            paths = dict(conn.execute(
+                'SELECT custom_id, consultation_path FROM batch_items WHERE job_id = ?', (job_id,)
+            ))
+
+        outstanding = False
+        result_key = TASKS[task][1]
+        for batch_id in batch_ids:
+            if not self.backend.is_done(batch_id):
+                outstanding = True
+                continue
+            updates = []
+            for custom_id, text, error in self.backend.results(batch_id):
+                if error is None:
+                    try:
+                        self._write_back(paths[custom_id], result_key, _parse_json(text), job_id)
+                        updates.append(("done", None, job_id, custom_id))
+                    except (OSError, ValueError) as e:
+                        updates.append(("error", str(e), job_id, custom_id))
+                else:
+                    updates.append(("error", error, job_id, custom_id))
+            with self._connect() as conn:
+                conn.executemany(
+                    "UPDATE batch_items SET status = ?, error = ? WHERE job_id = ? AND custom_id = ?",
+                    updates
+                )
+                # Anything the backend didn't report on goes back to pending
+                conn.execute(
+                    "UPDATE batch_items SET status = 'pending', batch_id = NULL "
+                    "WHERE job_id = ? AND batch_id = ? AND status = 'submitted'",
+                    (job_id, batch_id)
+                )
+        return not outstanding
+
+    def _write_back(self, path: str, key: str, result: Any, job_id: str):
+        """Store a result in its consultation file with an atomic rewrite."""
+        with open(path, "r") as f:
+            record = json.load(f)
+        record[key] = result
+        record.setdefault("llm_batch", {})[key] = {"job_id": job_id, "completed_at": datetime.now().isoformat()}
+        atomic_write_json(record, path)
+        self._reindex(path)
+
+    def _reindex(self, path: str):
+        """Refresh the search index and analytics for a rewritten consultation."""
+        for name, update in (("search index", self.search_index.index_file), ("analytics", self.analytics.record_file)):
+            try:
+                update(path)
+            except Exception as e:
+                # The result is already saved; the search index's startup sync catches up
+                print(f"Error updating {name} for {path}: {e}")
+
+    def run(self, job_id: str) -> Dict[str, int]:
+        """Drive a job to completion, resuming wherever it left off."""
+        with self._connect() as conn:
+            task, backend = conn.execute('SELECT task, backend FROM batch_jobs WHERE job_id = ?', (job_id,)).fetchone()
+        if backend != self.backend.name:
+            # Batch ids only mean something to the backend that issued them
+            raise ValueError(f"Job {job_id} was submitted through the {backend} backend, not {self.backend.name}")
+
+        while True:
+            self._submit_pending(job_id, task)
+            if self._collect(job_id, task) and not self.status(job_id).get("pending"):
+                break
+            time.sleep(self.poll_interval)
+
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE batch_jobs SET status = 'finished', finished_at = ? WHERE job_id = ?",
+                (datetime.now().isoformat(), job_id)
+            )
+        counts = self.status(job_id)
+        print(f"Job {job_id} finished: {counts}")
+        return counts
+
+    def resume_all(self):
+        """Finish every interrupted job that was submitted through this backend."""
+        with self._connect() as conn:
+            jobs = conn.execute("SELECT job_id, backend FROM batch_jobs WHERE status = 'running'").fetchall()
+        for job_id, backend in jobs:
+            if backend != self.backend.name:
+                print(f"Skipping job {job_id}: resume it with --backend {backend}")
+                continue
+            print(f"Resuming job {job_id}")
+            self.run(job_id)
+
+    def status(self, job_id: str) -> Dict[str, int]:
+        """Item counts by status for a job."""
+        with self._connect() as conn:
+            return dict(conn.execute(
+                'SELECT status, COUNT(*) FROM batch_items WHERE job_id = ? GROUP BY status', (job_id,)
+            ))
+
+
+def consultations_missing(consultations_dir: str, task: str) -> List[str]:
+    """Consultation files that don't have a result for ``task`` yet."""
+    key = TASKS[task][1]
+    paths = []
+    for filename in sorted(os.listdir(consultations_dir)):
+        if not is_consultation_file(filename):
+            continue
+        path = os.path.join(consultations_dir, filename)
+        with open(path, "r") as f:
+            if key not in json.load(f):
+                paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run offline LLM work over stored consultations in batches.")
+    parser.add_argument("--task", choices=list(TASKS), default="summary")
+    parser.add_argument("--consultations-dir", default="consultations")
+    parser.add_argument("--backend", choices=["anthropic", "local"], default="anthropic")
+    parser.add_argument("--db", default=DEFAULT_JOBS_DB)
+    parser.add_argument("--resume", action="store_true", help="Only resume interrupted jobs")
+    args = parser.parse_args()
+
+    backend = AnthropicBatchBackend() if args.backend == "anthropic" else LocalBatchBackend()
+    runner = BatchJobRunner(
+        backend,
+        args.db,
+        poll_interval=30.0 if args.backend == "anthropic" else 0.0,
+        search_index=ConsultationSearchIndex(os.path.join(args.consultations_dir, SEARCH_DB_NAME)),
+        analytics=ConsultationAnalytics(os.path.join(args.consultations_dir, ANALYTICS_DB_NAME)),
+    )
+    runner.resume_all()
+    if args.resume:
+        return
+
+    paths = consultations_missing(args.consultations_dir, args.task)
+    if not paths:
+        print(f"All consultations already have a {args.task} result")
+        return
+    runner.run(runner.create_job(args.task, paths))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+import os
+import sys
+
+# Add the parent directory to PYTHONPATH
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+import argparse
+import gzip
+import hashlib
+import json
+import queue
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils import print_system, print_error
+from podcast_agent.transcript_chunker import split_text
+from knowledge_base_core import (
+    CollectionManifest,
+    EmbeddingFunction,
+    QueryCache,
+    connect_state_db,
+    file_fingerprint,
+    open_vector_store,
+    run_retrieval,
+)
+
+# Abstracts per encode + write batch. At most QUEUE_DEPTH + 3 batches are in
+# memory at once, whatever the corpus size: the queued ones, one the reader is
+# blocked putting, one being encoded and one being written
+INGEST_BATCH_SIZE = 512
+QUEUE_DEPTH = 2
+# Worker processes for bulk encoding (sentence-transformers multi-process
+# pool); 0 or 1 encodes in-process, which already uses every core via torch
+ENCODE_PROCESSES = int(os.getenv("MEDICAL_KB_ENCODE_PROCESSES", "0"))
+ARTICLE_SUFFIXES = (".jsonl", ".jsonl.gz", ".xml", ".xml.gz")
+
+
+def _open_text(path: str, mode: str = "rt"):
+    return gzip.open(path, mode, encoding="utf-8") if path.endswith(".gz") else open(path, mode, encoding="utf-8")
+
+
+def _article_id(article: Dict) -> str:
+    for key in ("pmid", "id", "doi"):
+        if article.get(key) not in (None, ""):
+            return str(article[key])
+    return hashlib.sha1((article.get("title") or "").encode("utf-8")).hexdigest()[:16]
+
+
+def iter_jsonl_articles(path: str, skip: int = 0) -> Iterator[Optional[Dict]]:
+    """Stream articles from a JSON Lines dump, one object per line.
+
+    Recognised fields: pmid/id/doi, title, abstract (or text), journal,
+    year. ``skip`` leading records are passed over without being parsed.
+    A malformed line is logged and yielded as None, so it still counts as
+    a record and the ingest checkpoint moves past it.
+    """
+    with _open_text(path) as f:
+        position = 0
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            position += 1
+            if position <= skip:
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError(f"expected an object, got {type(record).__name__}")
+            except ValueError as e:
+                print_error(f"{os.path.basename(path)}:{line_no}: skipping malformed record: {e}")
+                yield None
+                continue
+            yield {
+                "id": _article_id(record),
+                "title": record.get("title") or "",
+                "abstract": record.get("abstract") or record.get("text") or "",
+                "journal": record.get("journal") or "",
+                "year": str(record.get("year") or ""),
+            }
+
+
+def _element_text(element: Optional[ET.Element]) -> str:
+    return "".join(element.itertext()).strip() if element is not None else ""
+
+
+def iter_pubmed_xml_articles(path: str, skip: int = 0) -> Iterator[Dict]:
+    """Stream articles from a PubMed-style XML dump (PubmedArticle elements).
+
+    Parsed with iterparse and each article element is cleared once read,
+    so memory stays flat for multi-gigabyte baseline files.
+    """
+    with (gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")) as f:
+        position = 0
+        for _, element in ET.iterparse(f, events=("end",)):
+            if element.tag != "PubmedArticle":
+                continue
+            if position >= skip:
+                title = _element_text(element.find(".//ArticleTitle"))
+                yield {
+                    "id": _element_text(element.find(".//PMID")) or _article_id({"title": title}),
+                    "title": title,
+                    "abstract": " ".join(_element_text(part) for part in element.iter("AbstractText")),
+                    "journal": _element_text(element.find(".//Journal/Title")),
+                    "year": _element_text(element.find(".//PubDate/Year")),
+                }
+            position += 1
+            element.clear()
+
+
+def iter_articles(path: str, skip: int = 0) -> Iterator[Optional[Dict]]:
+    """Stream articles from a JSONL or XML dump (optionally gzipped)."""
+    if path.endswith((".xml", ".xml.gz")):
+        return iter_pubmed_xml_articles(path, skip)
+    return iter_jsonl_articles(path, skip)
+
+
+class MedicalKnowledgeBase:
+    def __init__(self, collection_name: str = "medical_knowledge"):
+        # Shares the process-wide embedding model with the other knowledge bases
+        embedding_func = EmbeddingFunction()
+        self.embedding_function = embedding_func
+
+        # Create or get collection in the configured vector store (VECTOR_STORE_BACKEND)
+        try:
+            self.collection = open_vector_store(collection_name, embedding_func)
+        except Exception as e:
+            print_error(f"Error initializing collection: {e}")
+            raise
+
+        # Abstracts are unique, so bulk ingestion bypasses the embedding cache
+        # rather than filling it with millions of one-off entries
+        self.ingest_embedding_function = EmbeddingFunction()
+        self.ingest_embedding_function.cache = None
+
+        self.collection_name = collection_name
+        self.manifest = CollectionManifest(collection_name)
+        self.query_cache = QueryCache(self.manifest, lambda texts: self.embedding_function.encode(texts).tolist())
+        with connect_state_db() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS medical_ingest_checkpoints (
+                    collection TEXT NOT NULL,
+                    source_file TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    records_done INTEGER NOT NULL,
+                    chunks_done INTEGER NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (collection, source_file)
+                )
+            ''')
+
+    def _checkpoint(self, source_file: str, content_hash: str) -> Tuple[int, int]:
+        """(records, chunks) already ingested from this version of a file."""
+        with connect_state_db() as conn:
+            row = conn.execute(
+                'SELECT content_hash, records_done, chunks_done FROM medical_ingest_checkpoints WHERE collection = ? AND source_file = ?',
+                (self.collection_name, source_file)
+            ).fetchone()
+        if row and row[0] == content_hash:
+            return row[1], row[2]
+        return 0, 0
+
+    def _save_checkpoint(self, source_file: str, content_hash: str, records_done: int, chunks_done: int):
+        with connect_state_db() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO medical_ingest_checkpoints VALUES (?, ?, ?, ?, ?, ?)',
+                (self.collection_name, source_file, content_hash, records_done, chunks_done, datetime.now().isoformat())
+            )
+
+    @staticmethod
+    def _article_rows(article: Dict, source_file: str, timestamp: str) -> List[Tuple[str, str, Dict]]:
+        """Split one article into (id, document, metadata) rows of embedding size."""
+        text = ". ".join(part for part in (article["title"].rstrip("."), article["abstract"]) if part)
+        if not text:
+            return []
+        metadata = {
+            "article_id": article["id"],
+            "title": article["title"][:500],
+            "journal": article["journal"],
+            "year": article["year"],
+            "source_file": source_file,
+            "timestamp": timestamp,
+        }
+        return [
+            (f"{article['id']}_{part}", window, {**metadata, "part": part})
+            for part, window in enumerate(split_text(text))
+        ]
+
+    def _batches(self, source_file: str, skip: int, batch_size: int) -> Iterator[Tuple[List[Tuple[str, str, Dict]], int, int]]:
+        """Yield (rows, records consumed, malformed records among them) batches from one dump."""
+        timestamp = datetime.now().isoformat()
+        rows, consumed, malformed = [], 0, 0
+        for article in iter_articles(source_file, skip):
+            consumed += 1
+            if article is None:
+                malformed += 1
+                continue
+            rows.extend(self._article_rows(article, source_file, timestamp))
+            if len(rows) >= batch_size:
+                yield rows, consumed, malformed
+                rows, consumed, malformed = [], 0, 0
+        if rows or consumed:
+            yield rows, consumed, malformed
+
+    def _start_encode_pool(self, processes: int):
+        if processes <= 1:
+            return None
+        model = self.ingest_embedding_function.model
+        return model.start_multi_process_pool(["cpu"] * processes)
+
+    def _encode(self, texts: List[str], pool) -> List[List[float]]:
+        if pool is None:
+            return self.ingest_embedding_function.encode(texts).tolist()
+        model = self.ingest_embedding_function.model
+        return model.encode_multi_process(
+            texts, pool, batch_size=self.ingest_embedding_function.batch_size
+        ).astype("float32").tolist()
+
+    def ingest_file(self, source_file: str, batch_size: int = INGEST_BATCH_SIZE, encode_processes: int = ENCODE_PROCESSES) -> Dict:
+        """Stream one dump into the collection, resuming from its checkpoint.
+
+        Three stages overlap: a reader thread parses and chunks articles
+        into a bounded queue, the calling thread encodes each batch, and a
+        single writer thread upserts it into Chroma and then advances the
+        checkpoint. Writes are upserts, so replaying a batch after a crash
+        between write and checkpoint is harmless.
+        """
+        fingerprint = file_fingerprint(source_file)
+        records_done, chunks_done = self._checkpoint(source_file, fingerprint["content_hash"])
+        if records_done:
+            print_system(f"Resuming {os.path.basename(source_file)} after {records_done} records")
+
+        batches: "queue.Queue" = queue.Queue(maxsize=QUEUE_DEPTH)
+        reader_error: List[BaseException] = []
+
+        def read():
+            try:
+                for batch in self._batches(source_file, records_done, batch_size):
+                    batches.put(batch)
+            except BaseException as e:
+                reader_error.append(e)
+            finally:
+                batches.put(None)
+
+        progress = {"records": records_done, "chunks": chunks_done, "malformed": 0}
+
+        def write(rows, consumed, malformed, embeddings):
+            if rows:
+                ids, documents, metadatas = (list(column) for column in zip(*rows))
+                max_batch = self.collection.max_batch_size
+                for start in range(0, len(ids), max_batch):
+                    end = start + max_batch
+                    self.collection.upsert(
+                        ids=ids[start:end],
+                        embeddings=embeddings[start:end],
+                        documents=documents[start:end],
+                        metadatas=metadatas[start:end]
+                    )
+            progress["records"] += consumed
+            progress["chunks"] += len(rows)
+            progress["malformed"] += malformed
+            self._save_checkpoint(source_file, fingerprint["content_hash"], progress["records"], progress["chunks"])
+            if rows:
+                self.manifest.record_write(doc_count=self.collection.count(), latest_timestamp=rows[-1][2]["timestamp"])
+
+        start = time.perf_counter()
+        new_chunks = 0
+        pool = self._start_encode_pool(encode_processes)
+        threading.Thread(target=read, name="medical-kb-reader", daemon=True).start()
+        try:
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix="medical-kb-writer") as writer:
+                pending_write = None
+                while True:
+                    batch = batches.get()
+                    if batch is None:
+                        break
+                    rows, consumed, malformed = batch
+                    embeddings = self._encode([row[1] for row in rows], pool) if rows else []
+                    # At most one write in flight, so encoding overlaps the previous upsert
+                    if pending_write is not None:
+                        pending_write.result()
+                    pending_write = writer.submit(write, rows, consumed, malformed, embeddings)
+                    new_chunks += len(rows)
+                    elapsed = time.perf_counter() - start
+                    print_system(
+                        f"{os.path.basename(source_file)}: {progress['records'] + consumed} articles, "
+                        f"{new_chunks / elapsed:.1f} passages/sec"
+                    )
+                if pending_write is not None:
+                    pending_write.result()
+        finally:
+            if pool is not None:
+                self.ingest_embedding_function.model.stop_multi_process_pool(pool)
+        if reader_error:
+            raise reader_error[0]
+
+        self.manifest.record_write(
+            doc_count=self.collection.count(),
+            files=[{"source_file": source_file, "segment_count": progress["chunks"], **fingerprint}]
+        )
+        elapsed = time.perf_counter() - start
+        return {
+            "articles": progress["records"],
+            "chunks": progress["chunks"],
+            "new_chunks": new_chunks,
+            "malformed": progress["malformed"],
+            "seconds": elapsed,
+            "chunks_per_sec": new_chunks / elapsed if elapsed else 0.0,
+        }
+
+    def ingest_paths(self, paths: Iterable[str], batch_size: int = INGEST_BATCH_SIZE, encode_processes: int = ENCODE_PROCESSES) -> Dict[str, Dict]:
+        """Ingest dump files and directories of them, skipping files already fully ingested."""
+        files = []
+        for path in map(os.path.abspath, paths):
+            if os.path.isdir(path):
+                files.extend(sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith(ARTICLE_SUFFIXES)))
+            else:
+                files.append(path)
+
+        known = self.manifest.files()
+        results = {}
+        for source_file in files:
+            status = self.manifest.file_status(source_file, known)
+            if status == "unchanged":
+                print_system(f"Skipping already ingested {os.path.basename(source_file)}")
+                continue
+            if status == "modified":
+                self.collection.delete(where={"source_file": source_file})
+                self.manifest.record_write(doc_count=self.collection.count(), removed_files=[source_file])
+            try:
+                results[source_file] = self.ingest_file(source_file, batch_size, encode_processes)
+            except Exception as e:
+                print_error(f"Error ingesting {source_file}: {e}")
+        return results
+
+    def query_knowledge_base(self, query: str, n_results: int = 5, where: Optional[Dict] = None) -> List[Dict]:
+        """Query the knowledge base for relevant article passages, serving repeats from the query cache."""
+        try:
+            print_system(f"Querying medical knowledge base with: {query}")
+            return self.query_cache.cached_query(
+                query, n_results, where, lambda: self._search(query, n_results, where)
+            )
+        except Exception as e:
+            print_error(f"Error querying knowledge base: {e}")
+            return []
+
+    async def aquery_knowledge_base(self, query: str, n_results: int = 5, where: Optional[Dict] = None) -> List[Dict]:
+        """Async query_knowledge_base; encoding and search run in the bounded query pool, off the event loop."""
+        return await run_retrieval(self.query_knowledge_base, query, n_results, where)
+
+    def _search(self, query: str, n_results: int, where: Optional[Dict] = None) -> List[Dict]:
+        """Run one vector search and format the results; errors propagate so they aren't cached."""
+        results = self.collection.query(
+            query_embeddings=[self.query_cache.embed(query)],
+            n_results=n_results,
+            where=where
+        )
+        formatted_results = [
+            {"content": doc, "metadata": metadata, "relevance_score": 1 - distance}
+            for doc, metadata, distance in zip(results['documents'][0], results['metadatas'][0], results['distances'][0])
+        ]
+        formatted_results.sort(key=lambda x: x['relevance_score'], reverse=True)
+        print_system(f"Found {len(formatted_results)} relevant passages")
+        return formatted_results
+
+    def format_query_results(self, results: List[Dict]) -> str:
+        """Format query results into a readable string."""
+        if not results:
+            return "No relevant medical literature found."
+
+        formatted_output = []
+        for result in results:
+            metadata = result['metadata']
+            citation = ", ".join(part for part in (metadata.get('journal'), metadata.get('year')) if part)
+            formatted_output.append(
+                f"Title: {metadata.get('title')}\n"
+                f"Source: {citation or os.path.basename(metadata['source_file'])} (ID {metadata.get('article_id')})\n"
+                f"Relevance: {result['relevance_score']:.2f}\n"
+                f"Content: {result['content']}\n"
+            )
+
+        return "\n---\n".join(formatted_output)
+
+    def get_collection_stats(self) -> Dict:
+        """Get statistics about the knowledge base collection."""
+        manifest_stats = self.manifest.stats()
+        print_system(f"Medical knowledge base contains {manifest_stats['count']} passages")
+        return {
+            "count": manifest_stats["count"],
+            "last_update": manifest_stats["latest_timestamp"],
+            "files": len(self.manifest.files()),
+            "query_cache": self.query_cache.stats(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest medical article dumps (JSONL/XML, optionally gzipped).")
+    parser.add_argument("paths", nargs="+", help="Dump files or directories of dumps")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument("--encode-processes", type=int, default=ENCODE_PROCESSES)
+    parser.add_argument("--query", default=None, help="Run a test query after ingesting")
+    args = parser.parse_args()
+
+    kb = MedicalKnowledgeBase()
+    for source_file, stats in kb.ingest_paths(args.paths, args.batch_size, args.encode_processes).items():
+        print_system(
+            f"{source_file}: {stats['articles']} articles, {stats['chunks']} passages "
+            f"({stats['chunks_per_sec']:.1f} passages/sec)"
+        )
+    print_system(str(kb.get_collection_stats()))
+    if args.query:
+        print(kb.format_query_results(kb.query_knowledge_base(args.query)))
+
+
+if __name__ == "__main__":
+    main()
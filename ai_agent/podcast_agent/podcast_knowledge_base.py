@@ -6,13 +6,23 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
-from typing import List, Dict
-import chromadb
+from typing import Any, Iterable, List, Dict, Optional, Tuple
+import hashlib
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pydantic import BaseModel
-from sentence_transformers import SentenceTransformer
 import json
 from utils import print_system, print_error
+from podcast_agent.transcript_chunker import chunk_transcript
+from knowledge_base_core import CollectionManifest, EmbeddingFunction, QueryCache, open_vector_store, run_retrieval, file_fingerprint
+
+# Segments accumulated (across files) before one encode + bulk add
+INGEST_BATCH_SIZE = 1024
+READ_WORKERS = 8
+# Parsed transcripts held ahead of the encoder, per read worker
+READ_AHEAD_PER_WORKER = 2
 
 class PodcastSegment(BaseModel):
     id: str  # We'll generate this
@@ -22,34 +32,48 @@ class PodcastSegment(BaseModel):
     timestamp: str = None  # Optional, if available in future
 
 class PodcastKnowledgeBase:
-    def __init__(self, collection_name: str = "podcast_knowledge"):
-        # Initialize ChromaDB client with persistence
-        self.client = chromadb.PersistentClient(path="./chroma_db")
-        
-        # Use the same advanced embedding model as Twitter KB
-        self.embedding_model = SentenceTransformer('all-mpnet-base-v2')
-        
-        # Create embedding function
-        class EmbeddingFunction:
-            def __init__(self, model):
-                self.model = model
-            
-            def __call__(self, input: List[str]) -> List[List[float]]:
-                embeddings = self.model.encode(input)
-                return embeddings.tolist()
+    def __init__(self, collection_name: str = "podcast_knowledge", chunking: bool = None):
+        # Token-aware chunks instead of one vector per speaker turn
+        self.chunking = chunking if chunking is not None else os.getenv("PODCAST_CHUNKING", "true").lower() == "true"
+        # Share the process-wide embedding model with the Twitter KB; it is
+        # loaded lazily on first encode
+        embedding_func = EmbeddingFunction()
+        self.embedding_function = embedding_func
         
-        embedding_func = EmbeddingFunction(self.embedding_model)
-        
-        # Create or get collection
+        # Create or get collection in the configured vector store (VECTOR_STORE_BACKEND)
         try:
-            self.collection = self.client.get_or_create_collection(
-                name=collection_name,
-                embedding_function=embedding_func
-            )
+            self.collection = open_vector_store(collection_name, embedding_func)
         except Exception as e:
             print_error(f"Error initializing collection: {e}")
             raise
 
+        self.manifest = CollectionManifest(collection_name)
+        self.query_cache = QueryCache(self.manifest, lambda texts: self.embedding_function.encode(texts).tolist())
+        if not self.manifest.exists() and self.collection.count():
+            self._backfill_manifest()
+
+    def _backfill_manifest(self):
+        """One-off scan to build the manifest for a collection created before it existed."""
+        print_system("Building ingestion manifest for existing podcast collection...")
+        metadatas = self.collection.get(include=["metadatas"])["metadatas"] or []
+        segment_counts: Dict[str, int] = {}
+        for m in metadatas:
+            segment_counts[m["source_file"]] = segment_counts.get(m["source_file"], 0) + 1
+        files = [
+            {"source_file": path, "segment_count": n, **file_fingerprint(path)}
+            for path, n in segment_counts.items() if os.path.exists(path)
+        ]
+        self.manifest.record_write(
+            doc_count=len(metadatas),
+            latest_timestamp=max((m["timestamp"] for m in metadatas), default=None),
+            files=files
+        )
+
+    @property
+    def embedding_model(self):
+        """The shared SentenceTransformer (PyTorch or quantized ONNX) used by this knowledge base."""
+        return self.embedding_function.model
+
     def add_segments(self, segments: List[PodcastSegment]):
         """Add podcast segments to the knowledge base."""
         documents = [segment.content for segment in segments]
@@ -69,70 +93,231 @@ class PodcastKnowledgeBase:
                 ids=ids,
                 metadatas=metadata
             )
+            self.manifest.record_write(
+                doc_count=self.collection.count(),
+                latest_timestamp=max((m["timestamp"] for m in metadata), default=None)
+            )
             print_system(f"Added {len(segments)} segments to knowledge base")
         except Exception as e:
             print_error(f"Error adding segments: {e}")
 
     def process_json_file(self, file_path: str):
         """Process a podcast transcript JSON file and add it to the knowledge base."""
+        stats = self.ingest_files([file_path])
+        if stats["failed_files"]:
+            return False
+        print_system(f"Successfully processed {file_path}")
+        return True
+
+    def _read_transcript(self, file_path: str) -> Tuple[str, Any]:
+        """Load one transcript into (ids, documents, metadatas) rows plus its fingerprint, or the error."""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                transcript_data = json.load(f)
-            
-            segments = []
-            for idx, entry in enumerate(transcript_data):
-                segment = PodcastSegment(
-                    id=f"{os.path.basename(file_path)}_{idx}",
-                    speaker=entry['speaker'],
-                    content=entry['content'],
-                    source_file=file_path
-                )
-                segments.append(segment)
-            
-            self.add_segments(segments)
-            print_system(f"Successfully processed {file_path}")
-            return True
-            
+            st = os.stat(file_path)
+            with open(file_path, 'rb') as f:
+                raw = f.read()
+            transcript_data = json.loads(raw.decode('utf-8'))
+            basename = os.path.basename(file_path)
+            timestamp = datetime.now().isoformat()
+            if self.chunking:
+                rows = [
+                    (
+                        f"{basename}_{chunk.turn_start}_{chunk.part}",
+                        chunk.content,
+                        {**chunk.metadata(), "source_file": file_path, "timestamp": timestamp},
+                    )
+                    for chunk in chunk_transcript(transcript_data)
+                ]
+            else:
+                rows = [
+                    (
+                        f"{basename}_{idx}",
+                        entry['content'],
+                        {"speaker": entry['speaker'], "source_file": file_path, "timestamp": timestamp},
+                    )
+                    for idx, entry in enumerate(transcript_data)
+                ]
+            fingerprint = {
+                "source_file": file_path,
+                "content_hash": hashlib.sha256(raw).hexdigest(),
+                "mtime_ns": st.st_mtime_ns,
+                "size": st.st_size,
+                "segment_count": len(rows),
+            }
+            return file_path, (rows, fingerprint)
         except Exception as e:
-            print_error(f"Error processing {file_path}: {e}")
-            return False
+            return file_path, e
 
-    def query_knowledge_base(self, query: str, n_results: int = 5) -> List[Dict]:
-        """Query the knowledge base for relevant podcast segments."""
+    def _bulk_add(self, rows: List[Tuple[str, str, Dict]], encode_batch_size: int = None):
+        """Encode a batch of rows in one call and write them with as few upserts as the store allows.
+
+        Upserts make re-running an ingest that failed part way safe: rows
+        already written are replaced instead of raising on duplicate ids.
+        """
+        ids, documents, metadatas = (list(column) for column in zip(*rows))
+        embeddings = self.embedding_function.encode(documents, batch_size=encode_batch_size).tolist()
+        max_batch = self.collection.max_batch_size
+        for start in range(0, len(ids), max_batch):
+            end = start + max_batch
+            self.collection.upsert(
+                ids=ids[start:end],
+                embeddings=embeddings[start:end],
+                documents=documents[start:end],
+                metadatas=metadatas[start:end]
+            )
+
+    def ingest_files(
+        self,
+        file_paths: Iterable[str],
+        batch_size: int = INGEST_BATCH_SIZE,
+        encode_batch_size: int = None,
+        max_workers: int = READ_WORKERS,
+    ) -> Dict:
+        """Stream transcripts into the collection in large cross-file batches.
+
+        Files are read and parsed in a thread pool while the main thread
+        encodes, with at most ``READ_AHEAD_PER_WORKER`` parsed files per
+        worker waiting, so memory doesn't grow with the number of files.
+        Segments from several files are grouped until ``batch_size`` is
+        reached, encoded in one call and written with bulk upserts. Progress
+        and throughput are reported after every batch.
+        """
+        file_paths = list(file_paths)
+        stats = {"files": 0, "failed_files": [], "segments": 0, "seconds": 0.0, "segments_per_sec": 0.0}
+        start = time.perf_counter()
+        pending: List[Tuple[str, str, Dict]] = []
+        pending_files: List[Dict] = []
+
+        def flush():
+            if not pending:
+                return
+            try:
+                self._bulk_add(pending, encode_batch_size)
+                # A file's rows are always queued together, so every pending file is now complete
+                self.manifest.record_write(
+                    doc_count=self.collection.count(),
+                    latest_timestamp=max(row[2]["timestamp"] for row in pending),
+                    files=pending_files
+                )
+                stats["segments"] += len(pending)
+            except Exception as e:
+                print_error(f"Error adding {len(pending)} segments: {e}")
+                stats["failed_files"].extend(f["source_file"] for f in pending_files)
+            pending.clear()
+            pending_files.clear()
+            elapsed = time.perf_counter() - start
+            print_system(
+                f"Ingested {stats['segments']} segments from {stats['files']}/{len(file_paths)} files "
+                f"({stats['segments'] / elapsed:.1f} segments/sec)"
+            )
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # executor.map would submit every file up front; keep a bounded window instead
+            to_read = iter(file_paths)
+            reads = deque()
+            for file_path in to_read:
+                reads.append(executor.submit(self._read_transcript, file_path))
+                if len(reads) >= max_workers * READ_AHEAD_PER_WORKER:
+                    break
+            while reads:
+                file_path, result = reads.popleft().result()
+                next_path = next(to_read, None)
+                if next_path is not None:
+                    reads.append(executor.submit(self._read_transcript, next_path))
+                if isinstance(result, Exception):
+                    print_error(f"Error processing {file_path}: {result}")
+                    stats["failed_files"].append(file_path)
+                    continue
+                rows, fingerprint = result
+                pending.extend(rows)
+                pending_files.append(fingerprint)
+                stats["files"] += 1
+                if len(pending) >= batch_size:
+                    flush()
+            flush()
+
+        stats["seconds"] = time.perf_counter() - start
+        stats["segments_per_sec"] = stats["segments"] / stats["seconds"] if stats["seconds"] else 0.0
+        return stats
+
+    def query_knowledge_base(self, query: str, n_results: int = 5, where: Optional[Dict] = None) -> List[Dict]:
+        """Query the knowledge base for relevant podcast segments, serving repeats from the query cache."""
         try:
             print_system(f"Querying knowledge base with: {query}")
-            
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=n_results
+            return self.query_cache.cached_query(
+                query, n_results, where, lambda: self._search(query, n_results, where)
             )
-            
-            if not results['documents'][0]:
-                print_system("No results found in knowledge base")
-                return []
-                
-            formatted_results = []
-            for doc, metadata, distance in zip(
-                results['documents'][0], 
-                results['metadatas'][0],
-                results['distances'][0]
-            ):
-                formatted_results.append({
-                    "content": doc,
-                    "metadata": metadata,
-                    "relevance_score": 1 - distance
-                })
-            
-            # Sort by relevance score
-            formatted_results.sort(key=lambda x: x['relevance_score'], reverse=True)
-            
-            print_system(f"Found {len(formatted_results)} relevant segments")
-            return formatted_results
-            
         except Exception as e:
             print_error(f"Error querying knowledge base: {e}")
             return []
 
+    async def aquery_knowledge_base(self, query: str, n_results: int = 5, where: Optional[Dict] = None) -> List[Dict]:
+        """Async query_knowledge_base; encoding and search run in the bounded query pool, off the event loop."""
+        return await run_retrieval(self.query_knowledge_base, query, n_results, where)
+
+    async def aquery_many(self, queries: List[str], n_results: int = 5, where: Optional[Dict] = None) -> List[List[Dict]]:
+        """Async query_many, run in the bounded query pool."""
+        return await run_retrieval(self.query_many, queries, n_results, where)
+
+    def _search(self, query: str, n_results: int, where: Optional[Dict] = None) -> List[Dict]:
+        """Run one vector search and format the results; errors propagate so they aren't cached."""
+        results = self.collection.query(
+            query_embeddings=[self.query_cache.embed(query)],
+            n_results=n_results,
+            where=where
+        )
+        return self._format_results(results['documents'][0], results['metadatas'][0], results['distances'][0])
+
+    def query_many(self, queries: List[str], n_results: int = 5, where: Optional[Dict] = None) -> List[List[Dict]]:
+        """Run several lookups with one batch encode and one multi-query search.
+
+        Returns one result list per query, in order. Queries already in the
+        result cache are answered from it and left out of the search.
+        """
+        try:
+            print_system(f"Querying knowledge base with {len(queries)} queries")
+            results: List[Optional[List[Dict]]] = [self.query_cache.get_results(q, n_results, where) for q in queries]
+            missing = [i for i, r in enumerate(results) if r is None]
+            if missing:
+                version = self.manifest.version()
+                start = time.perf_counter()
+                raw = self.collection.query(
+                    query_embeddings=self.query_cache.embed_many([queries[i] for i in missing]),
+                    n_results=n_results,
+                    where=where
+                )
+                per_query_seconds = (time.perf_counter() - start) / len(missing)
+                for row, i in enumerate(missing):
+                    results[i] = self._format_results(raw['documents'][row], raw['metadatas'][row], raw['distances'][row])
+                    self.query_cache.put_results(queries[i], n_results, where, results[i], per_query_seconds, version)
+            return results
+        except Exception as e:
+            print_error(f"Error querying knowledge base: {e}")
+            return [[] for _ in queries]
+
+    def _format_results(self, documents: List[str], metadatas: List[Dict], distances: List[float]) -> List[Dict]:
+        """Turn one query's raw Chroma results into scored segments, best first."""
+        if not documents:
+            print_system("No results found in knowledge base")
+            return []
+            
+        formatted_results = []
+        for doc, metadata, distance in zip(
+            documents,
+            metadatas,
+            distances
+        ):
+            formatted_results.append({
+                "content": doc,
+                "metadata": metadata,
+                "relevance_score": 1 - distance
+            })
+        
+        # Sort by relevance score
+        formatted_results.sort(key=lambda x: x['relevance_score'], reverse=True)
+        
+        print_system(f"Found {len(formatted_results)} relevant segments")
+        return formatted_results
+
     def format_query_results(self, results: List[Dict]) -> str:
         """Format query results into a readable string."""
         if not results:
@@ -141,7 +326,7 @@ class PodcastKnowledgeBase:
         formatted_output = []
         for result in results:
             formatted_output.append(
-                f"Speaker: {result['metadata']['speaker']}\n"
+                f"Speaker: {result['metadata'].get('speakers') or result['metadata']['speaker']}\n"
                 f"Source: {os.path.basename(result['metadata']['source_file'])}\n"
                 f"Relevance: {result['relevance_score']:.2f}\n"
                 f"Content: {result['content']}\n"
@@ -159,18 +344,16 @@ class PodcastKnowledgeBase:
                 print_system("Knowledge base cleared successfully")
             else:
                 print_system("Knowledge base is already empty")
+            self.manifest.reset()
             return True
         except Exception as e:
             print_error(f"Error clearing knowledge base: {str(e)}")
             return False
 
     def get_processed_files(self) -> set:
-        """Get a set of already processed file names from the metadata."""
+        """Get a set of already processed file names from the ingestion manifest."""
         try:
-            metadata = self.collection.get()
-            if not metadata.get("metadatas"):
-                return set()
-            return {os.path.basename(m["source_file"]) for m in metadata["metadatas"]}
+            return {os.path.basename(path) for path in self.manifest.files()}
         except Exception as e:
             print_error(f"Error getting processed files: {e}")
             return set()
@@ -185,24 +368,33 @@ class PodcastKnowledgeBase:
                 print_error(f"Directory not found: {abs_directory}")
                 return
             
-            # Get list of all JSON files and already processed files
-            json_files = [f for f in os.listdir(abs_directory) if f.endswith('.json')]
-            processed_files = self.get_processed_files()
+            # Classify every JSON file against the manifest
+            json_files = [os.path.join(abs_directory, f) for f in os.listdir(abs_directory) if f.endswith('.json')]
+            known = self.manifest.files()
+            status = {path: self.manifest.file_status(path, known) for path in json_files}
+            new_files = [path for path in json_files if status[path] == "new"]
+            modified_files = [path for path in json_files if status[path] == "modified"]
             
-            # Filter out already processed files
-            new_files = [f for f in json_files if f not in processed_files]
-            
-            if not new_files:
-                print_system("No new JSON files to process")
+            if not new_files and not modified_files:
+                print_system("No new or modified JSON files to process")
                 return
             
-            print_system(f"Found {len(new_files)} new JSON files to process")
+            print_system(f"Found {len(new_files)} new and {len(modified_files)} modified JSON files to process")
+            
+            # Drop the stale segments of modified files before re-ingesting them
+            for path in modified_files:
+                self.collection.delete(where={"source_file": path})
+            if modified_files:
+                self.manifest.record_write(doc_count=self.collection.count(), removed_files=modified_files)
             
-            for json_file in new_files:
-                file_path = os.path.join(abs_directory, json_file)
-                self.process_json_file(file_path)
+            stats = self.ingest_files(new_files + modified_files)
                 
-            print_system("Finished processing all new JSON files")
+            print_system(
+                f"Finished processing all new JSON files: {stats['segments']} segments in "
+                f"{stats['seconds']:.1f}s ({stats['segments_per_sec']:.1f} segments/sec)"
+            )
+            if stats["failed_files"]:
+                print_error(f"{len(stats['failed_files'])} files failed to process")
             
         except Exception as e:
             print_error(f"Error processing JSON files: {e}")
@@ -210,18 +402,17 @@ class PodcastKnowledgeBase:
     def get_collection_stats(self) -> Dict:
         """Get statistics about the knowledge base collection."""
         try:
-            count = self.collection.count()
-            metadata = self.collection.get()
-            last_update = None
-            if metadata.get("metadatas"):
-                # Get most recent timestamp
-                last_update = max(m["timestamp"] for m in metadata["metadatas"])
+            manifest_stats = self.manifest.stats()
+            count = manifest_stats["count"]
+            last_update = manifest_stats["latest_timestamp"]
+            if last_update:
                 last_update = datetime.fromisoformat(last_update.replace('Z', '+00:00'))
             
             print_system(f"Podcast knowledge base contains {count} segments")
             return {
                 "count": count,
-                "last_update": last_update or datetime.now()
+                "last_update": last_update or datetime.now(),
+                "query_cache": self.query_cache.stats()
             }
         except Exception as e:
             print_error(f"Error getting collection stats: {str(e)}")
@@ -0,0 +1,187 @@
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+# all-mpnet-base-v2 truncates at 384 word pieces; leave headroom for special tokens
+MAX_CHUNK_TOKENS = 256
+MIN_CHUNK_TOKENS = 32
+OVERLAP_TOKENS = 32
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def approximate_token_count(text: str) -> int:
+    """Word/punctuation piece count, a close lower bound on WordPiece tokens."""
+    return len(_TOKEN.findall(text))
+
+
+@dataclass
+class TranscriptChunk:
+    content: str
+    speaker: str
+    speakers: List[str]
+    turn_start: int
+    turn_end: int
+    part: int = 0
+    token_count: int = 0
+    timestamps: Dict[str, str] = field(default_factory=dict)
+
+    def metadata(self) -> Dict:
+        """Chroma-safe metadata (scalar values only, no None)."""
+        metadata = {
+            "speaker": self.speaker,
+            "speakers": ", ".join(self.speakers),
+            "turn_start": self.turn_start,
+            "turn_end": self.turn_end,
+            "part": self.part,
+            "token_count": self.token_count,
+        }
+        metadata.update(self.timestamps)
+        return metadata
+
+
+def _turn_timestamps(turns: List[Dict]) -> Dict[str, str]:
+    """Start/end times spanned by turns, from whichever timing fields the transcript has."""
+    starts = [str(t.get("start") or t.get("timestamp")) for t in turns if t.get("start") or t.get("timestamp")]
+    ends = [str(t.get("end") or t.get("start") or t.get("timestamp")) for t in turns if t.get("end") or t.get("start") or t.get("timestamp")]
+    timestamps = {}
+    if starts:
+        timestamps["start_time"] = starts[0]
+    if ends:
+        timestamps["end_time"] = ends[-1]
+    return timestamps
+
+
+def split_text(
+    text: str,
+    count_tokens: Optional[Callable[[str], int]] = None,
+    max_tokens: int = MAX_CHUNK_TOKENS,
+    overlap_tokens: int = OVERLAP_TOKENS,
+) -> List[str]:
+    """Split text into windows of at most max_tokens on sentence boundaries, overlapping by whole sentences."""
+    count_tokens = count_tokens or approximate_token_count
+    sentences = []
+    for sentence in _SENTENCE_END.split(text.strip()):
+        if count_tokens(sentence) <= max_tokens:
+            sentences.append(sentence)
+            continue
+        # A single run-on sentence: fall back to word windows
+        words = sentence.split()
+        step = max(1, len(words) * max_tokens // max(count_tokens(sentence), 1))
+        sentences.extend(" ".join(words[i:i + step]) for i in range(0, len(words), step))
+
+    windows, current, current_tokens = [], [], 0
+    for sentence in sentences:
+        tokens = count_tokens(sentence)
+        if current and current_tokens + tokens > max_tokens:
+            windows.append(" ".join(current))
+            # Carry trailing sentences into the next window as overlap
+            carried, carried_tokens = [], 0
+            for previous in reversed(current):
+                previous_tokens = count_tokens(previous)
+                if carried_tokens + previous_tokens > overlap_tokens or carried_tokens + previous_tokens + tokens > max_tokens:
+                    break
+                carried.insert(0, previous)
+                carried_tokens += previous_tokens
+            current, current_tokens = carried, carried_tokens
+        current.append(sentence)
+        current_tokens += tokens
+    if current:
+        windows.append(" ".join(current))
+    return windows
+
+
+def _build_chunk(
+    pieces: List[tuple],
+    count_tokens: Callable[[str], int],
+    part: int = 0,
+) -> TranscriptChunk:
+    """Assemble (turn index, turn, text, tokens) pieces into one chunk, prefixing speakers when there are several."""
+    speakers = list(dict.fromkeys(turn["speaker"] for _, turn, _, _ in pieces))
+    if len(speakers) == 1:
+        content = " ".join(text for _, _, text, _ in pieces)
+    else:
+        content = "\n".join(f"{turn['speaker']}: {text}" for _, turn, text, _ in pieces)
+    # The chunk is attributed to whoever said the most in it
+    spoken: Dict[str, int] = {}
+    for _, turn, _, tokens in pieces:
+        spoken[turn["speaker"]] = spoken.get(turn["speaker"], 0) + tokens
+    turns_in_chunk = list({id(turn): turn for _, turn, _, _ in pieces}.values())
+    return TranscriptChunk(
+        content=content,
+        speaker=max(spoken, key=spoken.get),
+        speakers=speakers,
+        turn_start=pieces[0][0],
+        turn_end=pieces[-1][0],
+        part=part,
+        token_count=count_tokens(content),
+        timestamps=_turn_timestamps(turns_in_chunk),
+    )
+
+
+def chunk_transcript(
+    turns: List[Dict],
+    count_tokens: Optional[Callable[[str], int]] = None,
+    max_tokens: int = MAX_CHUNK_TOKENS,
+    min_tokens: int = MIN_CHUNK_TOKENS,
+    overlap_tokens: int = OVERLAP_TOKENS,
+) -> List[TranscriptChunk]:
+    """Turn a list of {"speaker", "content", ...} turns into embedding-sized chunks.
+
+    Consecutive turns shorter than ``min_tokens`` are merged with their
+    neighbours (prefixed by speaker) up to ``max_tokens``; turns longer than
+    ``max_tokens`` are split on sentence boundaries into overlapping
+    windows, and short turns right after a split join its last window.
+    Each chunk records the turns it came from and any timing fields
+    ("start"/"end"/"timestamp") the transcript carries. ``token_count`` is
+    measured on the chunk content, speaker prefixes included.
+    """
+    count_tokens = count_tokens or approximate_token_count
+    chunks: List[TranscriptChunk] = []
+    buffer: List[tuple] = []  # (turn index, turn, text, tokens)
+    # Pieces of the last window of a split turn, while short turns may still join it
+    open_window: Optional[List[tuple]] = None
+
+    def flush():
+        if buffer:
+            chunks.append(_build_chunk(buffer, count_tokens))
+            buffer.clear()
+
+    # Budgeted per buffered turn so a multi-speaker chunk stays within max_tokens
+    buffer_tokens = 0
+    for idx, turn in enumerate(turns):
+        content = (turn.get("content") or "").strip()
+        if not content:
+            continue
+        tokens = count_tokens(content)
+        piece = (idx, turn, content, tokens)
+
+        if tokens > max_tokens:
+            flush()
+            buffer_tokens = 0
+            windows = split_text(content, count_tokens, max_tokens, overlap_tokens)
+            for part, window in enumerate(windows):
+                chunks.append(_build_chunk([(idx, turn, window, count_tokens(window))], count_tokens, part))
+            open_window = [(idx, turn, windows[-1], count_tokens(windows[-1]))]
+            continue
+
+        if open_window is not None and tokens < min_tokens:
+            merged = _build_chunk(open_window + [piece], count_tokens, chunks[-1].part)
+            if merged.token_count <= max_tokens:
+                chunks[-1] = merged
+                open_window.append(piece)
+                continue
+        open_window = None
+
+        budget = tokens + count_tokens(f"{turn['speaker']}:")
+        fits = buffer_tokens + budget <= max_tokens
+        if buffer and fits and (buffer_tokens < min_tokens or tokens < min_tokens):
+            buffer.append(piece)
+            buffer_tokens += budget
+        else:
+            flush()
+            buffer.append(piece)
+            buffer_tokens = budget
+    flush()
+    return chunks
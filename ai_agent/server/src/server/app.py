@@ -1,6 +1,6 @@
 import uvicorn
 from starlette.applications import Starlette
-from starlette.responses import HTMLResponse
+from starlette.responses import HTMLResponse, JSONResponse
 from starlette.routing import Route, WebSocketRoute
 from starlette.staticfiles import StaticFiles
 from starlette.websockets import WebSocket
@@ -15,6 +15,7 @@ from langchain_openai_voice import OpenAIVoiceReactAgent
 from server.utils import websocket_stream
 # from server.prompt import INSTRUCTIONS
 from server.tools import TOOLS
+from knowledge_base_core import retrieval_stall_monitor
 
 from chatbot import loadCharacters, process_character_config
 import os
@@ -58,7 +59,11 @@ async def homepage(request):
         html = f.read()
         return HTMLResponse(html)
 
-routes = [Route("/", homepage), WebSocketRoute("/ws", websocket_endpoint)]
+async def retrieval_stats(request):
+    """Event-loop stall observed while knowledge base tools were running."""
+    return JSONResponse(retrieval_stall_monitor.stats())
+
+routes = [Route("/", homepage), Route("/stats/retrieval", retrieval_stats), WebSocketRoute("/ws", websocket_endpoint)]
 
 app = Starlette(debug=True, routes=routes)
 
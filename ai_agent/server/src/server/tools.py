@@ -35,6 +35,7 @@ from coinbase_agentkit_langchain import get_langchain_tools
 from hyperbolic_langchain.agent_toolkits import HyperbolicToolkit
 from hyperbolic_langchain.utils import HyperbolicAgentkitWrapper
 from podcast_agent.podcast_knowledge_base import PodcastKnowledgeBase
+from knowledge_base_core import arun_query, arun_query_many, run_query_many
 from twitter_agent.twitter_state import TwitterState
 from twitter_agent.custom_twitter_actions import (
     create_delete_tweet_tool,
@@ -187,10 +188,19 @@ def create_tools(knowledge_base=None, podcast_knowledge_base=None, agentkit=agen
             func=lambda query: knowledge_base.format_query_results(
                 knowledge_base.query_knowledge_base(query)
             ),
+            coroutine=lambda query: arun_query(knowledge_base, query),
             description="""Query the Twitter knowledge base for relevant tweets about crypto/AI/tech trends.
             Input should be a search query string.
             Example: query_twitter_knowledge_base("latest developments in AI")"""
         ))
+        tools.append(Tool(
+            name="query_twitter_knowledge_base_many",
+            func=lambda queries: run_query_many(knowledge_base, queries),
+            coroutine=lambda queries: arun_query_many(knowledge_base, queries),
+            description="""Run several Twitter knowledge base lookups at once with a single search.
+            Input should be a JSON list of query strings, or one query per line.
+            Example: query_twitter_knowledge_base_many(["AI agents onchain", "Ronin user growth"])"""
+        ))
 
     # Add Podcast Knowledge Base Tools if enabled
     if os.getenv("USE_PODCAST_KNOWLEDGE_BASE", "true").lower() == "true" and podcast_knowledge_base:
@@ -199,8 +209,15 @@ def create_tools(knowledge_base=None, podcast_knowledge_base=None, agentkit=agen
             func=lambda query: podcast_knowledge_base.format_query_results(
                 podcast_knowledge_base.query_knowledge_base(query)
             ),
+            coroutine=lambda query: arun_query(podcast_knowledge_base, query),
             description="Query the podcast knowledge base for relevant podcast segments about crypto/Web3/gaming. Input should be a search query string."
         ))
+        tools.append(Tool(
+            name="query_podcast_knowledge_base_many",
+            func=lambda queries: run_query_many(podcast_knowledge_base, queries),
+            coroutine=lambda queries: arun_query_many(podcast_knowledge_base, queries),
+            description="Run several podcast knowledge base lookups at once with a single search. Input should be a JSON list of query strings, or one query per line."
+        ))
 
     # Add Coinbase AgentKit tools if enabled
     if os.getenv("USE_COINBASE_TOOLS", "true").lower() == "true":
@@ -229,7 +246,8 @@ def create_tools(knowledge_base=None, podcast_knowledge_base=None, agentkit=agen
         podcast_query_tool = Tool(
             name="query_podcast_knowledge",
             description="Query the podcast knowledge base for relevant information about crypto, gaming, and Web3 topics",
-            func=lambda query: podcast_kb.format_query_results(podcast_kb.query_knowledge_base(query))
+            func=lambda query: podcast_kb.format_query_results(podcast_kb.query_knowledge_base(query)),
+            coroutine=lambda query: arun_query(podcast_kb, query)
         )
         tools.append(podcast_query_tool)
 
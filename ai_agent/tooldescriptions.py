@@ -29,6 +29,12 @@ Example: query_twitter_knowledge_base("latest developments in AI")"""
 
 PODCAST_KNOWLEDGE_BASE_DESCRIPTION = "Query the podcast knowledge base for relevant podcast segments about crypto/Web3/gaming. Input should be a search query string."
 
+TWITTER_KNOWLEDGE_BASE_MANY_DESCRIPTION = """Run several Twitter knowledge base lookups at once (e.g. a topic plus per-KOL queries).
+Input should be a JSON list of query strings, or one query per line. Cheaper than calling query_twitter_knowledge_base repeatedly.
+Example: query_twitter_knowledge_base_many(["AI agents onchain", "Ronin user growth"])"""
+
+PODCAST_KNOWLEDGE_BASE_MANY_DESCRIPTION = "Run several podcast knowledge base lookups at once. Input should be a JSON list of query strings, or one query per line. Cheaper than calling query_podcast_knowledge_base repeatedly."
+
 # Query enhancement tool description
 ENHANCE_QUERY_DESCRIPTION = "Analyze the initial query and its results to generate an enhanced follow-up query. Takes two parameters: initial_query (the original query string) and query_result (the results obtained from that query)."
 
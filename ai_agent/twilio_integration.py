@@ -3,12 +3,20 @@ from flask import Flask, request, Response, jsonify
 from flask_cors import CORS  # Add this import
 from twilio.twiml.voice_response import VoiceResponse, Gather
 from interview_agent import DoctorPatientAgent
+from consultation_store import recover_orphaned_journals
+from consultation_store.search import ConsultationSearchIndex
+from consultation_store.analytics import ConsultationAnalytics
+from consultation_store.index import is_consultation_file
+from forms import FORM_GENERATORS, FormRenderCache
 import os
 import json
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 agent = DoctorPatientAgent(json.load(open('characters/interviewer.json')))
+search_index = ConsultationSearchIndex()
+analytics = ConsultationAnalytics()
+form_cache = FormRenderCache()
 
 @app.route("/answer", methods=['GET', 'POST'])
 def answer_call():
@@ -43,6 +51,11 @@ def handle_response():
     """Process user responses from phone call."""
     response = VoiceResponse()
     speech_result = request.form.get('SpeechResult', '')
+    # The agent is shared by every caller; a new CallSid means a new consultation
+    call_sid = request.form.get('CallSid')
+    if call_sid and call_sid != agent.session_id:
+        # Twilio's caller lookup is the routing fallback if the patient gives no location
+        agent.start_session(call_sid, {"city": request.form.get('FromCity'), "postcode": request.form.get('FromZip')})
 
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
@@ -143,5 +156,88 @@ def get_latest_consultation():
         print(f"Error loading consultation: {e}")
         return {"error": f"Failed to load consultation: {str(e)}"}, 500
 
+@app.route("/consultations/search", methods=['GET'])
+def search_consultations():
+    """
+    Full-text search over saved consultations.
+    Query parameters: q (required), limit (default 20), offset (default 0).
+    Returns ranked matches with highlighted snippets.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return {"error": "Missing query parameter 'q'"}, 400
+
+    try:
+        limit = min(int(request.args.get('limit', 20)), 100)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return {"error": "limit and offset must be integers"}, 400
+
+    try:
+        results = search_index.search(query, limit=limit, offset=offset)
+    except Exception as e:
+        print(f"Error searching consultations: {e}")
+        return {"error": f"Search failed: {str(e)}"}, 500
+
+    return jsonify({"query": query, "results": results})
+
+@app.route("/analytics/summary", methods=['GET'])
+def analytics_summary():
+    """
+    Pre-aggregated symptom, severity, diagnosis and call duration stats.
+    Query parameters: since, until (ISO dates, inclusive), top (default 10).
+    Optional symptom parameter adds a per-day series for that symptom.
+    """
+    since = request.args.get('since')
+    until = request.args.get('until')
+    try:
+        top = int(request.args.get('top', 10))
+    except ValueError:
+        return {"error": "top must be an integer"}, 400
+
+    try:
+        summary = analytics.summary(since=since, until=until, top=top)
+        symptom = request.args.get('symptom')
+        if symptom:
+            summary["series"] = analytics.daily_series(symptom, since=since, until=until)
+    except Exception as e:
+        print(f"Error reading analytics: {e}")
+        return {"error": f"Analytics query failed: {str(e)}"}, 500
+
+    return jsonify(summary)
+
+@app.route("/consultations/<consultation_id>/forms/<form_type>", methods=['GET'])
+def render_consultation_form(consultation_id, form_type):
+    """
+    Render a single form for a saved consultation on demand.
+    form_type is one of: registration, medical_history, consent, hipaa, insurance.
+    Rendered forms are cached until the consultation file changes.
+    """
+    filename = f"{consultation_id}.json"
+    if os.path.basename(filename) != filename or not is_consultation_file(filename):
+        return {"error": f"Invalid consultation id: {consultation_id}"}, 400
+    if form_type not in FORM_GENERATORS:
+        return {"error": f"Unknown form type: {form_type}", "available": list(FORM_GENERATORS)}, 404
+
+    file_path = os.path.join("consultations", filename)
+    if not os.path.exists(file_path):
+        return {"error": f"Consultation not found: {consultation_id}"}, 404
+
+    try:
+        form = form_cache.render(file_path, form_type)
+    except ValueError as e:
+        # Unparseable JSON or a record without the fields every form needs
+        return {"error": f"Unsupported consultation record: {str(e)}"}, 422
+    except Exception as e:
+        print(f"Error rendering {form_type} form for {consultation_id}: {e}")
+        return {"error": f"Failed to render form: {str(e)}"}, 500
+
+    return jsonify(form)
+
 if __name__ == "__main__":
+    # Salvage transcripts from calls that were cut off by a crash
+    for path in recover_orphaned_journals():
+        print(f"Recovered interrupted consultation: {path}")
+    # Index recovered records and anything saved while indexing was failing
+    print(f"Search index sync: {search_index.sync()}")
     app.run(host='0.0.0.0', port=5001)
\ No newline at end of file
@@ -2,7 +2,7 @@ from collections.abc import Callable
 from json import dumps
 from pydantic import BaseModel, Field
 from langchain.tools import Tool
-from typing import Optional, List, Dict, Union
+from typing import Optional, List, Dict, Tuple, Union
 import tweepy
 import os
 from dotenv import load_dotenv
@@ -41,12 +41,13 @@ class TwitterClient:
             print(f"Error getting user ID for {username}: {str(e)}")
             return None
 
-    async def get_user_tweets(self, user_id: str, max_results: int = 10) -> List[Tweet]:
-        """Get recent tweets from a user."""
+    async def get_user_tweets(self, user_id: str, max_results: int = 10, since_id: Optional[str] = None) -> List[Tweet]:
+        """Get recent tweets from a user, optionally only those newer than since_id."""
         try:
             tweets = self.client.get_users_tweets(
                 id=user_id,
                 max_results=max_results,
+                since_id=since_id,
                 tweet_fields=['created_at', 'author_id']
             )
             
@@ -66,6 +67,36 @@ class TwitterClient:
             print(f"Error getting tweets for user {user_id}: {str(e)}")
             return []
 
+    async def get_user_tweets_page(
+        self,
+        user_id: str,
+        max_results: int = 100,
+        since_id: Optional[str] = None,
+        pagination_token: Optional[str] = None,
+    ) -> Tuple[List[Tweet], Optional[str]]:
+        """Get one page of a user's tweets and the token for the next (older) page.
+
+        Errors are raised rather than swallowed, so a caller paging towards
+        since_id can tell a failed page from the end of the timeline.
+        """
+        response = self.client.get_users_tweets(
+            id=user_id,
+            max_results=max_results,
+            since_id=since_id,
+            pagination_token=pagination_token,
+            tweet_fields=['created_at', 'author_id']
+        )
+        tweets = [
+            Tweet(
+                id=str(tweet.id),
+                text=tweet.text,
+                author_id=str(tweet.author_id),
+                created_at=tweet.created_at.isoformat()
+            )
+            for tweet in response.data or []
+        ]
+        return tweets, (response.meta or {}).get("next_token")
+
     async def delete_tweet(self, tweet_id: str) -> bool:
         """Delete a tweet."""
         try:
@@ -1,14 +1,12 @@
-from typing import List, Dict
-import chromadb
-from chromadb.utils import embedding_functions
-from datetime import datetime
+from typing import List, Dict, Optional
+from datetime import datetime, timedelta, timezone
 from pydantic import BaseModel
-from sentence_transformers import SentenceTransformer
 import numpy as np
 from utils import print_system, print_error
+from knowledge_base_core import CollectionManifest, EmbeddingFunction, QueryCache, open_vector_store, run_retrieval, connect_state_db
 import asyncio
+import time
 import os
-import random
 import json  # Add json import for pretty printing
 from twitter_agent.custom_twitter_actions import TwitterClient, Tweet
 
@@ -19,6 +17,14 @@ class Tweet(BaseModel):
     created_at: str
     author_id: str
 
+# Tweets older than this are expired from the knowledge base on each sync
+RETENTION_DAYS = int(os.getenv("TWITTER_KB_RETENTION_DAYS", "7"))
+
+
+def _parse_created_at(created_at: str) -> datetime:
+    return datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+
+
 class TweetKnowledgeBase:
     def __init__(self, collection_name: str = "twitter_knowledge"):
         print_system("Initializing TweetKnowledgeBase...")
@@ -26,97 +32,211 @@ class TweetKnowledgeBase:
         data_dir = os.path.join(os.path.dirname(__file__), "..", "data", "chroma_db")
         os.makedirs(data_dir, exist_ok=True)
         
-        # Initialize ChromaDB client with persistence in data directory
-        self.client = chromadb.PersistentClient(path="./chroma_db")
-        
-        # Use a more advanced embedding model
-        self.embedding_model = SentenceTransformer('all-mpnet-base-v2')
+        # Share the process-wide embedding model with the podcast KB; it is
+        # loaded lazily on first encode
+        embedding_func = EmbeddingFunction()
+        self.embedding_function = embedding_func
         
-        # Create embedding function that matches ChromaDB's expected interface
-        class EmbeddingFunction:
-            def __init__(self, model):
-                self.model = model
-            
-            def __call__(self, input: List[str]) -> List[List[float]]:
-                embeddings = self.model.encode(input)
-                return embeddings.tolist()
-        
-        embedding_func = EmbeddingFunction(self.embedding_model)
-        
-        # Create or get collection
+        # Create or get collection in the configured vector store (VECTOR_STORE_BACKEND)
         try:
-            self.collection = self.client.get_or_create_collection(
-                name=collection_name,
-                embedding_function=embedding_func
-            )
+            self.collection = open_vector_store(collection_name, embedding_func)
         except Exception as e:
             print(f"Error initializing collection: {e}")
             raise
 
+        self.collection_name = collection_name
+        self.manifest = CollectionManifest(collection_name)
+        self.query_cache = QueryCache(self.manifest, lambda texts: self.embedding_function.encode(texts).tolist())
+        if not self.manifest.exists() and self.collection.count():
+            # One-off scan for a collection created before the manifest existed
+            metadatas = self.collection.get(include=["metadatas"])["metadatas"] or []
+            self.manifest.record_write(
+                doc_count=len(metadatas),
+                latest_timestamp=max((m["created_at"] for m in metadatas), default=None)
+            )
+        if self.collection.count():
+            self._backfill_created_at_ts()
+        with connect_state_db() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS twitter_sync_state (
+                    collection TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    since_id TEXT NOT NULL,
+                    last_synced TEXT NOT NULL,
+                    PRIMARY KEY (collection, user_id)
+                )
+            ''')
+
+    def _backfill_created_at_ts(self):
+        """Add created_at_ts to tweets stored before it existed, so expiry can see them.
+
+        Their stored embeddings are written back unchanged, so nothing is re-encoded.
+        """
+        existing = self.collection.get(include=["metadatas"])
+        stale = [
+            tweet_id for tweet_id, metadata in zip(existing["ids"], existing["metadatas"] or [])
+            if metadata and "created_at_ts" not in metadata and metadata.get("created_at")
+        ]
+        for start in range(0, len(stale), self.collection.max_batch_size):
+            batch = self.collection.get(
+                ids=stale[start:start + self.collection.max_batch_size],
+                include=["metadatas", "documents", "embeddings"]
+            )
+            metadatas = [
+                {**metadata, "created_at_ts": _parse_created_at(metadata["created_at"]).timestamp()}
+                for metadata in batch["metadatas"]
+            ]
+            self.collection.upsert(
+                ids=batch["ids"],
+                embeddings=batch["embeddings"],
+                documents=batch["documents"],
+                metadatas=metadatas
+            )
+        if stale:
+            print_system(f"Backfilled created_at_ts on {len(stale)} tweets")
+
+    @property
+    def embedding_model(self):
+        """The shared SentenceTransformer (PyTorch or quantized ONNX) used by this knowledge base."""
+        return self.embedding_function.model
+
     def add_tweets(self, tweets: List[Tweet]):
-        """Add tweets to the knowledge base."""
+        """Add tweets to the knowledge base; tweets already present are updated in place."""
         documents = [tweet.text for tweet in tweets]
         ids = [tweet.id for tweet in tweets]
         metadata = [
             {
                 "author_id": tweet.author_id,
                 "created_at": tweet.created_at,
+                # Numeric copy so retention can use a range filter
+                "created_at_ts": _parse_created_at(tweet.created_at).timestamp(),
             }
             for tweet in tweets
         ]
         
-        self.collection.add(
+        self.collection.upsert(
             documents=documents,
             ids=ids,
             metadatas=metadata
         )
+        self.manifest.record_write(
+            doc_count=self.collection.count(),
+            latest_timestamp=max((tweet.created_at for tweet in tweets), default=None)
+        )
+
+    def get_since_id(self, user_id: str) -> Optional[str]:
+        """Newest tweet id already synced for a KOL, or None if never synced."""
+        with connect_state_db() as conn:
+            row = conn.execute(
+                'SELECT since_id FROM twitter_sync_state WHERE collection = ? AND user_id = ?',
+                (self.collection_name, user_id)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_since_id(self, user_id: str, since_id: str):
+        """Advance a KOL's sync watermark."""
+        with connect_state_db() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO twitter_sync_state (collection, user_id, since_id, last_synced) VALUES (?, ?, ?, ?)',
+                (self.collection_name, user_id, since_id, datetime.now(timezone.utc).isoformat())
+            )
+
+    def expire_tweets(self, retention_days: int = RETENTION_DAYS) -> int:
+        """Delete tweets created more than ``retention_days`` ago. Returns how many were removed."""
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).timestamp()
+        where = {"created_at_ts": {"$lt": cutoff}}
+        expired = self.collection.get(where=where, include=[])["ids"]
+        if expired:
+            self.collection.delete(ids=expired)
+            self.manifest.record_write(doc_count=self.collection.count())
+        return len(expired)
 
-    def query_knowledge_base(self, query: str, n_results: int = 10) -> List[Dict]:
-        """Query the knowledge base for relevant tweets."""
+    def query_knowledge_base(self, query: str, n_results: int = 10, where: Optional[Dict] = None) -> List[Dict]:
+        """Query the knowledge base for relevant tweets, serving repeats from the query cache."""
         try:
             print_system(f"Querying knowledge base with: {query}")
-            
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=n_results
+            return self.query_cache.cached_query(
+                query, n_results, where, lambda: self._search(query, n_results, where)
             )
-            
-            # Debug logging
-            print_system(f"Raw query results: {json.dumps(results, indent=2)}")
-            
-            if not results['documents'][0]:
-                print_system("No results found in knowledge base")
-                return []
-                
-            formatted_results = []
-            for doc, metadata, distance in zip(
-                results['documents'][0], 
-                results['metadatas'][0],
-                results['distances'][0]
-            ):
-                # Format timestamp for readability
-                created_at = datetime.fromisoformat(metadata['created_at'].replace('Z', '+00:00'))
-                formatted_date = created_at.strftime('%Y-%m-%d %H:%M:%S UTC')
-                
-                formatted_results.append({
-                    "text": doc,
-                    "metadata": {
-                        **metadata,
-                        "created_at": formatted_date
-                    },
-                    "relevance_score": 1 - distance  # Convert distance to similarity score
-                })
-            
-            # Sort by relevance score
-            formatted_results.sort(key=lambda x: x['relevance_score'], reverse=True)
-            
-            print_system(f"Found {len(formatted_results)} relevant tweets")
-            return formatted_results
-            
         except Exception as e:
             print_error(f"Error querying knowledge base: {e}")
             return []
 
+    async def aquery_knowledge_base(self, query: str, n_results: int = 10, where: Optional[Dict] = None) -> List[Dict]:
+        """Async query_knowledge_base; encoding and search run in the bounded query pool, off the event loop."""
+        return await run_retrieval(self.query_knowledge_base, query, n_results, where)
+
+    async def aquery_many(self, queries: List[str], n_results: int = 10, where: Optional[Dict] = None) -> List[List[Dict]]:
+        """Async query_many, run in the bounded query pool."""
+        return await run_retrieval(self.query_many, queries, n_results, where)
+
+    def _search(self, query: str, n_results: int, where: Optional[Dict] = None) -> List[Dict]:
+        """Run one vector search and format the results; errors propagate so they aren't cached."""
+        results = self.collection.query(
+            query_embeddings=[self.query_cache.embed(query)],
+            n_results=n_results,
+            where=where
+        )
+        return self._format_results(results['documents'][0], results['metadatas'][0], results['distances'][0])
+
+    def query_many(self, queries: List[str], n_results: int = 10, where: Optional[Dict] = None) -> List[List[Dict]]:
+        """Run several lookups with one batch encode and one multi-query search.
+
+        Returns one result list per query, in order. Queries already in the
+        result cache are answered from it and left out of the search.
+        """
+        try:
+            print_system(f"Querying knowledge base with {len(queries)} queries")
+            results: List[Optional[List[Dict]]] = [self.query_cache.get_results(q, n_results, where) for q in queries]
+            missing = [i for i, r in enumerate(results) if r is None]
+            if missing:
+                version = self.manifest.version()
+                start = time.perf_counter()
+                raw = self.collection.query(
+                    query_embeddings=self.query_cache.embed_many([queries[i] for i in missing]),
+                    n_results=n_results,
+                    where=where
+                )
+                per_query_seconds = (time.perf_counter() - start) / len(missing)
+                for row, i in enumerate(missing):
+                    results[i] = self._format_results(raw['documents'][row], raw['metadatas'][row], raw['distances'][row])
+                    self.query_cache.put_results(queries[i], n_results, where, results[i], per_query_seconds, version)
+            return results
+        except Exception as e:
+            print_error(f"Error querying knowledge base: {e}")
+            return [[] for _ in queries]
+
+    def _format_results(self, documents: List[str], metadatas: List[Dict], distances: List[float]) -> List[Dict]:
+        """Turn one query's raw Chroma results into scored tweets, best first."""
+        if not documents:
+            print_system("No results found in knowledge base")
+            return []
+            
+        formatted_results = []
+        for doc, metadata, distance in zip(
+            documents,
+            metadatas,
+            distances
+        ):
+            # Format timestamp for readability
+            created_at = datetime.fromisoformat(metadata['created_at'].replace('Z', '+00:00'))
+            formatted_date = created_at.strftime('%Y-%m-%d %H:%M:%S UTC')
+            
+            formatted_results.append({
+                "text": doc,
+                "metadata": {
+                    **metadata,
+                    "created_at": formatted_date
+                },
+                "relevance_score": 1 - distance  # Convert distance to similarity score
+            })
+        
+        # Sort by relevance score
+        formatted_results.sort(key=lambda x: x['relevance_score'], reverse=True)
+        
+        print_system(f"Found {len(formatted_results)} relevant tweets")
+        return formatted_results
+
     def format_query_results(self, results: List[Dict]) -> str:
         """Format query results into a readable string."""
         if not results:
@@ -135,18 +255,17 @@ class TweetKnowledgeBase:
     def get_collection_stats(self) -> Dict:
         """Get statistics about the knowledge base collection."""
         try:
-            count = self.collection.count()
-            metadata = self.collection.get()
-            last_update = None
-            if metadata.get("metadatas"):
-                # Get most recent tweet timestamp
-                last_update = max(m["created_at"] for m in metadata["metadatas"])
-                last_update = datetime.fromisoformat(last_update.replace('Z', '+00:00'))
+            manifest_stats = self.manifest.stats()
+            count = manifest_stats["count"]
+            last_update = manifest_stats["latest_timestamp"]
+            if last_update:
+                last_update = _parse_created_at(last_update)
             
             print_system(f"Knowledge base contains {count} tweets")
             return {
                 "count": count,
-                "last_update": last_update or datetime.now()
+                "last_update": last_update or datetime.now(),
+                "query_cache": self.query_cache.stats()
             }
         except Exception as e:
             print_error(f"Error getting collection stats: {str(e)}")
@@ -162,32 +281,29 @@ class TweetKnowledgeBase:
                 print_system("Knowledge base cleared successfully")
             else:
                 print_system("Knowledge base is already empty")
+            # Watermarks and the manifest describe what's in the collection, so they go too
+            self.manifest.reset()
+            with connect_state_db() as conn:
+                conn.execute('DELETE FROM twitter_sync_state WHERE collection = ?', (self.collection_name,))
             return True
         except Exception as e:
             print_error(f"Error clearing knowledge base: {str(e)}")
             return False
 
 async def update_knowledge_base(twitter_client: TwitterClient, knowledge_base, kol_list: List[Dict]):
-    """Update the knowledge base with recent tweets from top KOLs."""
-    TOP_KOLS = 5
-    TWEETS_PER_KOL = 15
-    REQUEST_DELAY = 5
-    
-    print_system("\n=== Starting Knowledge Base Update ===")
-    print_system("Function parameter details:")
-    print_system(f"twitter_client type: {type(twitter_client)}")
-    print_system(f"knowledge_base type: {type(knowledge_base)}")
-    print_system(f"kol_list type: {type(kol_list)}")
+    """Incrementally sync the knowledge base with new tweets from every KOL.
+
+    Each KOL has a ``since_id`` watermark, so only tweets posted since the
+    last sync are fetched and upserted; tweets past the retention window
+    are then expired. Nothing is cleared, so refresh cost tracks new
+    activity rather than the size of the KOL list.
+    """
+    INITIAL_TWEETS_PER_KOL = 15
+    MAX_NEW_TWEETS_PER_KOL = 100  # API maximum per request
+    MAX_PAGES_PER_KOL = 32  # the timeline endpoint only reaches back 3200 tweets
+    REQUEST_DELAY = 1  # the client already waits out rate limits
     
-    try:
-        print_system("Testing twitter_client...")
-        print_system(f"twitter_client attributes: {dir(twitter_client)}")
-        if hasattr(twitter_client, 'run_action'):
-            print_system("twitter_client has run_action method")
-        else:
-            print_error("twitter_client missing run_action method")
-    except Exception as e:
-        print_error(f"Error inspecting twitter_client: {str(e)}")
+    print_system("\n=== Starting Knowledge Base Sync ===")
     
     # Immediate validation of kol_list
     if kol_list is None:
@@ -275,66 +391,75 @@ async def update_knowledge_base(twitter_client: TwitterClient, knowledge_base, k
     print_system(f"\n=== Found {len(valid_kols)} valid KOLs ===")
     
     update_time = datetime.now()
-    all_tweets = []
-    
-    # Select random sample of KOLs
-    try:
-        print_system("\n=== Selecting random KOLs ===")
-        selected_kols = random.sample(valid_kols, min(TOP_KOLS, len(valid_kols)))
-        print_system(f"Selected {len(selected_kols)} KOLs for processing")
-        print_system("Selected KOLs:")
-        for i, kol in enumerate(selected_kols):
-            print_system(f"{i+1}. {kol['username']} (ID: {kol['user_id']})")
-    except Exception as e:
-        print_error(f"Error sampling KOLs: {str(e)}")
-        return
+    new_tweet_count = 0
     
-    # Clear existing knowledge base
-    try:
-        print_system("\n=== Clearing existing knowledge base ===")
-        knowledge_base.clear_collection()
-        print_system("Knowledge base cleared successfully")
-    except Exception as e:
-        print_error(f"Error clearing knowledge base: {e}")
-        return
-    
-    # Process each selected KOL
-    print_system("\n=== Processing selected KOLs ===")
-    for i, kol in enumerate(selected_kols, 1):
+    print_system("\n=== Syncing KOLs ===")
+    for i, kol in enumerate(valid_kols, 1):
         try:
-            print_system(f"\nProcessing KOL {i}/{len(selected_kols)}: {kol['username']}")
-            kol_tweets = []
-            
-            print_system(f"Getting tweets for user {kol['username']} (ID: {kol['user_id']})")
-            tweets = await twitter_client.get_user_tweets(
-                user_id=kol['user_id'],
-                max_results=TWEETS_PER_KOL
+            since_id = knowledge_base.get_since_id(kol['user_id'])
+            print_system(
+                f"\nSyncing KOL {i}/{len(valid_kols)}: {kol['username']} "
+                f"({'since ' + since_id if since_id else 'first sync'})"
             )
+            if since_id:
+                # Page back until the watermark so a busy KOL's backlog isn't cut off
+                # at one page; the watermark only advances once every page is stored
+                fetched = 0
+                newest_id = None
+                pagination_token = None
+                for _ in range(MAX_PAGES_PER_KOL):
+                    tweets, pagination_token = await twitter_client.get_user_tweets_page(
+                        user_id=kol['user_id'],
+                        max_results=MAX_NEW_TWEETS_PER_KOL,
+                        since_id=since_id,
+                        pagination_token=pagination_token
+                    )
+                    if tweets:
+                        knowledge_base.add_tweets(tweets)
+                        fetched += len(tweets)
+                        page_newest = max((t.id for t in tweets), key=int)
+                        newest_id = page_newest if newest_id is None else max(newest_id, page_newest, key=int)
+                    if not pagination_token:
+                        break
+                else:
+                    print_error(f"Stopped after {MAX_PAGES_PER_KOL} pages for {kol['username']}; older new tweets were skipped")
+            else:
+                tweets = await twitter_client.get_user_tweets(
+                    user_id=kol['user_id'],
+                    max_results=INITIAL_TWEETS_PER_KOL
+                )
+                if tweets:
+                    knowledge_base.add_tweets(tweets)
+                fetched = len(tweets)
+                newest_id = max((t.id for t in tweets), key=int) if tweets else None
+
+            if newest_id:
+                knowledge_base.set_since_id(kol['user_id'], newest_id)
+                new_tweet_count += fetched
+                print_system(f"Upserted {fetched} new tweets")
+            else:
+                print_system(f"No new tweets for {kol['username']}")
             
-            if not tweets:
-                print_system(f"No tweets found for {kol['username']}")
-                continue
-                
-            print_system(f"Found {len(tweets)} tweets")
-            kol_tweets.extend(tweets)
-            
-            if kol_tweets:
-                print_system(f"Adding {len(kol_tweets)} tweets to knowledge base")
-                knowledge_base.add_tweets(kol_tweets)
-            
-            print_system(f"Waiting {REQUEST_DELAY} seconds before next API call...")
-            await asyncio.sleep(REQUEST_DELAY)
+            if i < len(valid_kols):
+                await asyncio.sleep(REQUEST_DELAY)
             
         except Exception as e:
-            print_error(f"Error processing KOL {kol['username']}: {str(e)}")
+            print_error(f"Error syncing KOL {kol['username']}: {str(e)}")
             continue
     
-    if all_tweets:
-        print_system(f"\n=== Adding {len(all_tweets)} tweets to knowledge base ===")
-        try:
-            knowledge_base.add_tweets(all_tweets)
-            print_system(f"Knowledge base updated successfully at {update_time.strftime('%Y-%m-%d %H:%M:%S UTC')}")
-        except Exception as e:
-            print_error(f"Error updating knowledge base: {e}")
-    else:
-        print_system("\n=== No tweets to add to knowledge base ===") 
\ No newline at end of file
+    try:
+        expired = knowledge_base.expire_tweets()
+        print_system(f"Expired {expired} tweets older than {RETENTION_DAYS} days")
+    except Exception as e:
+        print_error(f"Error expiring old tweets: {e}")
+    
+    print_system(
+        f"\n=== Sync finished at {update_time.strftime('%Y-%m-%d %H:%M:%S')}: "
+        f"{new_tweet_count} new tweets from {len(valid_kols)} KOLs ==="
+    )
+
+    # Re-fetched tweets are served from the embedding cache instead of re-encoded
+    cache = getattr(getattr(knowledge_base, "embedding_function", None), "cache", None)
+    if cache is not None:
+        stats = cache.stats()
+        print_system(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")